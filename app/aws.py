@@ -1,72 +1,212 @@
+import asyncio
 import io
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from starlette.concurrency import run_in_threadpool
 
 from .config import get_settings
+from .derivatives import derivative_key, make_derivatives
+from .logging_utils import setup_logger
 from .utils import decode_base64_image, sha256_hex
 
 
-def save_images_to_s3(case_id: str, req) -> Dict[str, str]:
-    settings = get_settings()
-    s3 = settings.boto_client("s3")
-    kms_key = settings.kms_key_arn or None
+log = setup_logger(__name__)
+
+# Derivative object keys by image name, then by kind (see app.derivatives)
+Derivatives = Dict[str, Dict[str, str]]
+
 
-    def put_image(name: str, b64: Optional[str]) -> Optional[str]:
+async def save_images_to_s3(case_id: str, req) -> Tuple[Dict[str, Optional[str]], Dict[str, str], Derivatives]:
+    """Decode and upload the request's images and their derivatives concurrently, without
+    blocking the event loop. Returns (object keys, sha256 hex, derivative keys) by image name."""
+    names = ("front", "back", "selfie")
+    sources = (req.doc_front_b64, req.doc_back_b64, req.selfie_b64)
+
+    def decode(b64: Optional[str]) -> Optional[Tuple[bytes, str, str]]:
         if not b64:
             return None
         raw, mime = decode_base64_image(b64)
-        key = f"cases/{case_id}/{name}.jpg"
-        extra_args = {
-            "Bucket": settings.s3_bucket,
-            "Key": key,
-            "Body": raw,
-            "ContentType": mime or "image/jpeg",
-            "Metadata": {
-                "sha256": sha256_hex(raw),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            },
-        }
-        if kms_key:
-            extra_args["ServerSideEncryption"] = "aws:kms"
-            extra_args["SSEKMSKeyId"] = kms_key
-        s3.put_object(**extra_args)
-        return key
-
-    front_key = put_image("front", req.doc_front_b64)
-    back_key = put_image("back", req.doc_back_b64)
-    selfie_key = put_image("selfie", req.selfie_b64)
-    return {"front": front_key, "back": back_key, "selfie": selfie_key}
-
-
-def save_image_bytes_to_s3(case_id: str, name: str, data: bytes, mime: str | None = None) -> str:
-    """Save raw image bytes to S3 with SSE-KMS and metadata. Returns the object key."""
+        return raw, mime, sha256_hex(raw)
+
+    decoded = await asyncio.gather(*(run_in_threadpool(decode, b64) for b64 in sources))
+    images = [(name, d) for name, d in zip(names, decoded) if d is not None]
+    # Originals go up while the derivatives are being made
+    uploaded = await asyncio.gather(
+        *(run_in_threadpool(save_image_bytes_to_s3, case_id, name, raw, mime, digest) for name, (raw, mime, digest) in images),
+        *(run_in_threadpool(save_derivatives_to_s3, case_id, name, raw, digest) for name, (raw, _, digest) in images),
+        return_exceptions=True,
+    )
+    failed = next((u for u in uploaded if isinstance(u, BaseException)), None)
+    if failed is not None:
+        # Don't leave the uploads that did succeed behind
+        stored = [u for u in uploaded[: len(images)] if isinstance(u, str)]
+        stored += [k for u in uploaded[len(images):] if isinstance(u, dict) for k in u.values()]
+        await run_in_threadpool(delete_s3_objects, stored)
+        raise failed
+    keys: Dict[str, Optional[str]] = {name: None for name in names}
+    keys.update({name: key for (name, _), key in zip(images, uploaded)})
+    hashes = {name: digest for name, (_, _, digest) in images}
+    derived = {name: d for (name, _), d in zip(images, uploaded[len(images):]) if d}
+    return keys, hashes, derived
+
+
+def _put_object(key: str, data: bytes, content_type: str, metadata: Dict[str, str], tags: Optional[Dict[str, str]] = None) -> None:
     settings = get_settings()
-    s3 = settings.boto_client("s3")
     kms_key = settings.kms_key_arn or None
-    key = f"cases/{case_id}/{name}.jpg"
     extra_args = {
         "Bucket": settings.s3_bucket,
         "Key": key,
         "Body": data,
-        "ContentType": mime or "image/jpeg",
-        "Metadata": {"sha256": sha256_hex(data)},
+        "ContentType": content_type,
+        "Metadata": {**metadata, "created_at": datetime.now(timezone.utc).isoformat()},
     }
+    if tags:
+        extra_args["Tagging"] = urlencode(tags)
     if kms_key:
         extra_args["ServerSideEncryption"] = "aws:kms"
         extra_args["SSEKMSKeyId"] = kms_key
-    s3.put_object(**extra_args)
+    settings.boto_client("s3").put_object(**extra_args)
+
+
+def delete_s3_objects(keys: List[str]) -> None:
+    """Best-effort removal of objects left behind by a failed request."""
+    if not keys:
+        return
+    settings = get_settings()
+    try:
+        resp = settings.boto_client("s3").delete_objects(
+            Bucket=settings.s3_bucket, Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True}
+        )
+        for err in resp.get("Errors", []):
+            log.warning("could not delete s3://%s/%s: %s", settings.s3_bucket, err.get("Key"), err.get("Message"))
+    except Exception as exc:
+        log.warning("could not delete %d objects: %s", len(keys), exc)
+
+
+def stored_objects(keys: Dict[str, Optional[str]], derivatives: Optional[Derivatives] = None) -> List[str]:
+    """Every object key of a case's uploads: the images and their derivatives."""
+    return [k for k in keys.values() if k] + [k for kinds in (derivatives or {}).values() for k in kinds.values()]
+
+
+@asynccontextmanager
+async def delete_on_error(keys: Dict[str, Optional[str]], derivatives: Optional[Derivatives] = None) -> AsyncIterator[None]:
+    """Delete a case's stored uploads if the block raises (validation, persist or
+    enqueue), so a rejected or failed ingest leaves nothing in S3."""
+    try:
+        yield
+    except BaseException:
+        await run_in_threadpool(delete_s3_objects, stored_objects(keys, derivatives))
+        raise
+
+
+def save_image_bytes_to_s3(case_id: str, name: str, data: bytes, mime: str | None = None, digest: Optional[str] = None) -> str:
+    """Save raw image bytes to S3 with SSE-KMS, tagged with their SHA-256. Returns the object key."""
+    key = f"cases/{case_id}/{name}.jpg"
+    _put_object(key, data, mime or "image/jpeg", {}, tags={"sha256": digest or sha256_hex(data)})
     return key
 
 
-def enqueue_case(case_id: str, keys: Dict[str, Optional[str]], metadata: Optional[dict] = None):
+def save_derivatives_to_s3(case_id: str, name: str, data: bytes, digest: Optional[str] = None) -> Dict[str, str]:
+    """Make and upload the normalized/thumbnail derivatives of an uploaded image.
+    Returns {kind: key}; empty when disabled or the image cannot be decoded (the worker
+    then reads the original)."""
     settings = get_settings()
-    sqs = settings.boto_client("sqs")
-    body = {
+    if not settings.image_derivatives or len(data) > settings.derivative_max_source_bytes:
+        return {}
+    try:
+        derived = make_derivatives(
+            data, settings.derivative_max_side, settings.thumbnail_max_side, settings.derivative_jpeg_quality
+        )
+    except Exception as exc:
+        log.warning("no derivatives for %s/%s: %s", case_id, name, exc)
+        return {}
+    # The source digest ties each derivative to the upload it was made from
+    source = {"source_sha256": digest or sha256_hex(data)}
+    out = {}
+    try:
+        for kind, body in derived.items():
+            key = derivative_key(case_id, name, kind)
+            _put_object(key, body, "image/jpeg", source)
+            out[kind] = key
+    except Exception:
+        delete_s3_objects(list(out.values()))
+        raise
+    return out
+
+
+def _case_message(
+    case_id: str,
+    keys: Dict[str, Optional[str]],
+    metadata: Optional[dict],
+    hashes: Optional[Dict[str, str]],
+    derivatives: Optional[Derivatives] = None,
+) -> str:
+    return json.dumps({
         "case_id": case_id,
         "s3_keys": keys,
-        "bucket": settings.s3_bucket,
+        "bucket": get_settings().s3_bucket,
         "metadata": metadata or {},
+        "s3_hashes": hashes or {},
+        "s3_derivatives": derivatives or {},
         "enqueued_at": datetime.now(timezone.utc).isoformat(),
-    }
-    sqs.send_message(QueueUrl=settings.sqs_queue_url, MessageBody=json.dumps(body))
+    })
+
+
+def enqueue_case(
+    case_id: str,
+    keys: Dict[str, Optional[str]],
+    metadata: Optional[dict] = None,
+    hashes: Optional[Dict[str, str]] = None,
+    derivatives: Optional[Derivatives] = None,
+):
+    """Queue the case for the worker. `hashes` (sha256 by image name) lets the worker reuse
+    cached results for content it has already analysed; `derivatives` lets it read the
+    normalized/thumbnail images instead of the originals."""
+    settings = get_settings()
+    sqs = settings.boto_client("sqs")
+    sqs.send_message(
+        QueueUrl=settings.sqs_queue_url, MessageBody=_case_message(case_id, keys, metadata, hashes, derivatives)
+    )
+
+
+# SendMessageBatch accepts at most 10 entries per call
+SEND_BATCH_LIMIT = 10
+
+
+def enqueue_cases(
+    cases: List[Tuple[str, Dict[str, Optional[str]], Optional[dict], Optional[Dict[str, str]], Optional[Derivatives]]]
+) -> Dict[str, str]:
+    """Queue many cases with send_message_batch; (case_id, keys, metadata, hashes, derivatives) tuples.
+    Entries SQS reports as failed are retried once. Returns {case_id: error} for the rest."""
+    settings = get_settings()
+    sqs = settings.boto_client("sqs")
+    failed: Dict[str, str] = {}
+    for start in range(0, len(cases), SEND_BATCH_LIMIT):
+        entries = [
+            {"Id": case_id, "MessageBody": _case_message(case_id, keys, metadata, hashes, derivatives)}
+            for case_id, keys, metadata, hashes, derivatives in cases[start : start + SEND_BATCH_LIMIT]
+        ]
+        retryable: Dict[str, str] = {}
+        for _ in range(2):
+            try:
+                resp = sqs.send_message_batch(QueueUrl=settings.sqs_queue_url, Entries=entries)
+            except Exception as exc:
+                retryable = {e["Id"]: str(exc) for e in entries}
+                continue
+            retryable = {}
+            for f in resp.get("Failed", []):
+                message = f.get("Message") or f.get("Code", "send failed")
+                # Sender faults (e.g. a malformed message) will not succeed on retry
+                if f.get("SenderFault"):
+                    failed[f["Id"]] = message
+                else:
+                    retryable[f["Id"]] = message
+            entries = [e for e in entries if e["Id"] in retryable]
+            if not entries:
+                break
+        failed.update(retryable)
+    return failed
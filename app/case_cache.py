@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import get_settings
+from .persistence import get_case
+from .schemas import CaseResponse
+
+
+# Statuses the worker/reviewers leave a case in; waiters stop once one is reached
+TERMINAL_STATUSES = ("PROCESSED", "ERROR")
+
+
+class CaseCache:
+    """Short-TTL, single-flight cache in front of case reads.
+
+    Pollers and waiters of the same case share one DynamoDB read per `ttl` seconds
+    in this process: concurrent misses for a case wait for the single in-flight load.
+    Missing cases are cached too (as None), so unknown ids cannot bypass the cache.
+    """
+
+    def __init__(self, ttl: float = 1.0, loader: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._loader = loader or get_case
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, case_id: str) -> Optional[Dict[str, Any]]:
+        found, item = self._fresh(case_id)
+        if found:
+            return item
+        with self._lock:
+            key_lock = self._key_locks.setdefault(case_id, threading.Lock())
+        with key_lock:
+            found, item = self._fresh(case_id)
+            if not found:
+                item = self._loader(case_id)
+                with self._lock:
+                    if len(self._entries) >= self.max_entries:
+                        self._evict_expired()
+                    self._entries[case_id] = (time.monotonic() + self.ttl, item)
+                    self._key_locks.pop(case_id, None)
+        return item
+
+    def invalidate(self, case_id: str) -> None:
+        with self._lock:
+            self._entries.pop(case_id, None)
+
+    def _fresh(self, case_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(case_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return False, None
+        return True, entry[1]
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for k in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+
+
+_cache: Optional[CaseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_case_cache() -> CaseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CaseCache(ttl=get_settings().case_cache_ttl)
+    return _cache
+
+
+def case_response(case_id: str, item: Dict[str, Any]) -> CaseResponse:
+    return CaseResponse(
+        case_id=case_id,
+        status=item.get("status", "PENDING"),
+        fraud_score=item.get("fraud_score"),
+        reasons=item.get("reasons", []),
+    )
+
+
+def case_etag(resp: CaseResponse) -> str:
+    body = json.dumps(resp.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+
+async def current_case(case_id: str) -> Optional[Tuple[CaseResponse, str]]:
+    item = await run_in_threadpool(get_case_cache().get, case_id)
+    if not item:
+        return None
+    resp = case_response(case_id, item)
+    return resp, case_etag(resp)
+
+
+async def wait_for_change(case_id: str, since: Optional[str], timeout: float) -> Optional[Tuple[CaseResponse, str, bool]]:
+    """Hold until the case's ETag differs from `since` (or, without `since`, until the
+    case reaches a terminal status), or `timeout` seconds pass.
+
+    Returns (case, etag, changed), or None if the case does not exist.
+    """
+    interval = get_settings().case_wait_interval
+    deadline = time.monotonic() + max(0.0, timeout)
+    while True:
+        current = await current_case(case_id)
+        if current is None:
+            return None
+        resp, etag = current
+        changed = not etag_matches(since, etag) if since else resp.status in TERMINAL_STATUSES
+        remaining = deadline - time.monotonic()
+        if changed or remaining <= 0:
+            return resp, etag, changed
+        await asyncio.sleep(min(interval, remaining))
@@ -1,30 +1,60 @@
 import os
+import threading
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import boto3
 from botocore.config import Config as BotoConfig
 
+from .telemetry import instrument_client
+
 
 class Settings:
     # Core AWS
     aws_region: str = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+    # Optional endpoint override (e.g. LocalStack); AWS_ENDPOINT_URL_<SERVICE> overrides per service
+    aws_endpoint_url: str = os.getenv("AWS_ENDPOINT_URL", "")
+    aws_max_pool_connections: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    aws_tcp_keepalive: bool = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() in ("1", "true", "yes")
 
     # Data storage
     s3_bucket: str = os.getenv("S3_BUCKET", "")
     kms_key_arn: str = os.getenv("KMS_KEY_ARN", "")
     dynamo_cases_table: str = os.getenv("DYNAMO_CASES_TABLE", "fraud_cases")
     dynamo_events_table: str = os.getenv("DYNAMO_EVENTS_TABLE", "fraud_events")
+    dynamo_velocity_table: str = os.getenv("DYNAMO_VELOCITY_TABLE", "fraud_velocity")
 
     # Messaging
     sqs_queue_url: str = os.getenv("SQS_QUEUE_URL", "")
 
+    # Uploads (multipart part size for streamed uploads; S3 minimum is 5 MiB)
+    upload_part_size: int = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+
+    # Image derivatives made at ingest for the worker: an upright, size-capped JPEG and a
+    # small thumbnail (longest side in pixels); sources larger than the byte cap are skipped
+    image_derivatives: bool = os.getenv("IMAGE_DERIVATIVES", "true").lower() in ("1", "true", "yes")
+    derivative_max_side: int = int(os.getenv("DERIVATIVE_MAX_SIDE", "2048"))
+    thumbnail_max_side: int = int(os.getenv("THUMBNAIL_MAX_SIDE", "640"))
+    derivative_jpeg_quality: int = int(os.getenv("DERIVATIVE_JPEG_QUALITY", "90"))
+    derivative_max_source_bytes: int = int(os.getenv("DERIVATIVE_MAX_SOURCE_BYTES", str(32 * 1024 * 1024)))
+
+    # Bulk ingest: most cases per request and cases uploaded at once
+    ingest_batch_max: int = int(os.getenv("INGEST_BATCH_MAX", "100"))
+    ingest_batch_concurrency: int = int(os.getenv("INGEST_BATCH_CONCURRENCY", "16"))
+
+    # Case status reads: cache TTL, re-check interval and longest hold for long-poll/SSE (seconds)
+    case_cache_ttl: float = float(os.getenv("CASE_CACHE_TTL", "1.0"))
+    case_wait_interval: float = float(os.getenv("CASE_WAIT_INTERVAL", "1.0"))
+    case_wait_max: float = float(os.getenv("CASE_WAIT_MAX", "30"))
+
     # Auth
     api_key_secret_name: str = os.getenv("API_KEY_SECRET_NAME", "fraud_api_key")
     api_key_env_fallback: str = os.getenv("API_KEY", "")
 
     # Observability
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # Port for the Prometheus /metrics endpoint, off the load balancer (0 disables)
+    metrics_port: int = int(os.getenv("METRICS_PORT", "9101"))
 
     # Compliance
     image_ttl_days: int = int(os.getenv("IMAGE_TTL_DAYS", "30"))
@@ -33,10 +63,82 @@ class Settings:
     risky_ips: list[str] = [s for s in os.getenv("RISKY_IPS", "").split(",") if s]
 
     def boto_session(self) -> boto3.session.Session:
-        return boto3.session.Session(region_name=self.aws_region)
+        global _session
+        if _session is None:
+            with _lock:
+                if _session is None:
+                    _session = boto3.session.Session(region_name=self.aws_region)
+        return _session
+
+    def boto_config(self) -> BotoConfig:
+        return BotoConfig(
+            retries={"max_attempts": 8, "mode": "standard"},
+            max_pool_connections=self.aws_max_pool_connections,
+            tcp_keepalive=self.aws_tcp_keepalive,
+        )
+
+    def endpoint_url(self, service: str) -> Optional[str]:
+        specific = os.getenv(f"AWS_ENDPOINT_URL_{service.upper().replace('-', '_')}")
+        return specific or self.aws_endpoint_url or None
 
     def boto_client(self, service: str):
-        return self.boto_session().client(service, config=BotoConfig(retries={"max_attempts": 8, "mode": "standard"}))
+        c = _clients.get(service)
+        if c is not None:
+            return c
+        sess = self.boto_session()
+        with _lock:
+            c = _clients.get(service)
+            if c is None:
+                c = sess.client(service, config=self.boto_config(), endpoint_url=self.endpoint_url(service))
+                _clients[service] = instrument_client(c, service)
+        return c
+
+    def boto_resource(self, service: str):
+        """Resources are not thread-safe, so each thread gets its own (sharing the session)."""
+        override = _resource_overrides.get(service)
+        if override is not None:
+            return override
+        cache = getattr(_thread_resources, "resources", None)
+        if cache is None:
+            cache = _thread_resources.resources = {}
+        r = cache.get(service)
+        if r is None:
+            sess = self.boto_session()
+            with _lock:
+                r = sess.resource(service, config=self.boto_config(), endpoint_url=self.endpoint_url(service))
+            instrument_client(r.meta.client, service)
+            cache[service] = r
+        return r
+
+
+# Process-wide registry: one session and one client per service, reused by every request.
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[str, Any] = {}
+_resource_overrides: Dict[str, Any] = {}
+_thread_resources = threading.local()
+
+
+def set_boto_client(service: str, stand_in: Any) -> None:
+    """Register a stand-in (e.g. an in-process fake) returned by Settings.boto_client(service)."""
+    with _lock:
+        _clients[service] = stand_in
+
+
+def set_boto_resource(service: str, stand_in: Any) -> None:
+    """Register a stand-in returned by Settings.boto_resource(service) on every thread."""
+    with _lock:
+        _resource_overrides[service] = stand_in
+
+
+def reset_boto_clients() -> None:
+    """Drop cached clients, resources and the session; they are recreated on next use."""
+    global _session, _thread_resources
+    with _lock:
+        _clients.clear()
+        _resource_overrides.clear()
+        _thread_resources = threading.local()
+        _session = None
 
 
 @lru_cache
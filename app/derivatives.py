@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import io
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+from common.derivatives import NORMALIZED, THUMBNAIL
+
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def derivative_key(case_id: str, name: str, kind: str) -> str:
+    return f"cases/{case_id}/derived/{name}_{kind}.jpg"
+
+
+def _encode(img: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def make_derivatives(data: bytes, max_side: int, thumb_side: int, quality: int = 90) -> Dict[str, bytes]:
+    """Decode an upload once and produce its derivatives:
+
+    normalized  EXIF orientation applied, longest side capped at `max_side`, re-encoded
+                as baseline JPEG without metadata. Omitted when the original already
+                is exactly that (an upright JPEG within the cap), so it is used as is.
+    thumbnail   the same image with its longest side capped at `thumb_side`.
+
+    Raises if the data is not an image PIL can decode.
+    """
+    img = Image.open(io.BytesIO(data))
+    orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+    fits = max(img.size) <= max_side
+    source_format, source_mode = img.format, img.mode
+    if img.format == "JPEG" and not fits:
+        # Decode at a reduced DCT scale when that still leaves the longest side >= the cap
+        scale = max_side / max(img.size)
+        img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+    upright = ImageOps.exif_transpose(img)
+    if upright.mode != "RGB":
+        upright = upright.convert("RGB")
+    if max(upright.size) > max_side:
+        upright.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+    out: Dict[str, bytes] = {}
+    if not (source_format == "JPEG" and orientation == 1 and fits and source_mode in ("RGB", "L")):
+        out[NORMALIZED] = _encode(upright, quality)
+    thumb = upright.copy()
+    thumb.thumbnail((thumb_side, thumb_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+    out[THUMBNAIL] = _encode(thumb, quality)
+    return out
+
@@ -1,10 +1,61 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 
+from .config import get_settings
 from .routes import router as api_router
+from .telemetry import get_registry, serve_metrics
 from .ui_routes import router as ui_router
 
-app = FastAPI(title="Fraud Detection API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Metrics go on their own port, which the load balancer does not forward to
+    port = get_settings().metrics_port
+    server = serve_metrics(port) if port else None
+    try:
+        yield
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+app = FastAPI(title="Fraud Detection API", lifespan=lifespan)
 app.include_router(api_router, prefix="/v1")
 app.include_router(ui_router)
 app.mount("/static", StaticFiles(directory="static"), name="static")
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    registry = get_registry()
+    registry.add_gauge("http_requests_in_flight", 1)
+    t0 = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        registry.add_gauge("http_requests_in_flight", -1)
+        # Label by route template (not raw path) to keep cardinality bounded
+        route = _route_template(request.scope)
+        labels = (("method", request.method), ("route", route), ("status", status))
+        registry.observe("http_request_duration_seconds", time.perf_counter() - t0, labels)
+
+
+def _route_template(scope) -> str:
+    """Full path template of the matched route, e.g. /v1/case/{case_id}."""
+    route = scope.get("route")
+    fmt = getattr(route, "path_format", None)
+    if fmt is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    try:
+        rendered = fmt.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return fmt
+    # Routes of included routers may report the path without the router prefix
+    return path[: len(path) - len(rendered)] + fmt if path.endswith(rendered) else fmt
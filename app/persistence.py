@@ -3,13 +3,17 @@ from __future__ import annotations
 import time
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeSerializer
 
 from .config import get_settings
 from .logging_utils import setup_logger
+from .velocity import aggregated_updates
 
 
 log = setup_logger(__name__)
+_serializer = TypeSerializer()
 
 
 def new_case_id() -> str:
@@ -17,14 +21,11 @@ def new_case_id() -> str:
 
 
 def _dynamo():
-    return get_settings().boto_session().resource("dynamodb")
+    return get_settings().boto_resource("dynamodb")
 
 
-def insert_case_pending(case_id: str, keys: Dict[str, Optional[str]], metadata: Optional[dict] = None):
-    settings = get_settings()
-    table = _dynamo().Table(settings.dynamo_cases_table)
-    now = datetime.now(timezone.utc).isoformat()
-    item: Dict[str, Any] = {
+def _case_item(case_id: str, keys: Dict[str, Optional[str]], metadata: Optional[dict], now: str) -> Dict[str, Any]:
+    return {
         "case_id": case_id,
         "status": "PENDING",
         "fraud_score": None,
@@ -34,8 +35,83 @@ def insert_case_pending(case_id: str, keys: Dict[str, Optional[str]], metadata:
         "s3_keys": keys,
         "metadata": metadata or {},
     }
-    table.put_item(Item=item)
-    write_event(case_id, "INGEST", {"device_hash": (metadata or {}).get("device_hash"), "ip": (metadata or {}).get("ip")})
+
+
+def _ingest_event(case_id: str, metadata: Optional[dict]) -> Dict[str, Any]:
+    return _event_item(case_id, "INGEST", {"device_hash": (metadata or {}).get("device_hash"), "ip": (metadata or {}).get("ip")})
+
+
+def insert_case_pending(case_id: str, keys: Dict[str, Optional[str]], metadata: Optional[dict] = None):
+    """Write the PENDING case row and its INGEST event in one transaction (one round
+    trip). Velocity counters are left to record_velocity, once the case is enqueued."""
+    settings = get_settings()
+    now = datetime.now(timezone.utc).isoformat()
+    item = _case_item(case_id, keys, metadata, now)
+    event = _ingest_event(case_id, metadata)
+    settings.boto_client("dynamodb").transact_write_items(
+        TransactItems=[
+            {"Put": {"TableName": settings.dynamo_cases_table, "Item": _serialize(item)}},
+            {"Put": {"TableName": settings.dynamo_events_table, "Item": _serialize(event)}},
+        ]
+    )
+
+
+# BatchWriteItem accepts at most 25 puts per call
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_ATTEMPTS = 5
+
+
+def insert_cases_pending(cases: List[Tuple[str, Dict[str, Optional[str]], Optional[dict]]]) -> Dict[str, str]:
+    """Bulk variant of insert_case_pending for (case_id, keys, metadata) tuples.
+
+    Case rows and INGEST events go out with batch_write_item (25 puts per call,
+    unprocessed items retried with backoff). Velocity counters are left to
+    record_velocity. Unlike the single-case path this is not atomic per case. Returns
+    {case_id: error} for cases whose rows could not be written.
+    """
+    settings = get_settings()
+    dynamo = settings.boto_client("dynamodb")
+    now = datetime.now(timezone.utc).isoformat()
+    requests: List[Tuple[str, str, Dict[str, Any]]] = []
+    for case_id, keys, metadata in cases:
+        requests.append((case_id, settings.dynamo_cases_table, _case_item(case_id, keys, metadata, now)))
+        requests.append((case_id, settings.dynamo_events_table, _ingest_event(case_id, metadata)))
+
+    failed: Dict[str, str] = {}
+    for start in range(0, len(requests), BATCH_WRITE_LIMIT):
+        chunk = requests[start : start + BATCH_WRITE_LIMIT]
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        for _, table, item in chunk:
+            pending.setdefault(table, []).append({"PutRequest": {"Item": _serialize(item)}})
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            try:
+                pending = dynamo.batch_write_item(RequestItems=pending).get("UnprocessedItems") or {}
+            except Exception as exc:
+                log.warning("batch_write_item failed: %s", exc)
+                break
+            if not pending:
+                break
+            time.sleep(min(0.05 * 2**attempt, 1.0))
+        # Both rows of a case carry its case_id, so leftovers map back to their cases
+        for table_requests in pending.values():
+            for req in table_requests:
+                failed[req["PutRequest"]["Item"]["case_id"]["S"]] = "case record not written"
+
+    return failed
+
+
+def record_velocity(metadatas: List[Optional[dict]]) -> None:
+    """Count submissions towards their device/IP velocity: one ADD per distinct
+    counter. Called once the cases are enqueued, so a case that is reported as failed
+    (and resubmitted) is not counted twice."""
+    settings = get_settings()
+    dynamo = settings.boto_client("dynamodb")
+    for update in aggregated_updates(settings.dynamo_velocity_table, metadatas):
+        try:
+            dynamo.update_item(**update)
+        except Exception as exc:
+            # Velocity is a risk signal, not part of the case record
+            log.warning("velocity update failed: %s", exc)
 
 
 def get_case(case_id: str) -> Optional[Dict[str, Any]]:
@@ -74,6 +150,10 @@ def update_case_results(case_id: str, fraud_score: float, reasons: list[str], de
 def write_event(case_id: str, event_type: str, payload: dict):
     settings = get_settings()
     table = _dynamo().Table(settings.dynamo_events_table)
+    table.put_item(Item=_event_item(case_id, event_type, payload))
+
+
+def _event_item(case_id: str, event_type: str, payload: dict) -> Dict[str, Any]:
     ts = int(time.time())
     item = {
         "case_id": case_id,
@@ -87,5 +167,9 @@ def write_event(case_id: str, event_type: str, payload: dict):
         "device_hash": (payload or {}).get("device_hash"),
         "ip": (payload or {}).get("ip"),
     }
-    table.put_item(Item={k: v for k, v in item.items() if v is not None})
+    return {k: v for k, v in item.items() if v is not None}
+
 
+def _serialize(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Plain item -> low-level DynamoDB attribute values (as the Table resource does)."""
+    return {k: _serializer.serialize(v) for k, v in item.items()}
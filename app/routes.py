@@ -1,40 +1,171 @@
 from __future__ import annotations
 
-from typing import Any
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 
-from .aws import enqueue_case, save_images_to_s3
-from .persistence import get_case, insert_case_pending, new_case_id, update_case_status, write_event
-from .schemas import CaseResponse, IngestRequest, ReviewRequest
+from .aws import Derivatives, delete_on_error, delete_s3_objects, enqueue_case, enqueue_cases, save_images_to_s3, stored_objects
+from .case_cache import case_etag, case_response, etag_matches, get_case_cache, wait_for_change
+from .config import get_settings
+from .logging_utils import setup_logger
+from .persistence import get_case, insert_case_pending, insert_cases_pending, new_case_id, record_velocity, update_case_status, write_event
+from .schemas import CaseResponse, IngestBatchItem, IngestBatchRequest, IngestBatchResponse, IngestRequest, ReviewRequest
 from .security import require_api_key
+from .telemetry import span
+from .uploads import IMAGE_FILE_FIELDS, stream_form_to_s3
 
 
+log = setup_logger(__name__)
 router = APIRouter()
 
 
 @router.post("/ingest", response_model=CaseResponse)
-def ingest(req: IngestRequest, _: Any = Depends(require_api_key)):
+async def ingest(req: IngestRequest, _: Any = Depends(require_api_key)):
     if not req.doc_front_b64:
         raise HTTPException(status_code=400, detail="doc_front_b64 required")
     case_id = new_case_id()
-    keys = save_images_to_s3(case_id, req)
-    insert_case_pending(case_id, keys, metadata=req.metadata)
-    enqueue_case(case_id, keys, metadata=req.metadata)
+    # Uploads run concurrently; the case row and INGEST event are one transaction.
+    # The case must exist before it is enqueued, so those two steps stay ordered.
+    with span("ingest_step", step="upload"):
+        keys, hashes, derived = await save_images_to_s3(case_id, req)
+    async with delete_on_error(keys, derived):
+        with span("ingest_step", step="persist"):
+            await run_in_threadpool(insert_case_pending, case_id, keys, req.metadata)
+        with span("ingest_step", step="enqueue"):
+            await run_in_threadpool(enqueue_case, case_id, keys, req.metadata, hashes, derived)
+    with span("ingest_step", step="velocity"):
+        await run_in_threadpool(record_velocity, [req.metadata])
     return CaseResponse(case_id=case_id, status="PENDING", fraud_score=None, reasons=[])
 
 
+@router.post("/ingest/upload", response_model=CaseResponse)
+async def ingest_upload(request: Request, _: Any = Depends(require_api_key)):
+    """Binary variant of /ingest: multipart/form-data with raw image parts `doc_front`,
+    `doc_back`, `selfie` and an optional `metadata` JSON part. Images are streamed to S3
+    as they arrive, so nothing is base64-encoded or held in memory whole."""
+    case_id = new_case_id()
+    with span("ingest_step", step="upload"):
+        form = await stream_form_to_s3(request, case_id, IMAGE_FILE_FIELDS)
+    keys = form.keys
+    # Parts arrive in any order, so the request is only known to be valid once they are
+    # all stored; a rejected or failed request deletes them
+    async with delete_on_error(keys, form.derivatives):
+        if not keys.get("front"):
+            raise HTTPException(status_code=400, detail="doc_front part required")
+        try:
+            metadata = json.loads(form.fields["metadata"]) if form.fields.get("metadata") else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="metadata part must be JSON")
+        if metadata is not None and not isinstance(metadata, dict):
+            raise HTTPException(status_code=400, detail="metadata part must be a JSON object")
+        with span("ingest_step", step="persist"):
+            await run_in_threadpool(insert_case_pending, case_id, keys, metadata)
+        with span("ingest_step", step="enqueue"):
+            await run_in_threadpool(enqueue_case, case_id, keys, metadata, form.hashes, form.derivatives)
+    with span("ingest_step", step="velocity"):
+        await run_in_threadpool(record_velocity, [metadata])
+    return CaseResponse(case_id=case_id, status="PENDING", fraud_score=None, reasons=[])
+
+
+@router.post("/ingest/batch", response_model=IngestBatchResponse)
+async def ingest_batch(req: IngestBatchRequest, _: Any = Depends(require_api_key)):
+    """Ingest many cases in one request. Images upload concurrently; case rows and INGEST
+    events are written with batch_write_item and messages sent with send_message_batch.
+    Each case succeeds or fails on its own; see the per-item results."""
+    settings = get_settings()
+    if len(req.cases) > settings.ingest_batch_max:
+        raise HTTPException(status_code=413, detail=f"at most {settings.ingest_batch_max} cases per batch")
+    results = [IngestBatchItem(index=i, status="PENDING") for i in range(len(req.cases))]
+    slots = asyncio.Semaphore(settings.ingest_batch_concurrency)
+
+    async def upload(i: int, case: IngestRequest) -> Optional[Tuple[str, Dict[str, Optional[str]], Dict[str, str], Derivatives]]:
+        if not case.doc_front_b64:
+            results[i].status, results[i].error = "ERROR", "doc_front_b64 required"
+            return None
+        case_id = results[i].case_id = new_case_id()
+        async with slots:
+            try:
+                keys, hashes, derived = await save_images_to_s3(case_id, case)
+            except Exception as exc:
+                log.warning("batch upload failed for %s: %s", case_id, exc)
+                results[i].status, results[i].error = "ERROR", "image upload failed"
+                return None
+        return case_id, keys, hashes, derived
+
+    with span("ingest_step", step="upload"):
+        uploaded = await asyncio.gather(*(upload(i, case) for i, case in enumerate(req.cases)))
+    ready: List[Tuple[int, str, Dict[str, Optional[str]], Dict[str, str], Derivatives]] = [
+        (i, *u) for i, u in enumerate(uploaded) if u is not None
+    ]
+
+    def mark(errors: Dict[str, str]) -> None:
+        for i, case_id, *_ in ready:
+            if case_id in errors:
+                results[i].status, results[i].error = "ERROR", errors[case_id]
+
+    # As for single ingest, a case is only enqueued once its row exists
+    with span("ingest_step", step="persist"):
+        mark(await run_in_threadpool(
+            insert_cases_pending, [(case_id, keys, req.cases[i].metadata) for i, case_id, keys, *_ in ready]
+        ))
+    uploaded_ok, ready = ready, [r for r in ready if results[r[0]].status == "PENDING"]
+    with span("ingest_step", step="enqueue"):
+        mark(await run_in_threadpool(
+            enqueue_cases,
+            [(case_id, keys, req.cases[i].metadata, hashes, derived) for i, case_id, keys, hashes, derived in ready],
+        ))
+    # Cases that were not written or not enqueued: their images would be orphaned
+    await run_in_threadpool(delete_s3_objects, [
+        k for i, _, keys, _, derived in uploaded_ok if results[i].status != "PENDING" for k in stored_objects(keys, derived)
+    ])
+    enqueued = [req.cases[i].metadata for i, *_ in ready if results[i].status == "PENDING"]
+    with span("ingest_step", step="velocity"):
+        await run_in_threadpool(record_velocity, enqueued)
+    accepted = sum(1 for r in results if r.status == "PENDING")
+    return IngestBatchResponse(accepted=accepted, failed=len(results) - accepted, results=results)
+
+
 @router.get("/case/{case_id}", response_model=CaseResponse)
-def get_case_status(case_id: str, _: Any = Depends(require_api_key)):
-    item = get_case(case_id)
+def get_case_status(
+    case_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    _: Any = Depends(require_api_key),
+):
+    item = get_case_cache().get(case_id)
     if not item:
         raise HTTPException(status_code=404, detail="case not found")
-    return CaseResponse(
-        case_id=case_id,
-        status=item.get("status", "PENDING"),
-        fraud_score=item.get("fraud_score"),
-        reasons=item.get("reasons", []),
-    )
+    resp = case_response(case_id, item)
+    etag = case_etag(resp)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return resp
+
+
+@router.get("/case/{case_id}/wait", response_model=CaseResponse)
+async def wait_case_status(
+    case_id: str,
+    response: Response,
+    timeout: float = Query(default=20.0, ge=0),
+    since: Optional[str] = Query(default=None, description="ETag of the last seen state"),
+    if_none_match: Optional[str] = Header(default=None),
+    _: Any = Depends(require_api_key),
+):
+    """Long-poll: return as soon as the case differs from `since` (or If-None-Match), or,
+    without either, once it is PROCESSED/ERROR. Returns 304 if nothing changed in `timeout`."""
+    timeout = min(timeout, get_settings().case_wait_max)
+    result = await wait_for_change(case_id, since or if_none_match, timeout)
+    if result is None:
+        raise HTTPException(status_code=404, detail="case not found")
+    resp, etag, changed = result
+    if not changed and (since or if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return resp
 
 
 @router.post("/review/{case_id}")
@@ -50,6 +181,7 @@ def review_case(case_id: str, req: ReviewRequest, _: Any = Depends(require_api_k
     else:
         update_case_status(case_id, "REVIEW")
     write_event(case_id, "REVIEW", {"decision": req.decision, "notes": req.notes})
+    get_case_cache().invalidate(case_id)
     item = get_case(case_id)
     return {
         "case_id": case_id,
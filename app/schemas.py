@@ -9,6 +9,23 @@ class IngestRequest(BaseModel):
     metadata: Optional[dict] = None
 
 
+class IngestBatchRequest(BaseModel):
+    cases: list[IngestRequest] = Field(min_length=1)
+
+
+class IngestBatchItem(BaseModel):
+    index: int
+    case_id: Optional[str] = None
+    status: Literal["PENDING", "ERROR"]
+    error: Optional[str] = None
+
+
+class IngestBatchResponse(BaseModel):
+    accepted: int
+    failed: int
+    results: list[IngestBatchItem]
+
+
 class CaseResponse(BaseModel):
     case_id: str
     status: Literal["PENDING", "PROCESSED", "REVIEW", "ERROR"]
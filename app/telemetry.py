@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from http.server import ThreadingHTTPServer
+
+from common.tracing import TraceRegistry, serve_metrics as _serve_metrics
+
+PREFIX = "fraud_api_"
+
+_registry = TraceRegistry(PREFIX)
+span = _registry.span
+instrument_client = _registry.instrument_client
+
+
+def get_registry() -> TraceRegistry:
+    return _registry
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread, apart from the public API port."""
+    return _serve_metrics(_registry, port, host)
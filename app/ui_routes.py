@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import base64
-from typing import Any, Optional
+import json
+import time
+from typing import Any, AsyncIterator, Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
-from .aws import enqueue_case, save_image_bytes_to_s3
-from .persistence import get_case, insert_case_pending, new_case_id
+from .aws import delete_on_error, enqueue_case
+from .case_cache import TERMINAL_STATUSES, case_etag, case_response, current_case, etag_matches, get_case_cache, wait_for_change
+from .config import get_settings
+from .persistence import insert_case_pending, new_case_id
 from .schemas import CaseResponse
+from .telemetry import span
+from .uploads import IMAGE_FILE_FIELDS, stream_form_to_s3
 
 
 router = APIRouter()
@@ -22,23 +29,19 @@ def index(request: Request):
 
 
 @router.post("/ui/ingest")
-async def ui_ingest(
-    request: Request,
-    doc_front: UploadFile = File(...),
-    doc_back: Optional[UploadFile] = File(None),
-    selfie: Optional[UploadFile] = File(None),
-):
-    if not doc_front:
-        raise HTTPException(status_code=400, detail="front image required")
+async def ui_ingest(request: Request):
+    # Parts are streamed to S3 as they arrive rather than buffered by form parsing
     case_id = new_case_id()
-    keys = {"front": None, "back": None, "selfie": None}
-    keys["front"] = save_image_bytes_to_s3(case_id, "front", await doc_front.read(), doc_front.content_type)
-    if doc_back is not None:
-        keys["back"] = save_image_bytes_to_s3(case_id, "back", await doc_back.read(), doc_back.content_type)
-    if selfie is not None:
-        keys["selfie"] = save_image_bytes_to_s3(case_id, "selfie", await selfie.read(), selfie.content_type)
-    insert_case_pending(case_id, keys, metadata={})
-    enqueue_case(case_id, keys, metadata={})
+    with span("ingest_step", step="upload"):
+        form = await stream_form_to_s3(request, case_id, IMAGE_FILE_FIELDS)
+    keys = form.keys
+    async with delete_on_error(keys, form.derivatives):
+        if not keys.get("front"):
+            raise HTTPException(status_code=400, detail="front image required")
+        with span("ingest_step", step="persist"):
+            await run_in_threadpool(insert_case_pending, case_id, keys, {})
+        with span("ingest_step", step="enqueue"):
+            await run_in_threadpool(enqueue_case, case_id, keys, {}, form.hashes, form.derivatives)
     # Render case page
     return JSONResponse({"case_id": case_id, "redirect": f"/ui/case/{case_id}"})
 
@@ -50,14 +53,56 @@ def ui_case(request: Request, case_id: str):
 
 
 @router.get("/ui/case/{case_id}/json", response_model=CaseResponse)
-def ui_case_json(case_id: str):
-    item = get_case(case_id)
+def ui_case_json(case_id: str, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    item = get_case_cache().get(case_id)
     if not item:
         raise HTTPException(status_code=404, detail="case not found")
-    return CaseResponse(
-        case_id=case_id,
-        status=item.get("status", "PENDING"),
-        fraud_score=item.get("fraud_score"),
-        reasons=item.get("reasons", []),
-    )
+    resp = case_response(case_id, item)
+    etag = case_etag(resp)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return resp
+
+
+# Comment line sent when nothing changed, so proxies keep the stream open
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+@router.get("/ui/case/{case_id}/events")
+async def ui_case_events(request: Request, case_id: str, last_event_id: Optional[str] = Header(default=None)):
+    """Server-sent events: one `status` event per change (id = ETag), until the case is
+    PROCESSED/ERROR or CASE_WAIT_MAX seconds pass (the browser then reconnects)."""
+    if await current_case(case_id) is None:
+        raise HTTPException(status_code=404, detail="case not found")
+    max_seconds = get_settings().case_wait_max
+
+    async def stream() -> AsyncIterator[str]:
+        since = last_event_id
+        deadline = time.monotonic() + max_seconds
+        yield "retry: 2000\n\n"
+        while not await request.is_disconnected():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if since is None:
+                # First connection: send the current state straight away
+                current = await current_case(case_id)
+            else:
+                result = await wait_for_change(case_id, since, min(SSE_KEEPALIVE_SECONDS, remaining))
+                current = result[:2] if result else None
+            if current is None:
+                return
+            resp, etag = current
+            if etag_matches(since, etag):
+                if resp.status in TERMINAL_STATUSES:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            since = etag
+            yield f"event: status\nid: {etag}\ndata: {json.dumps(resp.model_dump(mode='json'))}\n\n"
+            if resp.status in TERMINAL_STATUSES:
+                return
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from .aws import delete_s3_objects, save_derivatives_to_s3, stored_objects
+from .config import get_settings
+
+
+# S3 requires every multipart part except the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+# Non-file form fields are small JSON/text values; anything larger is rejected
+MAX_FIELD_BYTES = 64 * 1024
+# Image form field -> object name under cases/{case_id}/
+IMAGE_FILE_FIELDS = {"doc_front": "front", "doc_back": "back", "selfie": "selfie"}
+
+
+class S3StreamingUpload:
+    """Streams one object to S3 as data arrives, hashing it incrementally.
+
+    Objects smaller than one part go up with a single put_object, larger ones with a
+    multipart upload. Either way the sha256 is stored as the object's `sha256` tag (as
+    for buffered uploads): a multipart upload only knows it at the end, after its
+    metadata is fixed, so it is tagged once complete. At most one
+    part is buffered, so memory stays bounded regardless of object size. Nothing is
+    written for an empty stream.
+
+    With `retain`, the body of an object that went up in a single put_object (one part
+    or less) is kept for making derivatives once it is complete; see `retained`. It is
+    the buffer that was uploaded, not a second copy, and larger objects keep nothing.
+    """
+
+    def __init__(self, key: str, content_type: Optional[str] = None, part_size: Optional[int] = None, retain: bool = False):
+        settings = get_settings()
+        self.key = key
+        self.content_type = content_type or "image/jpeg"
+        self.part_size = max(MIN_PART_SIZE, part_size or settings.upload_part_size)
+        self.size = 0
+        self._bucket = settings.s3_bucket
+        self._kms_key = settings.kms_key_arn or None
+        self._s3 = settings.boto_client("s3")
+        self._sha = hashlib.sha256()
+        self._buf = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+        self._created_at = datetime.now(timezone.utc).isoformat()
+        self._retain = retain
+        self._body: Optional[bytes] = None
+
+    def feed(self, data: bytes) -> bool:
+        """Buffer and hash a chunk (non-blocking). Returns True when a full part is ready to flush."""
+        self._sha.update(data)
+        self._buf.extend(data)
+        self.size += len(data)
+        return len(self._buf) >= self.part_size
+
+    @property
+    def retained(self) -> Optional[bytes]:
+        """The complete object, if it was retained (None for multipart uploads or when not asked for)."""
+        return self._body
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def _sse_args(self) -> Dict[str, Any]:
+        if not self._kms_key:
+            return {}
+        return {"ServerSideEncryption": "aws:kms", "SSEKMSKeyId": self._kms_key}
+
+    def flush(self) -> None:
+        """Upload every full part currently buffered (blocking)."""
+        while len(self._buf) >= self.part_size:
+            if self._upload_id is None:
+                resp = self._s3.create_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self.key,
+                    ContentType=self.content_type,
+                    Metadata={"created_at": self._created_at},
+                    **self._sse_args(),
+                )
+                self._upload_id = resp["UploadId"]
+            self._upload_part(bytes(self._buf[: self.part_size]))
+            del self._buf[: self.part_size]
+
+    def _upload_part(self, body: bytes) -> None:
+        number = len(self._parts) + 1
+        resp = self._s3.upload_part(Bucket=self._bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=body)
+        self._parts.append({"ETag": resp["ETag"], "PartNumber": number})
+
+    def complete(self) -> Optional[str]:
+        """Finish the object (blocking). Returns the key, or None if nothing was written."""
+        if self._upload_id is None:
+            if self.size == 0:
+                return None
+            body = bytes(self._buf)
+            self._s3.put_object(
+                Bucket=self._bucket,
+                Key=self.key,
+                Body=body,
+                ContentType=self.content_type,
+                Metadata={"created_at": self._created_at},
+                Tagging=urlencode({"sha256": self.sha256}),
+                **self._sse_args(),
+            )
+            if self._retain:
+                self._body = body
+        else:
+            if self._buf:
+                self._upload_part(bytes(self._buf))
+            self._s3.complete_multipart_upload(
+                Bucket=self._bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts}
+            )
+            self._s3.put_object_tagging(
+                Bucket=self._bucket, Key=self.key, Tagging={"TagSet": [{"Key": "sha256", "Value": self.sha256}]}
+            )
+        self._buf = bytearray()
+        return self.key
+
+    def abort(self) -> None:
+        self._buf = bytearray()
+        if self._upload_id is not None:
+            try:
+                self._s3.abort_multipart_upload(Bucket=self._bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception:
+                pass
+            self._upload_id = None
+
+
+async def iter_multipart(request: Request) -> AsyncIterator[Tuple[str, Any]]:
+    """Parse a multipart/form-data body as it streams in.
+
+    Yields ("part", (field_name, filename_or_None, content_type)), then ("data", bytes)
+    for each chunk of that part, then ("end", None).
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="multipart/form-data body with a boundary required")
+
+    events: List[Tuple[str, Any]] = []
+    part: Dict[str, Any] = {}
+
+    def on_part_begin() -> None:
+        part.clear()
+        part["headers"] = {}
+        part["field"] = b""
+        part["value"] = b""
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part["value"] += data[start:end]
+
+    def on_header_end() -> None:
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = b""
+        part["value"] = b""
+
+    def on_headers_finished() -> None:
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name")
+        if name is None:
+            raise HTTPException(status_code=400, detail='Content-Disposition "name" required')
+        filename = options.get(b"filename")
+        content_type = part["headers"].get(b"content-type")
+        events.append((
+            "part",
+            (
+                name.decode("utf-8", "replace"),
+                filename.decode("utf-8", "replace") if filename is not None else None,
+                content_type.decode("latin-1") if content_type else None,
+            ),
+        ))
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end() -> None:
+        events.append(("end", None))
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    async for chunk in request.stream():
+        try:
+            parser.write(chunk)
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=400, detail="Malformed multipart body")
+        for event in events:
+            yield event
+        events.clear()
+    parser.finalize()
+    for event in events:
+        yield event
+
+
+class StreamedForm:
+    def __init__(self):
+        self.keys: Dict[str, Optional[str]] = {}
+        self.hashes: Dict[str, str] = {}
+        self.content_types: Dict[str, str] = {}
+        self.fields: Dict[str, str] = {}
+        # Derivative keys by image name, then kind (see app.derivatives)
+        self.derivatives: Dict[str, Dict[str, str]] = {}
+
+
+async def stream_form_to_s3(request: Request, case_id: str, file_fields: Dict[str, str]) -> StreamedForm:
+    """Stream the file parts named in file_fields ({form field: object name}) straight to
+    S3 under cases/{case_id}/{name}.jpg; small non-file fields are collected as text.
+    Other parts are drained and ignored. If the request fails, the upload in progress
+    is aborted and the images and derivatives already stored are deleted.
+
+    Each completed image's derivatives are made and uploaded in the background while
+    the rest of the body streams in; all of them are done when this returns."""
+    settings = get_settings()
+    # Derivatives are made from objects that fit in one part, from the buffer they were
+    # uploaded from; larger ones are read from the original by the worker
+    retain = settings.image_derivatives
+    form = StreamedForm()
+    for name in file_fields.values():
+        form.keys[name] = None
+    upload: Optional[S3StreamingUpload] = None
+    target: Optional[str] = None
+    field: Optional[Tuple[str, bytearray]] = None
+    derived: List[Tuple[str, "asyncio.Future[Dict[str, str]]"]] = []
+    try:
+        async for kind, value in iter_multipart(request):
+            if kind == "part":
+                field_name, filename, content_type = value
+                if field_name in file_fields:
+                    target = file_fields[field_name]
+                    upload = S3StreamingUpload(f"cases/{case_id}/{target}.jpg", content_type, retain=retain)
+                elif filename is None:
+                    field = (field_name, bytearray())
+            elif kind == "data":
+                if upload is not None:
+                    if upload.feed(value):
+                        await run_in_threadpool(upload.flush)
+                elif field is not None:
+                    field[1].extend(value)
+                    if len(field[1]) > MAX_FIELD_BYTES:
+                        raise HTTPException(status_code=413, detail=f"Form field '{field[0]}' too large")
+            elif kind == "end":
+                if upload is not None:
+                    key = await run_in_threadpool(upload.complete)
+                    if key:
+                        form.keys[target] = key
+                        form.hashes[target] = upload.sha256
+                        form.content_types[target] = upload.content_type
+                        data = upload.retained
+                        if data:
+                            derived.append((target, asyncio.ensure_future(
+                                run_in_threadpool(save_derivatives_to_s3, case_id, target, data, upload.sha256)
+                            )))
+                    upload = None
+                elif field is not None:
+                    form.fields[field[0]] = field[1].decode("utf-8", "replace")
+                    field = None
+        for name, fut in derived:
+            keys = await fut
+            if keys:
+                form.derivatives[name] = keys
+    except BaseException:
+        if upload is not None:
+            await run_in_threadpool(upload.abort)
+        # Derivative uploads already running cannot be cancelled: wait for them so that
+        # what they stored is deleted along with the images completed earlier in the form
+        done = await asyncio.gather(*(fut for _, fut in derived), return_exceptions=True)
+        stored = {name: keys for (name, _), keys in zip(derived, done) if isinstance(keys, dict)}
+        await run_in_threadpool(delete_s3_objects, stored_objects(form.keys, stored))
+        raise
+    return form
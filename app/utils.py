@@ -1,30 +1,23 @@
 import base64
 import hashlib
-import re
 from typing import Tuple
 
 
-DATA_URI_RE = re.compile(r"^data:(?P<mime>[-\w./+]+);base64,(?P<data>.*)$", re.IGNORECASE)
-
-
 def decode_base64_image(b64: str) -> Tuple[bytes, str]:
     """Decode base64 image string, supports data URI. Returns bytes and inferred mime type.
     Defaults mime to image/jpeg when unknown.
     """
-    match = DATA_URI_RE.match(b64)
-    if match:
-        mime = match.group("mime")
-        data = match.group("data")
-        raw = base64.b64decode(data)
-        return raw, mime
-    # Plain base64
-    try:
-        raw = base64.b64decode(b64, validate=True)
-        return raw, "image/jpeg"
-    except Exception:
-        # try forgiving decode
-        raw = base64.b64decode(b64)
-        return raw, "image/jpeg"
+    mime = "image/jpeg"
+    data = b64
+    # Only the short data URI header is inspected; the payload is never scanned twice
+    if b64[:5].lower() == "data:":
+        comma = b64.find(",", 0, 256)
+        header = b64[5:comma] if comma != -1 else ""
+        if header.lower().endswith(";base64"):
+            mime = header[: -len(";base64")] or mime
+            data = b64[comma + 1 :]
+    # Non-alphabet characters (e.g. line breaks) are skipped, as the forgiving decode did
+    return base64.b64decode(data), mime
 
 
 def sha256_hex(data: bytes) -> str:
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from common.velocity import bucket_start
+
+# Buckets outlive the longest window (7d) by a day, then expire via TTL
+RETENTION_SECONDS = 8 * 24 * 3600
+DIMENSIONS = ("device", "ip")
+
+
+def velocity_keys(metadata: Optional[dict]) -> List[Tuple[str, str]]:
+    """(dimension, value) pairs a submission counts towards: its device hash and IP."""
+    metadata = metadata or {}
+    values = {"device": metadata.get("device_hash"), "ip": metadata.get("ip")}
+    return [(dim, str(values[dim])) for dim in DIMENSIONS if values[dim]]
+
+
+def _update(table: str, dim: str, value: str, bucket: int, n: int) -> Dict[str, Any]:
+    return {
+        "TableName": table,
+        "Key": {"velocity_key": {"S": f"{dim}#{value}"}, "bucket": {"N": str(bucket)}},
+        "UpdateExpression": "ADD #n :inc SET #ttl = :ttl",
+        "ExpressionAttributeNames": {"#n": "n", "#ttl": "ttl"},
+        "ExpressionAttributeValues": {":inc": {"N": str(n)}, ":ttl": {"N": str(bucket + RETENTION_SECONDS)}},
+    }
+
+
+def aggregated_updates(table: str, metadatas: Iterable[Optional[dict]], ts: Optional[float] = None) -> List[Dict[str, Any]]:
+    """update_item arguments for many submissions at once: one ADD per distinct counter."""
+    bucket = bucket_start(time.time() if ts is None else ts)
+    counts: Counter = Counter(k for metadata in metadatas for k in velocity_keys(metadata))
+    return [_update(table, dim, value, bucket, n) for (dim, value), n in counts.items()]
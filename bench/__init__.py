@@ -0,0 +1,2 @@
+"""Offline benchmark harness: in-process AWS stand-ins, synthetic cases and an
+end-to-end runner (`python -m bench.run --help`)."""
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Open-loop load generator for the ingest API.
+
+Requests are sent on a fixed arrival schedule (Poisson by default) regardless of how
+fast the API answers, so a saturated service shows up as growing latency and errors
+instead of a silently lower request rate. Each accepted case is then followed on
+/v1/case/{id}/wait (or polled on /v1/case/{id}) until it reaches PROCESSED/ERROR.
+
+Reported per time window (by send time) and overall:
+  ingest     request latency of POST /v1/ingest or /ui/ingest
+  decision   queue-to-decision: ingest response until the case is terminal
+  errors     non-2xx/transport failures, decision timeouts and dropped arrivals
+
+Decision latency is only as fine as the server's CASE_WAIT_INTERVAL/CASE_CACHE_TTL
+(or --poll-interval with --poll poll).
+
+Workload: synthetic cases (bench.synthetic), or --replay FILE with one IngestRequest
+JSON body per line (an optional "path" key picks /v1/ingest or /ui/ingest).
+
+Examples:
+  python -m bench.load --url https://api.example.com --api-key $KEY --rate 5 --duration 300
+  python -m bench.load --in-process --rate 20 --duration 30 --ui-fraction 0.3
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.run import API_KEY, percentiles  # noqa: E402
+from bench.synthetic import generate_cases  # noqa: E402
+
+V1_INGEST = "/v1/ingest"
+UI_INGEST = "/ui/ingest"
+TERMINAL_STATUSES = ("PROCESSED", "ERROR")
+# IngestRequest field -> /ui/ingest form field
+UI_FORM_FIELDS = {"doc_front_b64": "doc_front", "doc_back_b64": "doc_back", "selfie_b64": "selfie"}
+
+
+@dataclass
+class Outcome:
+    sent_at: float
+    path: str
+    status_code: Optional[int] = None
+    ingest_s: Optional[float] = None
+    decision_s: Optional[float] = None
+    case_status: Optional[str] = None
+    error: Optional[str] = None
+    lag_s: float = 0.0
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def arrival_times(rate: float, duration: float, rng: random.Random, process: str = "poisson") -> List[float]:
+    """Send offsets (seconds from start) for `rate` requests/s over `duration` seconds."""
+    if rate <= 0:
+        return []
+    if process == "uniform":
+        return [i / rate for i in range(int(rate * duration))]
+    out, t = [], rng.expovariate(rate)
+    while t < duration:
+        out.append(t)
+        t += rng.expovariate(rate)
+    return out
+
+
+def synthetic_requests(n: int, ui_fraction: float = 0.0, seed: int = 7, **kwargs: Any) -> List[Dict[str, Any]]:
+    rng = random.Random(seed + 1)
+    reqs = []
+    for case in generate_cases(n, seed=seed, **kwargs):
+        body: Dict[str, Any] = {
+            "doc_front_b64": base64.b64encode(case.front).decode(),
+            "selfie_b64": base64.b64encode(case.selfie).decode(),
+            "metadata": case.metadata,
+        }
+        if case.back:
+            body["doc_back_b64"] = base64.b64encode(case.back).decode()
+        reqs.append({"path": UI_INGEST if rng.random() < ui_fraction else V1_INGEST, "body": body})
+    return reqs
+
+
+def load_replay(path: Path, ui_fraction: float = 0.0, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed + 1)
+    reqs = []
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        body = json.loads(line)
+        target = body.pop("path", None) or (UI_INGEST if rng.random() < ui_fraction else V1_INGEST)
+        reqs.append({"path": target, "body": body})
+    return reqs
+
+
+def _ui_files(body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        form: (f"{form}.jpg", base64.b64decode(body[field]), "image/jpeg")
+        for field, form in UI_FORM_FIELDS.items()
+        if body.get(field)
+    }
+
+
+class LoadRunner:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        api_key: Optional[str],
+        poll: str = "wait",
+        poll_interval: float = 1.0,
+        decision_timeout: float = 300.0,
+        max_inflight: int = 1000,
+    ):
+        self.client = client
+        self.headers = {"x-api-key": api_key} if api_key else {}
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.decision_timeout = decision_timeout
+        self.max_inflight = max_inflight
+        self._inflight = 0
+
+    async def run(self, requests: List[Dict[str, Any]], arrivals: List[float]) -> List[Outcome]:
+        """Fire requests[i % len(requests)] at each arrival offset; returns one Outcome per arrival."""
+        start = time.perf_counter()
+        outcomes: List[Outcome] = []
+        tasks = []
+        for i, offset in enumerate(arrivals):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            req = requests[i % len(requests)]
+            out = Outcome(sent_at=offset, path=req["path"], lag_s=max(0.0, -delay))
+            outcomes.append(out)
+            if self._inflight >= self.max_inflight:
+                # Open loop: an arrival the generator cannot carry is an error, not a pause
+                out.error = "dropped"
+                continue
+            tasks.append(asyncio.create_task(self._one(req, out)))
+        if tasks:
+            await asyncio.gather(*tasks)
+        return outcomes
+
+    async def _one(self, req: Dict[str, Any], out: Outcome) -> None:
+        self._inflight += 1
+        try:
+            t0 = time.perf_counter()
+            try:
+                if req["path"] == UI_INGEST:
+                    r = await self.client.post(UI_INGEST, files=_ui_files(req["body"]))
+                else:
+                    r = await self.client.post(V1_INGEST, json=req["body"], headers=self.headers)
+            except httpx.HTTPError as exc:
+                out.error = type(exc).__name__
+                return
+            out.ingest_s = time.perf_counter() - t0
+            out.status_code = r.status_code
+            if r.status_code >= 300:
+                out.error = f"http_{r.status_code}"
+                return
+            if self.poll == "none":
+                return
+            accepted = time.perf_counter()
+            out.case_status = await self._follow(r.json()["case_id"], accepted)
+            if out.case_status in TERMINAL_STATUSES:
+                out.decision_s = time.perf_counter() - accepted
+                if out.case_status == "ERROR":
+                    out.error = "case_error"
+            elif out.error is None:
+                out.error = "decision_timeout"
+        finally:
+            self._inflight -= 1
+
+    async def _follow(self, case_id: str, accepted: float) -> Optional[str]:
+        status, etag = None, None
+        while time.perf_counter() - accepted < self.decision_timeout:
+            remaining = self.decision_timeout - (time.perf_counter() - accepted)
+            headers = dict(self.headers)
+            try:
+                if self.poll == "wait":
+                    r = await self.client.get(
+                        f"/v1/case/{case_id}/wait",
+                        params={"timeout": min(20.0, max(0.0, remaining))},
+                        headers=headers,
+                        timeout=30.0,
+                    )
+                else:
+                    if etag:
+                        headers["If-None-Match"] = etag
+                    r = await self.client.get(f"/v1/case/{case_id}", headers=headers)
+            except httpx.HTTPError:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if r.status_code == 200:
+                etag = r.headers.get("ETag")
+                status = r.json().get("status")
+                if status in TERMINAL_STATUSES:
+                    return status
+            elif r.status_code != 304:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if self.poll == "poll":
+                await asyncio.sleep(self.poll_interval)
+        return status
+
+
+def _ms(values: List[float]) -> Dict[str, float]:
+    return {k: v * 1000.0 for k, v in percentiles(values).items()}
+
+
+def summarize(outcomes: List[Outcome]) -> Dict[str, Any]:
+    ingest = [o.ingest_s for o in outcomes if o.ingest_s is not None and o.status_code and o.status_code < 300]
+    decision = [o.decision_s for o in outcomes if o.decision_s is not None]
+    errors: Dict[str, int] = {}
+    for o in outcomes:
+        if o.failed:
+            errors[o.error] = errors.get(o.error, 0) + 1
+    return {
+        "sent": len(outcomes),
+        "errors": sum(errors.values()),
+        "error_rate": sum(errors.values()) / len(outcomes) if outcomes else 0.0,
+        "error_kinds": errors,
+        "ingest_ms": _ms(ingest),
+        "decision_ms": _ms(decision),
+        "max_lag_ms": max((o.lag_s for o in outcomes), default=0.0) * 1000.0,
+    }
+
+
+def report(outcomes: List[Outcome], window: float, duration: float) -> Dict[str, Any]:
+    windows = []
+    n_windows = max(1, int(-(-duration // window)))
+    for w in range(n_windows):
+        lo, hi = w * window, (w + 1) * window
+        batch = [o for o in outcomes if lo <= o.sent_at < hi]
+        windows.append({"start_s": lo, "rate_per_s": len(batch) / window, **summarize(batch)})
+    by_path = {p: summarize([o for o in outcomes if o.path == p]) for p in sorted({o.path for o in outcomes})}
+    return {"overall": summarize(outcomes), "by_path": by_path, "windows": windows}
+
+
+def format_report(rep: Dict[str, Any]) -> str:
+    def row(label: str, s: Dict[str, Any]) -> str:
+        i, d = s["ingest_ms"], s["decision_ms"]
+        return (
+            f"{label:>8} {s['sent']:>6} {s['error_rate'] * 100:>6.1f}% "
+            f"{i['p50']:>8.0f} {i['p95']:>8.0f} {i['p99']:>8.0f} "
+            f"{d['p50']:>9.0f} {d['p95']:>9.0f} {d['p99']:>9.0f}"
+        )
+
+    lines = [f"{'window':>8} {'sent':>6} {'errors':>7} {'ing p50':>8} {'ing p95':>8} {'ing p99':>8} {'dec p50':>9} {'dec p95':>9} {'dec p99':>9}  (ms)"]
+    lines += [row(f"{w['start_s']:.0f}s", w) for w in rep["windows"]]
+    lines.append(row("total", rep["overall"]))
+    for path, s in rep["by_path"].items():
+        lines.append(row(path.split("/")[1], s))
+    if rep["overall"]["error_kinds"]:
+        lines.append("errors: " + ", ".join(f"{k}={v}" for k, v in sorted(rep["overall"]["error_kinds"].items())))
+    lines.append(f"max send lag: {rep['overall']['max_lag_ms']:.1f}ms")
+    return "\n".join(lines)
+
+
+@contextmanager
+def in_process(concurrency: int = 8, poll_interval: float = 0.1) -> Iterator[httpx.AsyncClient]:
+    """The API app on an in-memory transport over the bench AWS stand-ins, with the real
+    SQS consumer and worker draining the queue in the background."""
+    from app import case_cache
+    from app.config import get_settings
+    from bench.run import _key_schema, _local_indexes, installed
+    from bench.stand_ins import Latency, StandIns
+    from worker.consumer import CaseConsumer
+    from worker.processor import process_case
+
+    from app.main import app
+
+    stand_ins = StandIns(_key_schema(), Latency(0), _local_indexes())
+    with installed(stand_ins):
+        settings = get_settings()
+        previous = case_cache._cache, settings.case_wait_interval
+        # Finer than the service defaults so decision latency is not quantised to 1s
+        case_cache._cache = case_cache.CaseCache(ttl=poll_interval)
+        settings.case_wait_interval = poll_interval
+        consumer = CaseConsumer(stand_ins.sqs, "bench-queue", lambda m: process_case(json.loads(m["Body"])), concurrency=concurrency, visibility_timeout=300, wait_seconds=1)
+        runner = threading.Thread(target=consumer.run, name="load-consumer", daemon=True)
+        runner.start()
+        try:
+            yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        finally:
+            consumer.stop()
+            runner.join()
+            case_cache._cache, settings.case_wait_interval = previous
+
+
+async def _run(client: httpx.AsyncClient, requests: List[Dict[str, Any]], arrivals: List[float], **kwargs: Any) -> List[Outcome]:
+    async with client:
+        return await LoadRunner(client, **kwargs).run(requests, arrivals)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Open-loop ingest load generator")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="API base URL")
+    target.add_argument("--in-process", action="store_true", help="run the API and worker in this process against AWS stand-ins")
+    ap.add_argument("--api-key", help="x-api-key for /v1 routes")
+    ap.add_argument("--rate", type=float, required=True, help="target arrivals per second")
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds of arrivals")
+    ap.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    ap.add_argument("--replay", type=Path, help="JSONL of IngestRequest bodies to replay (cycled)")
+    ap.add_argument("--cases", type=int, default=50, help="distinct synthetic cases to cycle through")
+    ap.add_argument("--ui-fraction", type=float, default=0.0, help="share of requests sent to /ui/ingest")
+    ap.add_argument("--image-size", default="1200x760")
+    ap.add_argument("--poll", choices=("wait", "poll", "none"), default="wait", help="follow cases via the long-poll endpoint, plain polling, or not at all")
+    ap.add_argument("--poll-interval", type=float, default=1.0)
+    ap.add_argument("--decision-timeout", type=float, default=300.0)
+    ap.add_argument("--max-inflight", type=int, default=1000)
+    ap.add_argument("--window", type=float, default=10.0, help="report window in seconds")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="write the report and raw outcomes to this path")
+    args = ap.parse_args(argv)
+
+    if args.replay:
+        requests = load_replay(args.replay, args.ui_fraction, args.seed)
+    else:
+        width, height = (int(v) for v in args.image_size.lower().split("x"))
+        requests = synthetic_requests(args.cases, args.ui_fraction, args.seed, width=width, height=height)
+    if not requests:
+        ap.error("no requests to send")
+    arrivals = arrival_times(args.rate, args.duration, random.Random(args.seed), args.arrivals)
+    opts = dict(poll=args.poll, poll_interval=args.poll_interval, decision_timeout=args.decision_timeout, max_inflight=args.max_inflight)
+
+    if args.in_process:
+        with in_process(poll_interval=min(args.poll_interval, 0.1)) as client:
+            outcomes = asyncio.run(_run(client, requests, arrivals, api_key=API_KEY, **opts))
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60.0, limits=httpx.Limits(max_connections=args.max_inflight))
+        outcomes = asyncio.run(_run(client, requests, arrivals, api_key=args.api_key, **opts))
+
+    rep = report(outcomes, args.window, args.duration)
+    print(format_report(rep))
+    if args.json:
+        Path(args.json).write_text(json.dumps({**rep, "outcomes": [asdict(o) for o in outcomes]}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
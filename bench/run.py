@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark against in-process AWS stand-ins.
+
+Modes:
+  worker  cases are pre-loaded into the S3 stand-in and `process_case` runs on
+          `--concurrency` threads (worker throughput, per-stage latency)
+  ingest  cases are POSTed to /v1/ingest through the FastAPI app (API throughput)
+  e2e     ingest, then the real SQS consumer drains the queue (ingest -> decision)
+
+Example:
+  python -m bench.run --mode e2e --cases 200 --concurrency 8 --latency-ms 20 \\
+      --latency textract=800 --latency rekognition=300 --json bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import math
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.stand_ins import DynamoResourceStandIn, Latency, StandIns, content_key  # noqa: E402
+from bench.synthetic import SyntheticCase, generate_cases  # noqa: E402
+
+BUCKET = "bench-bucket"
+API_KEY = "bench-key"
+
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles (the smallest value with at least p% of values at or below it)."""
+    if not values:
+        return {f"p{p}": 0.0 for p in points}
+    ordered = sorted(values)
+    out = {}
+    for p in points:
+        idx = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+        out[f"p{p}"] = ordered[idx]
+    out["mean"] = statistics.fmean(ordered)
+    return out
+
+
+def _key_schema() -> Dict[str, tuple]:
+    from worker.config import get_worker_settings
+
+    s = get_worker_settings()
+    return {
+        s.dynamo_cases_table: ("case_id",),
+        s.dynamo_events_table: ("case_id", "ts"),
+        s.dynamo_velocity_table: ("velocity_key", "bucket"),
+        s.result_cache_table: ("cache_key",),
+        s.near_dup_table: ("bucket_key", "case_id"),
+    }
+
+
+def _local_indexes() -> Dict[str, Dict[str, str]]:
+    from worker.config import get_worker_settings
+    from worker.near_dup import RECENT_INDEX
+
+    return {get_worker_settings().near_dup_table: {RECENT_INDEX: "ts"}}
+
+
+@contextmanager
+def installed(stand_ins: StandIns) -> Iterator[StandIns]:
+    """Route every boto3 client/resource in the API and the worker to the stand-ins."""
+    from app import config as app_config, security
+    from worker import aws_clients, near_dup, persistence, result_cache, velocity
+    from worker.metrics import get_metrics
+
+    previous_key = security._cached_api_key
+    security._cached_api_key = API_KEY
+    for service, stand_in in stand_ins.clients().items():
+        aws_clients.set_client(service, stand_in)
+        app_config.set_boto_client(service, stand_in)
+    app_config.set_boto_resource("dynamodb", DynamoResourceStandIn(stand_ins.dynamodb))
+    # Fresh process-wide caches so runs do not see each other's state
+    result_cache._cache = None
+    velocity._store = None
+    near_dup._index = None
+    try:
+        yield stand_ins
+    finally:
+        persistence.get_artifact_uploader().drain(timeout=30)
+        get_metrics().flush()
+        aws_clients.reset_clients()
+        app_config.reset_boto_clients()
+        security._cached_api_key = previous_key
+        result_cache._cache = None
+        velocity._store = None
+        near_dup._index = None
+
+
+def seed_case(stand_ins: StandIns, case: SyntheticCase, case_id: str) -> Dict[str, Any]:
+    """Put a case's images straight into S3; returns its queue message."""
+    keys: Dict[str, Optional[str]] = {"front": None, "back": None, "selfie": None}
+    for name, data in (("front", case.front), ("back", case.back), ("selfie", case.selfie)):
+        if data:
+            keys[name] = f"cases/{case_id}/{name}.jpg"
+            stand_ins.s3.objects[(BUCKET, keys[name])] = {"Body": data, "ContentType": "image/jpeg", "Metadata": {}, "Tags": {}}
+    return {"case_id": case_id, "bucket": BUCKET, "s3_keys": keys, "metadata": case.metadata}
+
+
+def register_answers(stand_ins: StandIns, cases: List[SyntheticCase]) -> None:
+    """What Textract and Rekognition "see" in each case's images."""
+    for case in cases:
+        stand_ins.textract.responses[content_key(case.front)] = case.textract
+        stand_ins.rekognition.similarities[content_key(case.selfie)] = case.similarity
+
+
+def run_worker(stand_ins: StandIns, cases: List[SyntheticCase], concurrency: int) -> Dict[str, Any]:
+    from worker.processor import process_case
+
+    messages = [seed_case(stand_ins, c, f"bench{c.index:06d}") for c in cases]
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    decisions: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(msg: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        result = process_case(msg)
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            decisions[result["decision"]] = decisions.get(result["decision"], 0) + 1
+            for stage, seconds in result["timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, messages))
+    wall = time.perf_counter() - started
+    return _report("worker", len(messages), wall, latencies, stages, decisions)
+
+
+def _ingest_body(case: SyntheticCase) -> Dict[str, Any]:
+    # bench_index travels with the case metadata so the consumer can match it to its request
+    body = {
+        "doc_front_b64": base64.b64encode(case.front).decode(),
+        "selfie_b64": base64.b64encode(case.selfie).decode(),
+        "metadata": {**case.metadata, "bench_index": case.index},
+    }
+    if case.back:
+        body["doc_back_b64"] = base64.b64encode(case.back).decode()
+    return body
+
+
+def _ingest_all(stand_ins: StandIns, cases: List[SyntheticCase], concurrency: int, submitted: Dict[int, float]) -> List[float]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(case: SyntheticCase) -> None:
+        t0 = submitted[case.index] = time.perf_counter()
+        r = client.post("/v1/ingest", headers={"x-api-key": API_KEY}, json=_ingest_body(case))
+        r.raise_for_status()
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, cases))
+    return latencies
+
+
+def run_ingest(stand_ins: StandIns, cases: List[SyntheticCase], concurrency: int) -> Dict[str, Any]:
+    submitted: Dict[int, float] = {}
+    started = time.perf_counter()
+    latencies = _ingest_all(stand_ins, cases, concurrency, submitted)
+    wall = time.perf_counter() - started
+    return _report("ingest", len(cases), wall, latencies, {}, {})
+
+
+def run_e2e(stand_ins: StandIns, cases: List[SyntheticCase], concurrency: int, timeout: float = 600.0) -> Dict[str, Any]:
+    """Ingest every case through the API while the real SQS consumer drains the queue.
+    Latency is measured from the start of the ingest request to the persisted decision.
+    Raises TimeoutError if cases are still undecided `timeout` seconds after the start
+    (a failing case is only redelivered after the visibility timeout)."""
+    from worker.consumer import CaseConsumer
+    from worker.processor import process_case
+
+    submitted: Dict[int, float] = {}
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    decisions: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def handler(m: Dict[str, Any]) -> Any:
+        msg = json.loads(m["Body"])
+        result = process_case(msg)
+        with lock:
+            latencies.append(time.perf_counter() - submitted[msg["metadata"]["bench_index"]])
+            decisions[result["decision"]] = decisions.get(result["decision"], 0) + 1
+            for stage, seconds in result["timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+        return result
+
+    consumer = CaseConsumer(stand_ins.sqs, "bench-queue", handler, concurrency=concurrency, visibility_timeout=300, wait_seconds=1)
+    started = time.perf_counter()
+    runner = threading.Thread(target=consumer.run, name="bench-consumer", daemon=True)
+    runner.start()
+    try:
+        ingest_latencies = _ingest_all(stand_ins, cases, concurrency, submitted)
+        deadline = started + timeout
+        while True:
+            with lock:
+                done = len(latencies)
+            if done >= len(cases):
+                break
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{len(cases) - done} of {len(cases)} cases still outstanding after {timeout:g}s")
+            time.sleep(0.01)
+        wall = time.perf_counter() - started
+    finally:
+        consumer.stop()
+        runner.join()
+    report = _report("e2e", len(cases), wall, latencies, stages, decisions)
+    report["ingest_ms"] = {k: v * 1000.0 for k, v in percentiles(ingest_latencies).items()}
+    return report
+
+
+def _report(mode: str, n: int, wall: float, latencies: List[float], stages: Dict[str, List[float]], decisions: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "mode": mode,
+        "cases": n,
+        "wall_seconds": wall,
+        "throughput_per_s": n / wall if wall > 0 else 0.0,
+        "latency_ms": {k: v * 1000.0 for k, v in percentiles(latencies).items()},
+        "stages_ms": {s: {k: v * 1000.0 for k, v in percentiles(vals).items()} for s, vals in sorted(stages.items())},
+        "decisions": decisions,
+    }
+
+
+def run(
+    mode: str,
+    n: int,
+    concurrency: int,
+    latency: Latency,
+    fraud_rate: float = 0.2,
+    seed: int = 7,
+    image_size=(1200, 760),
+    timeout: float = 600.0,
+) -> Dict[str, Any]:
+    cases = generate_cases(n, fraud_rate=fraud_rate, seed=seed, width=image_size[0], height=image_size[1])
+    stand_ins = StandIns(_key_schema(), latency, _local_indexes())
+    register_answers(stand_ins, cases)
+    with installed(stand_ins):
+        if mode == "e2e":
+            report = run_e2e(stand_ins, cases, concurrency, timeout=timeout)
+        else:
+            report = {"worker": run_worker, "ingest": run_ingest}[mode](stand_ins, cases, concurrency)
+    report["aws_calls"] = stand_ins.call_counts()
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lat = report["latency_ms"]
+    lines = [
+        f"mode={report['mode']} cases={report['cases']} wall={report['wall_seconds']:.2f}s "
+        f"throughput={report['throughput_per_s']:.1f} cases/s",
+        f"{'latency':<14} p50={lat['p50']:8.1f}ms p90={lat['p90']:8.1f}ms p95={lat['p95']:8.1f}ms p99={lat['p99']:8.1f}ms",
+    ]
+    for stage, p in report["stages_ms"].items():
+        lines.append(f"  {stage:<12} p50={p['p50']:8.1f}ms p90={p['p90']:8.1f}ms p95={p['p95']:8.1f}ms p99={p['p99']:8.1f}ms")
+    if report.get("decisions"):
+        lines.append("decisions: " + ", ".join(f"{k}={v}" for k, v in sorted(report["decisions"].items())))
+    return "\n".join(lines)
+
+
+def _parse_overrides(items: List[str]) -> Dict[str, float]:
+    out = {}
+    for item in items:
+        name, _, ms = item.partition("=")
+        out[name] = float(ms)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark with AWS stand-ins")
+    ap.add_argument("--mode", choices=("worker", "ingest", "e2e"), default="worker")
+    ap.add_argument("--cases", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency for every AWS call")
+    ap.add_argument("--latency", action="append", default=[], metavar="SERVICE[.OP]=MS", help="per-service/operation override")
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--fraud-rate", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--image-size", default="1200x760")
+    ap.add_argument("--timeout", type=float, default=600.0, help="e2e: fail if cases are still undecided after this many seconds")
+    ap.add_argument("--json", help="write the full report to this path")
+    ap.add_argument("--max-p95-ms", type=float, help="exit non-zero if end-to-end p95 exceeds this (CI gate)")
+    args = ap.parse_args(argv)
+
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    latency = Latency(args.latency_ms, _parse_overrides(args.latency), jitter=args.jitter, seed=args.seed)
+    report = run(args.mode, args.cases, args.concurrency, latency, fraud_rate=args.fraud_rate, seed=args.seed, image_size=(width, height), timeout=args.timeout)
+    print(format_report(report))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.max_p95_ms is not None and report["latency_ms"]["p95"] > args.max_p95_ms:
+        print(f"p95 {report['latency_ms']['p95']:.1f}ms exceeds --max-p95-ms {args.max_p95_ms}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,554 @@
+"""In-process stand-ins for the AWS APIs the API and worker call.
+
+Each stand-in implements just the operations this codebase uses, keeps its state in
+memory, records call counts and sleeps for a configurable simulated latency, so the
+real code paths can be exercised and timed without AWS.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import botocore.exceptions
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+
+class Latency:
+    """Simulated per-call latency: `default_ms` (or a per-service / per-operation
+    override such as {"textract": 900, "s3.get_object": 30}) with +/- `jitter` spread."""
+
+    def __init__(self, default_ms: float = 0.0, overrides: Optional[Dict[str, float]] = None, jitter: float = 0.2, seed: int = 0):
+        self.default_ms = default_ms
+        self.overrides = dict(overrides or {})
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, service: str, operation: str) -> float:
+        ms = self.overrides.get(f"{service}.{operation}", self.overrides.get(service, self.default_ms))
+        if ms <= 0:
+            return 0.0
+        with self._lock:
+            spread = self._rng.uniform(-self.jitter, self.jitter)
+        return ms * (1.0 + spread) / 1000.0
+
+    def sleep(self, service: str, operation: str) -> None:
+        seconds = self.delay(service, operation)
+        if seconds:
+            time.sleep(seconds)
+
+
+class StandIn:
+    service = ""
+
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] += 1
+        self.latency.sleep(self.service, operation)
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._io = io.BytesIO(data)
+
+    def read(self, n: int = -1) -> bytes:
+        return self._io.read(n)
+
+
+class S3StandIn(StandIn):
+    service = "s3"
+
+    def __init__(self, latency: Optional[Latency] = None):
+        super().__init__(latency)
+        self.objects: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._uploads: Dict[str, Dict[str, Any]] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes = b"", ContentType: str = "binary/octet-stream", Metadata: Optional[dict] = None, Tagging: str = "", **_: Any):
+        self._call("put_object")
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        tags = dict(parse_qsl(Tagging)) if Tagging else {}
+        self.objects[(Bucket, Key)] = {"Body": bytes(data), "ContentType": ContentType, "Metadata": dict(Metadata or {}), "Tags": tags}
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket: str, Key: str, **_: Any):
+        self._call("get_object")
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise KeyError(f"NoSuchKey: s3://{Bucket}/{Key}")
+        return {"Body": _Body(obj["Body"]), "ContentType": obj["ContentType"], "Metadata": obj["Metadata"], "ContentLength": len(obj["Body"])}
+
+    def head_object(self, Bucket: str, Key: str, **_: Any):
+        self._call("head_object")
+        obj = self.objects[(Bucket, Key)]
+        return {"ContentType": obj["ContentType"], "Metadata": obj["Metadata"], "ContentLength": len(obj["Body"])}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, ContentType: str = "binary/octet-stream", Metadata: Optional[dict] = None, **_: Any):
+        self._call("create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        self._uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "ContentType": ContentType, "Metadata": dict(Metadata or {}), "Parts": {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes, **_: Any):
+        self._call("upload_part")
+        self._uploads[UploadId]["Parts"][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict, **_: Any):
+        self._call("complete_multipart_upload")
+        up = self._uploads.pop(UploadId)
+        data = b"".join(up["Parts"][p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.objects[(Bucket, Key)] = {"Body": data, "ContentType": up["ContentType"], "Metadata": up["Metadata"], "Tags": {}}
+        return {}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **_: Any):
+        self._call("abort_multipart_upload")
+        self._uploads.pop(UploadId, None)
+        return {}
+
+    def put_object_tagging(self, Bucket: str, Key: str, Tagging: dict, **_: Any):
+        self._call("put_object_tagging")
+        self.objects[(Bucket, Key)]["Tags"] = {t["Key"]: t["Value"] for t in Tagging["TagSet"]}
+        return {}
+
+    def get_object_tagging(self, Bucket: str, Key: str, **_: Any):
+        self._call("get_object_tagging")
+        tags = self.objects[(Bucket, Key)]["Tags"]
+        return {"TagSet": [{"Key": k, "Value": v} for k, v in tags.items()]}
+
+    def delete_objects(self, Bucket: str, Delete: dict, **_: Any):
+        self._call("delete_objects")
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+        return {}
+
+
+class SQSStandIn(StandIn):
+    """A single FIFO-ish queue with visibility timeouts (the queue URL is ignored)."""
+
+    service = "sqs"
+
+    def __init__(self, latency: Optional[Latency] = None, visibility_timeout: float = 60.0):
+        super().__init__(latency)
+        self.visibility_timeout = visibility_timeout
+        self._ready: deque = deque()
+        self._inflight: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._cond = threading.Condition()
+        self.deleted = 0
+
+    def _enqueue(self, body: str) -> str:
+        msg_id = uuid.uuid4().hex
+        with self._cond:
+            self._ready.append({"MessageId": msg_id, "Body": body, "ReceiveCount": 0})
+            self._cond.notify_all()
+        return msg_id
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **_: Any):
+        self._call("send_message")
+        return {"MessageId": self._enqueue(MessageBody)}
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[dict], **_: Any):
+        self._call("send_message_batch")
+        return {"Successful": [{"Id": e["Id"], "MessageId": self._enqueue(e["MessageBody"])} for e in Entries], "Failed": []}
+
+    def _requeue_expired(self, now: float) -> None:
+        for handle, (deadline, msg) in list(self._inflight.items()):
+            if deadline <= now:
+                del self._inflight[handle]
+                self._ready.append(msg)
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, WaitTimeSeconds: int = 0, VisibilityTimeout: Optional[int] = None, **_: Any):
+        self._call("receive_message")
+        timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._requeue_expired(now)
+                if self._ready or now >= deadline:
+                    break
+                self._cond.wait(min(0.05, deadline - now))
+            out = []
+            while self._ready and len(out) < MaxNumberOfMessages:
+                msg = self._ready.popleft()
+                msg["ReceiveCount"] += 1
+                handle = uuid.uuid4().hex
+                self._inflight[handle] = (time.monotonic() + timeout, msg)
+                out.append({"MessageId": msg["MessageId"], "ReceiptHandle": handle, "Body": msg["Body"]})
+        return {"Messages": out} if out else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **_: Any):
+        self._call("delete_message")
+        with self._cond:
+            if self._inflight.pop(ReceiptHandle, None) is not None:
+                self.deleted += 1
+        return {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: List[dict], **_: Any):
+        self._call("delete_message_batch")
+        with self._cond:
+            for e in Entries:
+                if self._inflight.pop(e["ReceiptHandle"], None) is not None:
+                    self.deleted += 1
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl: str, Entries: List[dict], **_: Any):
+        self._call("change_message_visibility_batch")
+        with self._cond:
+            for e in Entries:
+                entry = self._inflight.get(e["ReceiptHandle"])
+                if entry is not None:
+                    self._inflight[e["ReceiptHandle"]] = (time.monotonic() + e["VisibilityTimeout"], entry[1])
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def depth(self) -> Tuple[int, int]:
+        """(visible, in flight) message counts."""
+        with self._cond:
+            return len(self._ready), len(self._inflight)
+
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+_CLAUSE_RE = re.compile(r"\b(SET|ADD|REMOVE)\b", re.IGNORECASE)
+
+
+class DynamoStandIn(StandIn):
+    """Tables of low-level (attribute-value) items keyed by each table's key schema.
+
+    Supports the expression subset this codebase writes: SET/ADD/REMOVE update
+    clauses, `#name` placeholders, `pk = :v [AND sk >= :v]` key conditions (on the
+    table or a local secondary index, with ScanIndexForward and Limit) and
+    `attribute_not_exists(a) OR a < :v` put conditions.
+
+    `local_indexes` gives each table's local secondary indexes as {index name: sort key}.
+    """
+
+    service = "dynamodb"
+
+    def __init__(
+        self,
+        key_schema: Dict[str, Tuple[str, ...]],
+        latency: Optional[Latency] = None,
+        local_indexes: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        super().__init__(latency)
+        self.key_schema = dict(key_schema)
+        self.local_indexes = {table: dict(indexes) for table, indexes in (local_indexes or {}).items()}
+        self.tables: Dict[str, Dict[Tuple[Any, ...], Dict[str, Any]]] = {name: {} for name in key_schema}
+        self._data_lock = threading.RLock()
+
+    def _key(self, table: str, item_or_key: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(_deserializer.deserialize(item_or_key[k]) for k in self.key_schema[table])
+
+    def _table(self, name: str) -> Dict[Tuple[Any, ...], Dict[str, Any]]:
+        if name not in self.tables:
+            raise KeyError(f"ResourceNotFoundException: {name}")
+        return self.tables[name]
+
+    # --- writes ---
+    def _put(self, TableName: str, Item: Dict[str, Any], **_: Any) -> None:
+        with self._data_lock:
+            self._table(TableName)[self._key(TableName, Item)] = dict(Item)
+
+    def _update(
+        self,
+        TableName: str,
+        Key: Dict[str, Any],
+        UpdateExpression: str,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        **_: Any,
+    ) -> Dict[str, Any]:
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._data_lock:
+            table = self._table(TableName)
+            item = table.setdefault(self._key(TableName, Key), dict(Key))
+            parts = _CLAUSE_RE.split(UpdateExpression)
+            for verb, body in zip(parts[1::2], parts[2::2]):
+                for action in filter(None, (a.strip() for a in body.split(","))):
+                    verb_u = verb.upper()
+                    if verb_u == "SET":
+                        attr, value = (s.strip() for s in action.split("=", 1))
+                        item[names.get(attr, attr)] = values[value]
+                    elif verb_u == "ADD":
+                        attr, value = action.split()
+                        attr = names.get(attr, attr)
+                        current = float(item[attr]["N"]) if attr in item else 0.0
+                        total = current + float(values[value]["N"])
+                        item[attr] = {"N": str(int(total)) if total.is_integer() else str(total)}
+                    else:
+                        item.pop(names.get(action, action), None)
+            return dict(item)
+
+    def put_item(self, **kwargs: Any):
+        self._call("put_item")
+        with self._data_lock:
+            if kwargs.get("ConditionExpression") and not self._condition_holds(**kwargs):
+                raise botocore.exceptions.ClientError(
+                    {"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}},
+                    "PutItem",
+                )
+            self._put(**kwargs)
+        return {}
+
+    def _condition_holds(
+        self,
+        TableName: str,
+        Item: Dict[str, Any],
+        ConditionExpression: str,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        **_: Any,
+    ) -> bool:
+        """`attribute_not_exists(a)` and `a < :v` terms joined by OR."""
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        current = self._table(TableName).get(self._key(TableName, Item))
+        for term in re.split(r"\s+OR\s+", ConditionExpression, flags=re.IGNORECASE):
+            m = re.fullmatch(r"\s*attribute_not_exists\((\S+)\)\s*", term)
+            if m:
+                if current is None or names.get(m.group(1), m.group(1)) not in current:
+                    return True
+                continue
+            attr, value = re.fullmatch(r"\s*(\S+)\s*<\s*(\S+)\s*", term).groups()
+            attr = names.get(attr, attr)
+            if current is not None and attr in current and _deserializer.deserialize(current[attr]) < _deserializer.deserialize(values[value]):
+                return True
+        return False
+
+    def update_item(self, **kwargs: Any):
+        self._call("update_item")
+        self._update(**kwargs)
+        return {}
+
+    def transact_write_items(self, TransactItems: List[Dict[str, Any]], **_: Any):
+        self._call("transact_write_items")
+        with self._data_lock:
+            for op in TransactItems:
+                if "Put" in op:
+                    self._put(**op["Put"])
+                elif "Update" in op:
+                    self._update(**op["Update"])
+        return {}
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]], **_: Any):
+        self._call("batch_write_item")
+        with self._data_lock:
+            for table, requests in RequestItems.items():
+                for req in requests:
+                    if "PutRequest" in req:
+                        self._put(table, req["PutRequest"]["Item"])
+                    else:
+                        self._table(table).pop(self._key(table, req["DeleteRequest"]["Key"]), None)
+        return {"UnprocessedItems": {}}
+
+    # --- reads ---
+    def get_item(self, TableName: str, Key: Dict[str, Any], **_: Any):
+        self._call("get_item")
+        with self._data_lock:
+            item = self._table(TableName).get(self._key(TableName, Key))
+        return {"Item": dict(item)} if item else {}
+
+    def query(
+        self,
+        TableName: str,
+        KeyConditionExpression: str,
+        ExpressionAttributeValues: Dict[str, Any],
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        Select: Optional[str] = None,
+        IndexName: Optional[str] = None,
+        ScanIndexForward: bool = True,
+        Limit: Optional[int] = None,
+        **_: Any,
+    ):
+        self._call("query")
+        names = ExpressionAttributeNames or {}
+        conditions: List[Tuple[str, str, Any]] = []
+        for cond in re.split(r"\s+AND\s+", KeyConditionExpression, flags=re.IGNORECASE):
+            attr, op, value = re.match(r"\s*(\S+)\s*(=|>=|<=|>|<)\s*(\S+)\s*", cond).groups()
+            conditions.append((names.get(attr, attr), op, _deserializer.deserialize(ExpressionAttributeValues[value])))
+        ops: Dict[str, Callable[[Any, Any], bool]] = {
+            "=": lambda a, b: a == b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b, "<": lambda a, b: a < b,
+        }
+        partition = next((v for a, op, v in conditions if op == "=" and a == self.key_schema[TableName][0]), None)
+        with self._data_lock:
+            rows = [i for k, i in self._table(TableName).items() if partition is None or k[0] == partition]
+        items = [
+            dict(i) for i in rows
+            if all(a in i and ops[op](_deserializer.deserialize(i[a]), v) for a, op, v in conditions)
+        ]
+        sort_key = self.key_schema[TableName][1:]
+        if IndexName:
+            sort_key = (self.local_indexes[TableName][IndexName],)
+            # Items without the index sort key are not in a (sparse) index
+            items = [i for i in items if sort_key[0] in i]
+        if sort_key:
+            items.sort(key=lambda i: _deserializer.deserialize(i[sort_key[0]]), reverse=not ScanIndexForward)
+        resp: Dict[str, Any] = {}
+        if Limit is not None and len(items) > Limit:
+            items = items[:Limit]
+            resp["LastEvaluatedKey"] = {k: items[-1][k] for k in self.key_schema[TableName] + sort_key if k in items[-1]}
+        if Select == "COUNT":
+            return {**resp, "Count": len(items)}
+        return {**resp, "Items": items, "Count": len(items)}
+
+
+class DynamoResourceStandIn:
+    """`boto3.resource("dynamodb")` over a DynamoStandIn: Table() with plain Python values."""
+
+    def __init__(self, dynamo: DynamoStandIn):
+        self.dynamo = dynamo
+
+    def Table(self, name: str) -> "_TableStandIn":
+        return _TableStandIn(self.dynamo, name)
+
+
+class _TableStandIn:
+    def __init__(self, dynamo: DynamoStandIn, name: str):
+        self._dynamo = dynamo
+        self.name = name
+
+    @staticmethod
+    def _ser(values: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: _serializer.serialize(v) for k, v in values.items()}
+
+    def get_item(self, Key: Dict[str, Any], **_: Any):
+        resp = self._dynamo.get_item(TableName=self.name, Key=self._ser(Key))
+        if "Item" not in resp:
+            return {}
+        return {"Item": {k: _deserializer.deserialize(v) for k, v in resp["Item"].items()}}
+
+    def put_item(self, Item: Dict[str, Any], **_: Any):
+        return self._dynamo.put_item(TableName=self.name, Item=self._ser(Item))
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str, ExpressionAttributeValues: Optional[Dict[str, Any]] = None, ExpressionAttributeNames: Optional[Dict[str, str]] = None, **_: Any):
+        return self._dynamo.update_item(
+            TableName=self.name,
+            Key=self._ser(Key),
+            UpdateExpression=UpdateExpression,
+            ExpressionAttributeValues=self._ser(ExpressionAttributeValues or {}),
+            ExpressionAttributeNames=ExpressionAttributeNames or None,
+        )
+
+
+def content_key(data: bytes) -> str:
+    """Answers are registered by image content, so they hold whatever key the image gets."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class _ImageAnswers(StandIn):
+    def __init__(self, s3: S3StandIn, latency: Optional[Latency] = None):
+        super().__init__(latency)
+        self._s3 = s3
+
+    def _image_key(self, image: Dict[str, Any]) -> str:
+        if "Bytes" in image:
+            return content_key(image["Bytes"])
+        loc = image["S3Object"]
+        obj = self._s3.objects.get((loc["Bucket"], loc["Name"]))
+        if not obj:
+            return ""
+        # Derivatives made at ingest answer like the upload they were made from
+        return obj["Metadata"].get("source_sha256") or content_key(obj["Body"])
+
+
+class TextractStandIn(_ImageAnswers):
+    """Returns the AnalyzeID response registered for the front page's content (an empty
+    document otherwise)."""
+
+    service = "textract"
+
+    def __init__(self, s3: S3StandIn, latency: Optional[Latency] = None):
+        super().__init__(s3, latency)
+        self.responses: Dict[str, Dict[str, Any]] = {}
+
+    def analyze_id(self, DocumentPages: List[Dict[str, Any]], **_: Any):
+        self._call("analyze_id")
+        return self.responses.get(self._image_key(DocumentPages[0]), {"IdentityDocuments": []})
+
+    def analyze_document(self, Document: Dict[str, Any], FeatureTypes: List[str], **_: Any):
+        self._call("analyze_document")
+        return {"Blocks": []}
+
+
+class RekognitionStandIn(_ImageAnswers):
+    """DetectFaces / CompareFaces answers registered per image content (CompareFaces by
+    the selfie's content); a centred-left face and `default_similarity` otherwise."""
+
+    service = "rekognition"
+
+    def __init__(self, s3: S3StandIn, latency: Optional[Latency] = None):
+        super().__init__(s3, latency)
+        self.face_boxes: Dict[str, Optional[Dict[str, float]]] = {}
+        self.similarities: Dict[str, float] = {}
+        self.default_similarity = 90.0
+
+    def detect_faces(self, Image: Dict[str, Any], **_: Any):
+        self._call("detect_faces")
+        box = self.face_boxes.get(self._image_key(Image), {"Left": 0.05, "Top": 0.2, "Width": 0.3, "Height": 0.5})
+        return {"FaceDetails": [{"BoundingBox": box, "Confidence": 99.0}] if box else []}
+
+    def compare_faces(self, SourceImage: Dict[str, Any], TargetImage: Dict[str, Any], SimilarityThreshold: float = 80, **_: Any):
+        self._call("compare_faces")
+        similarity = self.similarities.get(self._image_key(SourceImage), self.default_similarity)
+        if similarity < SimilarityThreshold:
+            return {"FaceMatches": [], "UnmatchedFaces": [{}]}
+        return {"FaceMatches": [{"Similarity": similarity}]}
+
+
+class CloudWatchStandIn(StandIn):
+    service = "cloudwatch"
+
+    def __init__(self, latency: Optional[Latency] = None):
+        super().__init__(latency)
+        self.data: List[Dict[str, Any]] = []
+
+    def put_metric_data(self, Namespace: str, MetricData: List[Dict[str, Any]], **_: Any):
+        self._call("put_metric_data")
+        self.data.extend(MetricData)
+        return {}
+
+
+class StandIns:
+    """One of each stand-in sharing a latency model; `clients()` maps service -> client."""
+
+    def __init__(
+        self,
+        key_schema: Dict[str, Tuple[str, ...]],
+        latency: Optional[Latency] = None,
+        local_indexes: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        latency = latency or Latency()
+        self.s3 = S3StandIn(latency)
+        self.sqs = SQSStandIn(latency)
+        self.dynamodb = DynamoStandIn(key_schema, latency, local_indexes)
+        self.textract = TextractStandIn(self.s3, latency)
+        self.rekognition = RekognitionStandIn(self.s3, latency)
+        self.cloudwatch = CloudWatchStandIn(latency)
+
+    def clients(self) -> Dict[str, StandIn]:
+        return {
+            "s3": self.s3,
+            "sqs": self.sqs,
+            "dynamodb": self.dynamodb,
+            "textract": self.textract,
+            "rekognition": self.rekognition,
+            "cloudwatch": self.cloudwatch,
+        }
+
+    def call_counts(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(c.calls) for name, c in self.clients().items()}
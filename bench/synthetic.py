@@ -0,0 +1,159 @@
+"""Synthetic identity-document cases for benchmarks: document and selfie images, TD3
+MRZ lines (valid or with a broken check digit) and AnalyzeID-shaped Textract
+responses, with a ground-truth fraud label."""
+from __future__ import annotations
+
+import io
+import random
+import string
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from worker.mrz import _check_digit
+
+
+SURNAMES = ["ERIKSSON", "GARCIA", "NGUYEN", "OKAFOR", "SMITH", "KOWALSKI", "TANAKA", "MULLER"]
+GIVEN_NAMES = ["ANNA", "JOSE", "LINH", "CHIDI", "JOHN", "MARTA", "YUKI", "LENA"]
+
+
+def _yymmdd(d: date) -> str:
+    return d.strftime("%y%m%d")
+
+
+def _pad(value: str, length: int) -> str:
+    return (value + "<" * length)[:length]
+
+
+def td3_mrz(
+    surname: str,
+    given: str,
+    number: str,
+    nationality: str,
+    dob: date,
+    sex: str,
+    expiry: date,
+    valid: bool = True,
+) -> List[str]:
+    """Two 44-character passport MRZ lines. With valid=False the composite check digit is wrong."""
+    line1 = _pad(f"P<{nationality}{surname}<<{given.replace(' ', '<')}", 44)
+    num = _pad(number, 9)
+    body = f"{num}{_check_digit(num)}{nationality}{_yymmdd(dob)}{_check_digit(_yymmdd(dob))}{sex}"
+    body += f"{_yymmdd(expiry)}{_check_digit(_yymmdd(expiry))}"
+    personal = "<" * 14
+    body += personal + str(_check_digit(personal))
+    composite = body[0:10] + body[13:20] + body[21:43]
+    digit = _check_digit(composite)
+    if not valid:
+        digit = (digit + 1) % 10
+    return [line1, body + str(digit)]
+
+
+def analyze_id_response(fields: Dict[str, str], mrz_lines: List[str], confidence: float) -> Dict[str, Any]:
+    """An AnalyzeID response carrying `fields` (Textract field types) and an MRZ_CODE field."""
+    doc_fields = [
+        {"Type": {"Text": name}, "ValueDetection": {"Text": value, "Confidence": confidence}}
+        for name, value in fields.items()
+    ]
+    doc_fields.append({"Type": {"Text": "MRZ_CODE"}, "ValueDetection": {"Text": "\n".join(mrz_lines), "Confidence": confidence}})
+    return {"IdentityDocuments": [{"DocumentIndex": 1, "IdentityDocumentFields": doc_fields}], "DocumentMetadata": {"Pages": 1}}
+
+
+def document_image(rng: random.Random, width: int = 1200, height: int = 760, blur: float = 0.0, glare: bool = False, mrz: Optional[List[str]] = None) -> bytes:
+    """A JPEG ID card: textured background, portrait block, text lines and MRZ band."""
+    seed = rng.randrange(2**31)
+    noise = np.random.default_rng(seed).normal(200, 18, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(noise)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, width, height // 8], fill=(30, 60, 120))
+    draw.ellipse([int(width * 0.06), int(height * 0.22), int(width * 0.34), int(height * 0.72)], fill=(190, 150, 120))
+    for i in range(6):
+        y = int(height * (0.25 + i * 0.08))
+        draw.rectangle([int(width * 0.42), y, int(width * rng.uniform(0.6, 0.92)), y + height // 40], fill=(40, 40, 40))
+    if mrz:
+        for i, line in enumerate(mrz):
+            draw.text((int(width * 0.04), int(height * (0.82 + 0.07 * i))), line, fill=(0, 0, 0))
+    if glare:
+        draw.ellipse([int(width * 0.5), int(height * 0.1), int(width * 0.9), int(height * 0.6)], fill=(255, 255, 255))
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=88)
+    return out.getvalue()
+
+
+def selfie_image(rng: random.Random, size: int = 640) -> bytes:
+    seed = rng.randrange(2**31)
+    base = np.random.default_rng(seed).normal(128, 30, (size, size, 3)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(base)
+    ImageDraw.Draw(img).ellipse([size // 4, size // 6, 3 * size // 4, 5 * size // 6], fill=(200, 160, 130))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+@dataclass
+class SyntheticCase:
+    index: int
+    is_fraud: bool
+    front: bytes
+    back: Optional[bytes]
+    selfie: bytes
+    metadata: Dict[str, Any]
+    textract: Dict[str, Any]
+    similarity: float
+    mrz_valid: bool
+    expected: Dict[str, Any] = field(default_factory=dict)
+
+
+def generate_case(index: int, rng: random.Random, fraud: bool, width: int = 1200, height: int = 760, with_back: bool = False) -> SyntheticCase:
+    """One case. Fraudulent cases get some of: broken MRZ, expired document, low face
+    similarity, low OCR confidence, blur/glare, a reused device."""
+    today = date.today()
+    surname, given = rng.choice(SURNAMES), rng.choice(GIVEN_NAMES)
+    number = "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(9))
+    dob = today - timedelta(days=rng.randint(18 * 365, 70 * 365))
+    expiry = today + timedelta(days=rng.randint(200, 3000))
+    mrz_valid, similarity, confidence = True, rng.uniform(90, 99.5), rng.uniform(90, 99.5)
+    blur, glare = 0.0, False
+    device = f"dev-{index:06d}"
+    if fraud:
+        signals = rng.sample(["mrz", "expired", "face", "ocr", "image", "device"], k=rng.randint(1, 3))
+        mrz_valid = "mrz" not in signals
+        if "expired" in signals:
+            expiry = today - timedelta(days=rng.randint(1, 900))
+        if "face" in signals:
+            similarity = rng.uniform(20, 75)
+        if "ocr" in signals:
+            confidence = rng.uniform(40, 70)
+        if "image" in signals:
+            blur, glare = rng.choice([(4.0, False), (0.0, True), (3.0, True)])
+        if "device" in signals:
+            device = "dev-shared"
+    mrz = td3_mrz(surname, given, number, "UTO", dob, rng.choice("MF"), expiry, valid=mrz_valid)
+    fields = {
+        "LAST_NAME": surname.title(),
+        "FIRST_NAME": given.title(),
+        "DOCUMENT_NUMBER": number,
+        "DATE_OF_BIRTH": dob.isoformat(),
+        "EXPIRATION_DATE": expiry.isoformat(),
+    }
+    return SyntheticCase(
+        index=index,
+        is_fraud=fraud,
+        front=document_image(rng, width, height, blur=blur, glare=glare, mrz=mrz),
+        back=document_image(rng, width, height) if with_back else None,
+        selfie=selfie_image(rng),
+        metadata={"device_hash": device, "ip": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"},
+        textract=analyze_id_response(fields, mrz, confidence),
+        similarity=similarity,
+        mrz_valid=mrz_valid,
+    )
+
+
+def generate_cases(n: int, fraud_rate: float = 0.2, seed: int = 7, **kwargs: Any) -> List[SyntheticCase]:
+    rng = random.Random(seed)
+    return [generate_case(i, rng, rng.random() < fraud_rate, **kwargs) for i in range(n)]
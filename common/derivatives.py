@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+# Derivative kinds: the API makes them at ingest (app/derivatives.py), the worker reads
+# them in place of the original upload and falls back to it for any kind that is missing.
+NORMALIZED = "normalized"
+THUMBNAIL = "thumbnail"
@@ -0,0 +1,161 @@
+"""Span timing and Prometheus rendering shared by the API and the worker."""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Latency buckets (seconds) for span histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.sum = 0.0
+        self.count = 0
+
+
+class TraceRegistry:
+    """Cumulative span latency histograms, in-flight gauges and error counters,
+    rendered in the Prometheus text exposition format. Every metric name is
+    rendered with `prefix` (one registry per process: fraud_api_, fraud_worker_)."""
+
+    def __init__(self, prefix: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, seconds: float, labels: Labels = ()) -> None:
+        with self._lock:
+            h = self._histograms.get((name, labels))
+            if h is None:
+                h = self._histograms[(name, labels)] = _Histogram(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    h.counts[i] += 1
+                    break
+            h.sum += seconds
+            h.count += 1
+
+    def add_gauge(self, name: str, delta: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._gauges[(name, labels)] = self._gauges.get((name, labels), 0.0) + delta
+
+    def incr(self, name: str, value: float = 1.0, labels: Labels = ()) -> None:
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0.0) + value
+
+    @contextmanager
+    def span(self, name: str, **labels: str) -> Iterator[None]:
+        """Time a block: records {name}_duration_seconds, {name}_in_flight and {name}_errors_total."""
+        lbl: Labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        self.add_gauge(f"{name}_in_flight", 1, lbl)
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr(f"{name}_errors_total", 1, lbl)
+            raise
+        finally:
+            self.add_gauge(f"{name}_in_flight", -1, lbl)
+            self.observe(f"{name}_duration_seconds", time.perf_counter() - t0, lbl)
+
+    def instrument_client(self, client: Any, service: str) -> Any:
+        """Record every API call made through a boto3 client as an `aws_call` span."""
+
+        def before(context: Dict[str, Any], model: Any = None, **_: Any) -> None:
+            op = getattr(model, "name", "unknown")
+            labels = (("operation", op), ("service", service))
+            context["_span"] = (labels, time.perf_counter())
+            self.add_gauge("aws_call_in_flight", 1, labels)
+
+        def after(context: Dict[str, Any], exception: Optional[BaseException] = None, **_: Any) -> None:
+            started = context.pop("_span", None)
+            if started is None:
+                return
+            labels, t0 = started
+            self.add_gauge("aws_call_in_flight", -1, labels)
+            self.observe("aws_call_duration_seconds", time.perf_counter() - t0, labels)
+            if exception is not None:
+                self.incr("aws_call_errors_total", 1, labels)
+
+        events = client.meta.events
+        events.register("before-call.*.*", before)
+        events.register("after-call.*.*", after)
+        events.register("after-call-error.*.*", after)
+        return client
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+            counters = dict(self._counters)
+        lines: List[str] = []
+        typed = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.prefix}{name}_bucket{_fmt(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{self.prefix}{name}_bucket{_fmt(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.prefix}{name}_sum{_fmt(labels)} {total}")
+            lines.append(f"{self.prefix}{name}_count{_fmt(labels)} {count}")
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{self.prefix}{name}{_fmt(labels)} {value:g}")
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{self.prefix}{name}{_fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _fmt(labels: Labels) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: TraceRegistry
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def serve_metrics(registry: TraceRegistry, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve GET /metrics for `registry` from a daemon thread, on a port of its own (kept
+    off the load balancer)."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
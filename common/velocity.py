@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+# Velocity counters are kept per (dimension, value, hour): the API increments them at
+# ingest (app/velocity.py), the worker sums them into windows (worker/velocity.py).
+BUCKET_SECONDS = 3600
+
+
+def bucket_start(ts: float) -> int:
+    return int(ts) // BUCKET_SECONDS * BUCKET_SECONDS
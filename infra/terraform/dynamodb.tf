@@ -26,6 +26,60 @@ resource "aws_dynamodb_table" "events" {
   }
 }
 
+# Hourly submission counters per device hash / IP (see worker/velocity.py)
+resource "aws_dynamodb_table" "velocity" {
+  name         = var.velocity_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "velocity_key"
+  range_key    = "bucket"
+
+  attribute { name = "velocity_key" type = "S" }
+  attribute { name = "bucket" type = "N" }
+
+  ttl { attribute_name = "ttl" enabled = true }
+}
+
+# Content-addressed Textract / face / quality results by image SHA-256 (see worker/result_cache.py)
+resource "aws_dynamodb_table" "results" {
+  name         = var.results_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute { name = "cache_key" type = "S" }
+
+  ttl { attribute_name = "ttl" enabled = true }
+
+  # Cached Textract fields contain PII
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.s3_kms.arn
+  }
+}
+
+# Perceptual-hash buckets of past front/selfie images for near-duplicate lookups (see worker/near_dup.py)
+resource "aws_dynamodb_table" "phash" {
+  name         = var.phash_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "bucket_key"
+  range_key    = "case_id"
+
+  attribute { name = "bucket_key" type = "S" }
+  attribute { name = "case_id" type = "S" }
+  attribute { name = "ts" type = "N" }
+
+  # Lookups read the newest entries of each bucket
+  local_secondary_index {
+    name               = "recent"
+    range_key          = "ts"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["h", "ttl"]
+  }
+
+  ttl { attribute_name = "ttl" enabled = true }
+}
+
 output "cases_table_name" { value = aws_dynamodb_table.cases.name }
 output "events_table_name" { value = aws_dynamodb_table.events.name }
-
+output "velocity_table_name" { value = aws_dynamodb_table.velocity.name }
+output "results_table_name" { value = aws_dynamodb_table.results.name }
+output "phash_table_name" { value = aws_dynamodb_table.phash.name }
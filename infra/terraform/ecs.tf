@@ -26,7 +26,10 @@ resource "aws_ecs_task_definition" "api" {
       name      = "api"
       image     = var.api_image != "" ? var.api_image : aws_ecr_repository.api.repository_url
       essential = true
-      portMappings = [{ containerPort = 8080, hostPort = 8080 }]
+      portMappings = [
+        { containerPort = 8080, hostPort = 8080 },
+        { containerPort = var.api_metrics_port, hostPort = var.api_metrics_port }
+      ]
       environment = [
         { name = "AWS_REGION", value = var.aws_region },
         { name = "S3_BUCKET", value = aws_s3_bucket.docs.id },
@@ -34,7 +37,9 @@ resource "aws_ecs_task_definition" "api" {
         { name = "SQS_QUEUE_URL", value = aws_sqs_queue.main.id },
         { name = "DYNAMO_CASES_TABLE", value = aws_dynamodb_table.cases.name },
         { name = "DYNAMO_EVENTS_TABLE", value = aws_dynamodb_table.events.name },
+        { name = "DYNAMO_VELOCITY_TABLE", value = aws_dynamodb_table.velocity.name },
         { name = "API_KEY_SECRET_NAME", value = var.api_key_secret_name },
+        { name = "METRICS_PORT", value = tostring(var.api_metrics_port) },
         { name = "LOG_LEVEL", value = "INFO" }
       ]
       logConfiguration = {
@@ -63,6 +68,7 @@ resource "aws_ecs_task_definition" "worker" {
       name      = "worker"
       image     = var.worker_image != "" ? var.worker_image : aws_ecr_repository.worker.repository_url
       essential = true
+      portMappings = [{ containerPort = var.worker_metrics_port, hostPort = var.worker_metrics_port }]
       environment = [
         { name = "AWS_REGION", value = var.aws_region },
         { name = "S3_BUCKET", value = aws_s3_bucket.docs.id },
@@ -70,7 +76,12 @@ resource "aws_ecs_task_definition" "worker" {
         { name = "SQS_QUEUE_URL", value = aws_sqs_queue.main.id },
         { name = "DYNAMO_CASES_TABLE", value = aws_dynamodb_table.cases.name },
         { name = "DYNAMO_EVENTS_TABLE", value = aws_dynamodb_table.events.name },
+        { name = "DYNAMO_VELOCITY_TABLE", value = aws_dynamodb_table.velocity.name },
+        { name = "RESULT_CACHE_TABLE", value = aws_dynamodb_table.results.name },
+        { name = "NEAR_DUP_TABLE", value = aws_dynamodb_table.phash.name },
         { name = "RULES_PATH", value = "/app/config/rules.yaml" },
+        { name = "WORKER_CONCURRENCY", value = tostring(var.worker_concurrency) },
+        { name = "METRICS_PORT", value = tostring(var.worker_metrics_port) },
         { name = "LOG_LEVEL", value = "INFO" }
       ]
       command = ["python", "-m", "worker.main"]
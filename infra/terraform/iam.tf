@@ -23,7 +23,7 @@ resource "aws_iam_role" "task_role" {
 data "aws_iam_policy_document" "task_policy" {
   statement {
     sid     = "S3Access"
-    actions = ["s3:PutObject", "s3:GetObject", "s3:ListBucket"]
+    actions = ["s3:PutObject", "s3:PutObjectTagging", "s3:AbortMultipartUpload", "s3:DeleteObject", "s3:GetObject", "s3:GetObjectTagging", "s3:ListBucket"]
     resources = [
       aws_s3_bucket.docs.arn,
       "${aws_s3_bucket.docs.arn}/*",
@@ -36,16 +36,20 @@ data "aws_iam_policy_document" "task_policy" {
   }
   statement {
     sid     = "SQS"
-    actions = ["sqs:SendMessage", "sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:GetQueueAttributes"]
+    actions = ["sqs:SendMessage", "sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:ChangeMessageVisibility", "sqs:GetQueueAttributes"]
     resources = [aws_sqs_queue.main.arn]
   }
   statement {
     sid     = "Dynamo"
-    actions = ["dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:GetItem", "dynamodb:Query"]
+    actions = ["dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:GetItem", "dynamodb:Query", "dynamodb:BatchWriteItem"]
     resources = [
       aws_dynamodb_table.cases.arn,
       aws_dynamodb_table.events.arn,
-      "${aws_dynamodb_table.events.arn}/index/*"
+      "${aws_dynamodb_table.events.arn}/index/*",
+      aws_dynamodb_table.velocity.arn,
+      aws_dynamodb_table.results.arn,
+      aws_dynamodb_table.phash.arn,
+      "${aws_dynamodb_table.phash.arn}/index/*"
     ]
   }
   statement {
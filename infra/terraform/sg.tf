@@ -32,6 +32,18 @@ resource "aws_security_group" "api_task" {
     security_groups  = [aws_security_group.alb.id]
   }
 
+  # Metrics stay off the ALB: only the scrapers' CIDRs reach them
+  dynamic "ingress" {
+    for_each = length(var.metrics_scrape_cidr_blocks) > 0 ? [1] : []
+    content {
+      description = "Prometheus to API metrics"
+      from_port   = var.api_metrics_port
+      to_port     = var.api_metrics_port
+      protocol    = "tcp"
+      cidr_blocks = var.metrics_scrape_cidr_blocks
+    }
+  }
+
   egress {
     from_port   = 0
     to_port     = 0
@@ -45,6 +57,17 @@ resource "aws_security_group" "worker_task" {
   description = "Worker task security group"
   vpc_id      = var.vpc_id
 
+  dynamic "ingress" {
+    for_each = length(var.metrics_scrape_cidr_blocks) > 0 ? [1] : []
+    content {
+      description = "Prometheus to worker metrics"
+      from_port   = var.worker_metrics_port
+      to_port     = var.worker_metrics_port
+      protocol    = "tcp"
+      cidr_blocks = var.metrics_scrape_cidr_blocks
+    }
+  }
+
   egress {
     from_port   = 0
     to_port     = 0
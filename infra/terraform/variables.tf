@@ -12,6 +12,9 @@ variable "image_ttl_days" { type = number default = 30 }
 # Dynamo tables
 variable "cases_table_name" { type = string default = "fraud_cases" }
 variable "events_table_name" { type = string default = "fraud_events" }
+variable "velocity_table_name" { type = string default = "fraud_velocity" }
+variable "results_table_name" { type = string default = "fraud_results" }
+variable "phash_table_name" { type = string default = "fraud_phash" }
 
 # ECR repos
 variable "api_ecr_repo" { type = string default = "fraud-api" }
@@ -27,3 +30,9 @@ variable "api_key_secret_name" { type = string default = "fraud_api_key" }
 # ECS services
 variable "api_desired_count" { type = number default = 1 }
 variable "worker_desired_count" { type = number default = 1 }
+variable "worker_concurrency" { type = number default = 8 }
+
+# Prometheus scrapers (CIDRs inside the VPC) allowed to reach the API and worker metrics ports
+variable "metrics_scrape_cidr_blocks" { type = list(string) default = [] }
+variable "api_metrics_port" { type = number default = 9101 }
+variable "worker_metrics_port" { type = number default = 9102 }
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark the image quality engine and report cost per megapixel, then the read
+fan-out of a near-duplicate lookup."""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.stand_ins import DynamoStandIn  # noqa: E402
+from worker.image_ops import DEFAULT_MAX_PIXELS, blur_score, glare_score, quality_report  # noqa: E402
+from worker.near_dup import RECENT_INDEX, NearDupIndex  # noqa: E402
+
+
+def synthetic_jpeg(megapixels: float, seed: int = 0) -> bytes:
+    """ID-card-like test image: noisy background, text-ish bars and a bright patch."""
+    rng = np.random.default_rng(seed)
+    w = int(np.sqrt(megapixels * 1e6 * 1.585))
+    h = int(w / 1.585)
+    arr = rng.normal(180, 25, size=(h, w, 3)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(arr)
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        y = int(h * (0.1 + 0.07 * i))
+        draw.rectangle([int(w * 0.4), y, int(w * 0.9), y + max(2, h // 60)], fill=(20, 20, 20))
+    draw.ellipse([int(w * 0.05), int(h * 0.2), int(w * 0.3), int(h * 0.7)], fill=(255, 255, 255))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def near_dup_fanout(cases: int, radius: int, bucket_limit: int, seed: int = 0) -> dict:
+    """DynamoDB reads of one lookup against an index of `cases` documents of one template
+    (all share their first 16-bit substring, the worst case for bucket length)."""
+    dynamo = DynamoStandIn({"phash": ("bucket_key", "case_id")}, local_indexes={"phash": {RECENT_INDEX: "ts"}})
+    index = NearDupIndex("phash", radius=radius, dynamo=dynamo, bucket_limit=bucket_limit)
+    rng = np.random.default_rng(seed)
+    for n in range(cases):
+        index.add("doc", 0x1234 | int(rng.integers(0, 2**48)) << 16, f"case{n}")
+    items = []
+    query = dynamo.query
+
+    def counted(**kwargs):
+        resp = query(**kwargs)
+        items.append(len(resp.get("Items", [])))
+        return resp
+
+    dynamo.query = counted
+    index.query("doc", 0x1234 | int(rng.integers(0, 2**48)) << 16)
+    return {"queries": len(items), "items": sum(items), "largest": max(items)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark worker.image_ops")
+    ap.add_argument("--sizes", default="1,4,12", help="Comma-separated image sizes in megapixels")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS)
+    ap.add_argument("--near-dup-cases", type=int, default=2000, help="Cases in the near-duplicate index (0 skips)")
+    ap.add_argument("--near-dup-radius", type=int, default=6)
+    ap.add_argument("--near-dup-bucket-limit", type=int, default=50)
+    args = ap.parse_args()
+
+    print(f"{'MP':>6} {'op':<28} {'ms':>10} {'ms/MP':>10}")
+    for mp in [float(s) for s in args.sizes.split(",") if s]:
+        data = synthetic_jpeg(mp)
+        cases = [
+            ("blur_score+glare_score", lambda: (blur_score(data), glare_score(data))),
+            ("quality_report (full res)", lambda: quality_report(data, max_pixels=None)),
+            (f"quality_report (<= {args.max_pixels / 1e6:g} MP)", lambda: quality_report(data, max_pixels=args.max_pixels)),
+        ]
+        for name, fn in cases:
+            sec = timeit(fn, args.repeat)
+            print(f"{mp:>6g} {name:<28} {sec * 1000:>10.1f} {sec * 1000 / mp:>10.1f}")
+
+    if args.near_dup_cases:
+        print(f"\nnear-duplicate lookup, {args.near_dup_cases} same-template cases, radius {args.near_dup_radius}")
+        for limit in (0, args.near_dup_bucket_limit):
+            # Limit 0: read whole buckets, for comparison
+            f = near_dup_fanout(args.near_dup_cases, args.near_dup_radius, limit or args.near_dup_cases)
+            label = f"bucket limit {limit}" if limit else "no bucket limit"
+            print(f"{label:<20} {f['queries']:>4} queries {f['items']:>7} items read, largest bucket read {f['largest']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Microbenchmark per-case scoring: per-case YAML reload + per-rule compile (before)
+versus the cached, precompiled ruleset (after)."""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from worker.scoring import RulesConfig, decide, get_ruleset, safe_eval, score_features  # noqa: E402
+
+
+FEATURES = {
+    "face_similarity": 88.0,
+    "textract_conf_avg": 93.5,
+    "mrz_valid": True,
+    "expiry_valid": True,
+    "blur_score": 0.2,
+    "glare_score": 0.02,
+    "template_geom_score": 0.5,
+    "velocity_count_24h": 2,
+    "device_hash_dup": False,
+    "ip_risk_score": 0.0,
+    "field_consistency_flags": 0,
+}
+
+
+def legacy_score(features, path):
+    """The pre-compilation per-case path: parse YAML, then compile every rule."""
+    with open(path) as f:
+        rules = RulesConfig(yaml.safe_load(f))
+    score = 0.0
+    total_w = 0.0
+    for k, w in rules.weights.items():
+        total_w += float(w)
+        v = features.get(k)
+        if isinstance(v, bool):
+            v = 1.0 if v else 0.0
+        v = float(v) if v is not None else 0.0
+        if k in ("face_similarity", "textract_conf_avg"):
+            v = v / 100.0
+        if k == "velocity_count_24h":
+            v = min(v / 5.0, 1.0)
+        score += float(w) * v
+    fraud_score = score / total_w if total_w > 0 else 0.0
+    reasons = []
+    for rule in rules.explanations:
+        ctx = {k: (1 if v else 0) if isinstance(v, bool) else v for k, v in features.items()}
+        try:
+            if safe_eval(rule["when"], ctx):
+                reasons.append(rule.get("reason"))
+        except Exception:
+            pass
+    return fraud_score, reasons, decide(fraud_score, rules)
+
+
+def bench(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark worker.scoring per case")
+    ap.add_argument("--rules", default="config/rules.yaml")
+    ap.add_argument("-n", type=int, default=5000)
+    args = ap.parse_args()
+
+    before = bench(lambda: legacy_score(FEATURES, args.rules), args.n)
+    after = bench(lambda: score_features(FEATURES, get_ruleset(args.rules)), args.n)
+    assert legacy_score(FEATURES, args.rules) == score_features(FEATURES, get_ruleset(args.rules))
+    print(f"before (reload + compile per case): {before:10.1f} us/case")
+    print(f"after  (compiled ruleset)         : {after:10.1f} us/case")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Build the worker's document template index from exemplar images.
+
+Exemplars are laid out as DIR/<template name>/*.jpg|png (one or more upright scans or
+photos of blank or specimen documents per template). Writes OUT (.npy, memory-mapped by
+the worker) and its OUT .json sidecar.
+"""
+import argparse
+import statistics
+import sys
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from worker.image_ops import DEFAULT_MAX_PIXELS, load_gray  # noqa: E402
+from worker.templates import GRID, POOL, aspect_ratio, layout_descriptor, write_index  # noqa: E402
+
+_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build config/templates/index.npy from exemplar images")
+    ap.add_argument("exemplars", help="directory with one subdirectory of images per template")
+    ap.add_argument("--out", default="config/templates/index.npy")
+    ap.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS)
+    args = ap.parse_args()
+
+    templates = []
+    for folder in sorted(p for p in Path(args.exemplars).iterdir() if p.is_dir()):
+        descriptors, aspects = [], []
+        for path in sorted(p for p in folder.iterdir() if p.suffix.lower() in _SUFFIXES):
+            with Image.open(path) as img:
+                gray = load_gray(ImageOps.exif_transpose(img), args.max_pixels)
+            descriptors.append(layout_descriptor(gray, GRID, POOL))
+            aspects.append(aspect_ratio(gray.shape))
+        if descriptors:
+            templates.append((folder.name, statistics.median(aspects), descriptors))
+            print(f"{folder.name}: {len(descriptors)} exemplars, aspect {statistics.median(aspects):.3f}")
+    if not templates:
+        sys.exit(f"no exemplar images under {args.exemplars}")
+    meta = write_index(args.out, templates)
+    print(f"wrote {args.out}: {sum(t['rows'] for t in meta['templates'])} rows x {meta['dim']}, digest {meta['digest']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import sys
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from worker.scoring import load_rules, score_features_batch  # noqa: E402
+
 
 def load_features_csv(path: Path) -> pd.DataFrame:
     return pd.read_csv(path)
@@ -16,19 +21,33 @@ def main():
     ap = argparse.ArgumentParser(description="Evaluate fraud detection performance")
     ap.add_argument("--features-csv", required=True, help="CSV with features + label column 'is_fraud' (0/1)")
     ap.add_argument("--score-column", default="fraud_score", help="Column for model score if precomputed")
-    ap.add_argument("--threshold", type=float, default=0.6, help="Decision threshold for reject")
+    ap.add_argument("--rules", help="Score with the production rules file (e.g. config/rules.yaml) instead of --score-column")
+    ap.add_argument("--threshold", type=float, default=None, help="Decision threshold for reject (default 0.6, or the rules' reject threshold with --rules)")
     args = ap.parse_args()
 
     df = load_features_csv(Path(args.features_csv))
-    if args.score_column in df.columns:
+    threshold = args.threshold
+    if args.rules:
+        rules = load_rules(args.rules)
+        scores, flags, decisions = score_features_batch(df, rules)
+        threshold = rules.reject if threshold is None else threshold
+        print("Decision mix:")
+        for d in ("APPROVE", "REVIEW", "REJECT"):
+            print(f"  {d:<8} {int(np.sum(decisions == d)):>10}")
+        print("Reason frequency:")
+        for rule, count in zip(rules.rules, flags.sum(axis=0)):
+            print(f"  {int(count):>10}  {rule.reason}")
+        print()
+    elif args.score_column in df.columns:
         scores = df[args.score_column].astype(float).values
     else:
         # Compute a naive score: face_similarity and mrz_valid
         fs = df.get("face_similarity", pd.Series(np.zeros(len(df))))
         mrz = df.get("mrz_valid", pd.Series(np.zeros(len(df))))
         scores = 0.6 * (fs / 100.0) + 0.4 * mrz
+    threshold = 0.6 if threshold is None else threshold
     y_true = df["is_fraud"].astype(int).values
-    y_pred = (scores >= args.threshold).astype(int)
+    y_pred = (scores >= threshold).astype(int)
 
     print("Confusion Matrix:")
     print(confusion_matrix(y_true, y_pred))
@@ -43,4 +62,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,317 @@
+import base64
+import hashlib
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import config, security, uploads
+from app.main import app
+from bench.stand_ins import S3StandIn
+
+
+class Recorder:
+    """Stand-in AWS client that records every call and returns a canned (or empty) response."""
+
+    responses = {"create_multipart_upload": {"UploadId": "u1"}, "upload_part": {"ETag": "e"}}
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.calls.append((name, kwargs))
+            return dict(self.responses.get(name, {}))
+
+        return call
+
+    def names(self):
+        return [c[0] for c in self.calls]
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setattr(security, "_cached_api_key", "test-key")
+    fakes = {svc: Recorder() for svc in ("s3", "dynamodb", "sqs")}
+    for svc, fake in fakes.items():
+        config.set_boto_client(svc, fake)
+    yield fakes
+    config.reset_boto_clients()
+
+
+def test_ingest_uploads_writes_once_and_enqueues(aws):
+    img = base64.b64encode(b"\xff\xd8fake-jpeg").decode()
+    client = TestClient(app)
+    r = client.post(
+        "/v1/ingest",
+        headers={"x-api-key": "test-key"},
+        json={"doc_front_b64": img, "selfie_b64": img, "metadata": {"device_hash": "d1"}},
+    )
+    assert r.status_code == 200
+    case_id = r.json()["case_id"]
+    assert sorted(c[1]["Key"] for c in aws["s3"].calls) == [f"cases/{case_id}/front.jpg", f"cases/{case_id}/selfie.jpg"]
+    # Velocity is counted once the case is enqueued
+    assert aws["dynamodb"].names() == ["transact_write_items", "update_item"]
+    items = aws["dynamodb"].calls[0][1]["TransactItems"]
+    assert len(items) == 2
+    assert items[0]["Put"]["Item"]["status"] == {"S": "PENDING"}
+    assert items[1]["Put"]["Item"]["type"] == {"S": "INGEST"}
+    assert items[1]["Put"]["Item"]["device_hash"] == {"S": "d1"}
+    assert aws["dynamodb"].calls[1][1]["Key"]["velocity_key"] == {"S": "device#d1"}
+    assert aws["sqs"].names() == ["send_message"]
+    body = json.loads(aws["sqs"].calls[0][1]["MessageBody"])
+    assert body["case_id"] == case_id and body["s3_keys"]["back"] is None
+    digest = hashlib.sha256(b"\xff\xd8fake-jpeg").hexdigest()
+    assert body["s3_hashes"] == {"front": digest, "selfie": digest}
+
+
+def test_ui_ingest_streams_large_parts_with_multipart_upload(aws, monkeypatch):
+    monkeypatch.setattr(uploads, "MIN_PART_SIZE", 1024)
+    monkeypatch.setattr(config.get_settings(), "upload_part_size", 1024)
+    front = b"f" * 100
+    back = bytes(range(256)) * 20  # 5 parts of 1024 bytes
+    client = TestClient(app)
+    r = client.post(
+        "/ui/ingest",
+        files={
+            "doc_front": ("front.jpg", front, "image/jpeg"),
+            "doc_back": ("back.png", back, "image/png"),
+            "selfie": ("", b"", "application/octet-stream"),
+        },
+    )
+    assert r.status_code == 200
+    case_id = r.json()["case_id"]
+    names = aws["s3"].names()
+    assert names.count("put_object") == 1 and names.count("upload_part") == 5
+    put = [c[1] for c in aws["s3"].calls if c[0] == "put_object"][0]
+    assert put["Body"] == front and put["Tagging"] == f"sha256={hashlib.sha256(front).hexdigest()}"
+    parts = b"".join(c[1]["Body"] for c in aws["s3"].calls if c[0] == "upload_part")
+    assert parts == back
+    tags = [c[1] for c in aws["s3"].calls if c[0] == "put_object_tagging"][0]
+    assert tags["Tagging"]["TagSet"][0]["Value"] == hashlib.sha256(back).hexdigest()
+    body = json.loads(aws["sqs"].calls[0][1]["MessageBody"])
+    assert body["s3_keys"] == {"front": f"cases/{case_id}/front.jpg", "back": f"cases/{case_id}/back.jpg", "selfie": None}
+
+
+def test_streaming_upload_retains_only_single_part_objects(aws, monkeypatch):
+    monkeypatch.setattr(uploads, "MIN_PART_SIZE", 1024)
+    small = uploads.S3StreamingUpload("small.jpg", part_size=1024, retain=True)
+    small.feed(b"s" * 100)
+    small.complete()
+    # The retained body is the buffer that was uploaded, not a copy kept while streaming
+    assert small.retained is aws["s3"].calls[-1][1]["Body"]
+    large = uploads.S3StreamingUpload("large.jpg", part_size=1024, retain=True)
+    if large.feed(b"l" * 3000):
+        large.flush()
+    large.complete()
+    assert large.retained is None
+
+
+def test_ui_ingest_failure_deletes_completed_uploads(aws, monkeypatch):
+    monkeypatch.setattr(uploads, "MIN_PART_SIZE", 1024)
+    monkeypatch.setattr(config.get_settings(), "upload_part_size", 1024)
+
+    def upload_part(**kwargs):
+        raise RuntimeError("part failed")
+
+    aws["s3"].upload_part = upload_part
+    front = io.BytesIO()
+    Image.new("RGB", (80, 60), (200, 120, 40)).save(front, format="JPEG")
+    client = TestClient(app, raise_server_exceptions=False)
+    r = client.post(
+        "/ui/ingest",
+        files={"doc_front": ("front.jpg", front.getvalue(), "image/jpeg"), "doc_back": ("back.jpg", b"b" * 3000, "image/jpeg")},
+    )
+    assert r.status_code == 500
+    # The front image and its derivative were stored before the back failed
+    stored = sorted(c[1]["Key"] for c in aws["s3"].calls if c[0] == "put_object")
+    assert [k.rsplit("/", 1)[1] for k in stored] == ["front_thumbnail.jpg", "front.jpg"]
+    assert "abort_multipart_upload" in aws["s3"].names() and aws["s3"].names()[-1] == "delete_objects"
+    assert sorted(o["Key"] for o in aws["s3"].calls[-1][1]["Delete"]["Objects"]) == stored
+    assert aws["sqs"].calls == []
+
+
+def _photo() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (80, 60), (200, 120, 40)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_ui_ingest_requires_front(aws):
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+    r = TestClient(app).post("/ui/ingest", files={"selfie": ("s.jpg", _photo(), "image/jpeg")})
+    assert r.status_code == 400
+    # The selfie and its thumbnail were stored while streaming, then deleted
+    assert s3.calls["put_object"] == 2 and s3.objects == {}
+
+
+def test_ui_ingest_persist_failure_deletes_uploads(aws):
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+
+    def transact_write_items(**kwargs):
+        raise RuntimeError("dynamo down")
+
+    aws["dynamodb"].transact_write_items = transact_write_items
+    r = TestClient(app, raise_server_exceptions=False).post("/ui/ingest", files={"doc_front": ("f.jpg", _photo(), "image/jpeg")})
+    assert r.status_code == 500
+    assert s3.calls["put_object"] == 2 and s3.objects == {}
+    assert aws["sqs"].calls == []
+
+
+def test_ingest_batch_uses_batched_writes_with_per_item_results(aws, monkeypatch):
+    monkeypatch.setattr("app.persistence.time.sleep", lambda s: None)
+    unprocessed = []
+
+    def batch_write_item(RequestItems):
+        aws["dynamodb"].calls.append(("batch_write_item", {"RequestItems": RequestItems}))
+        # First call leaves one put unprocessed; it must be retried
+        if not unprocessed:
+            table, reqs = next(iter(RequestItems.items()))
+            unprocessed.append(reqs[0])
+            return {"UnprocessedItems": {table: [reqs[0]]}}
+        return {"UnprocessedItems": {}}
+
+    def send_message_batch(QueueUrl, Entries):
+        aws["sqs"].calls.append(("send_message_batch", {"Entries": Entries}))
+        bad = Entries[0]["Id"] if len(Entries) == 10 else None
+        return {"Failed": [{"Id": bad, "SenderFault": True, "Code": "InvalidMessageContents"}] if bad else []}
+
+    aws["dynamodb"].batch_write_item = batch_write_item
+    aws["sqs"].send_message_batch = send_message_batch
+    img = base64.b64encode(b"\xff\xd8fake-jpeg").decode()
+    cases = [{"doc_front_b64": img, "metadata": {"device_hash": "d1"}} for _ in range(13)]
+    cases[4] = {"doc_front_b64": ""}
+    r = TestClient(app).post("/v1/ingest/batch", headers={"x-api-key": "test-key"}, json={"cases": cases})
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["accepted"], body["failed"]) == (11, 2)
+    assert body["results"][4]["error"] == "doc_front_b64 required"
+    assert body["results"][0]["error"] == "InvalidMessageContents"
+    names = aws["dynamodb"].names()
+    # 24 rows fit one call, plus the retry of the unprocessed put; one velocity ADD for
+    # the shared device, counting only the cases that were enqueued
+    assert names.count("batch_write_item") == 2 and names.count("update_item") == 1
+    update = [c for c in aws["dynamodb"].calls if c[0] == "update_item"][0][1]
+    assert update["ExpressionAttributeValues"][":inc"] == {"N": "11"}
+    assert [len(c[1]["Entries"]) for c in aws["sqs"].calls] == [10, 2]
+    # 12 uploads, then the rejected message's image is deleted
+    assert aws["s3"].names()[:12] == ["put_object"] * 12
+    deleted = [c[1]["Delete"]["Objects"] for c in aws["s3"].calls[12:]]
+    assert deleted == [[{"Key": f"cases/{body['results'][0]['case_id']}/front.jpg"}]]
+
+
+def test_ingest_batch_deletes_images_of_cases_not_written(aws, monkeypatch):
+    monkeypatch.setattr("app.persistence.time.sleep", lambda s: None)
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+    stuck = []
+
+    def batch_write_item(RequestItems):
+        # The first case's case row is never processed
+        table, reqs = next(iter(RequestItems.items()))
+        stuck[:] = stuck or [reqs[0]]
+        return {"UnprocessedItems": {table: [r for r in reqs if r == stuck[0]]}}
+
+    aws["dynamodb"].batch_write_item = batch_write_item
+    cases = [{"doc_front_b64": base64.b64encode(_photo()).decode(), "metadata": {}} for _ in range(3)]
+    r = TestClient(app).post("/v1/ingest/batch", headers={"x-api-key": "test-key"}, json={"cases": cases})
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["accepted"], body["failed"]) == (2, 1)
+    failed = next(x["case_id"] for x in body["results"] if x["status"] == "ERROR")
+    prefixes = {key.split("/")[1] for _, key in s3.objects}
+    assert failed not in prefixes and len(prefixes) == 2
+
+
+def test_ingest_upload_failure_deletes_the_images_already_stored(aws):
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+    put_object = s3.put_object
+
+    def failing_put(**kwargs):
+        if kwargs["Key"].endswith("/back.jpg"):
+            raise RuntimeError("s3 down")
+        return put_object(**kwargs)
+
+    s3.put_object = failing_put
+    img = base64.b64encode(_photo()).decode()
+    r = TestClient(app, raise_server_exceptions=False).post(
+        "/v1/ingest", headers={"x-api-key": "test-key"}, json={"doc_front_b64": img, "doc_back_b64": img}
+    )
+    assert r.status_code == 500
+    assert s3.objects == {}
+    assert aws["dynamodb"].calls == []
+
+
+def test_ingest_upload_accepts_binary_parts_and_json_metadata(aws):
+    front = b"\xff\xd8" + bytes(range(256)) * 4
+    r = TestClient(app).post(
+        "/v1/ingest/upload",
+        headers={"x-api-key": "test-key"},
+        files={"doc_front": ("front.jpg", front, "image/jpeg"), "selfie": ("s.png", b"png-bytes", "image/png")},
+        data={"metadata": json.dumps({"device_hash": "d9", "ip": "1.2.3.4"})},
+    )
+    assert r.status_code == 200
+    case_id = r.json()["case_id"]
+    puts = {c[1]["Key"]: c[1] for c in aws["s3"].calls}
+    assert puts[f"cases/{case_id}/front.jpg"]["Body"] == front
+    assert puts[f"cases/{case_id}/selfie.jpg"]["ContentType"] == "image/png"
+    items = aws["dynamodb"].calls[0][1]["TransactItems"]
+    assert items[0]["Put"]["Item"]["metadata"]["M"]["device_hash"] == {"S": "d9"}
+    body = json.loads(aws["sqs"].calls[0][1]["MessageBody"])
+    assert body["s3_hashes"]["front"] == hashlib.sha256(front).hexdigest()
+    assert body["metadata"] == {"device_hash": "d9", "ip": "1.2.3.4"}
+
+
+def test_ingest_upload_rejects_bad_metadata_and_missing_front(aws):
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+    client = TestClient(app)
+    headers = {"x-api-key": "test-key"}
+    front = {"doc_front": ("f.jpg", _photo(), "image/jpeg")}
+    for files, data in (
+        (front, {"metadata": "[1"}),
+        (front, {"metadata": "[1]"}),
+        ({"selfie": ("s.jpg", _photo(), "image/jpeg")}, None),
+    ):
+        r = client.post("/v1/ingest/upload", headers=headers, files=files, data=data)
+        assert r.status_code == 400
+        # Whatever was streamed before the request was rejected is gone
+        assert s3.objects == {}
+    assert s3.calls["put_object"] == 6
+    assert aws["sqs"].calls == []
+
+
+def test_ingest_upload_enqueue_failure_deletes_uploads(aws):
+    s3 = S3StandIn()
+    config.set_boto_client("s3", s3)
+
+    def send_message(**kwargs):
+        raise RuntimeError("sqs down")
+
+    aws["sqs"].send_message = send_message
+    client = TestClient(app, raise_server_exceptions=False)
+    r = client.post(
+        "/v1/ingest/upload",
+        headers={"x-api-key": "test-key"},
+        files={"doc_front": ("f.jpg", _photo(), "image/jpeg")},
+        data={"metadata": json.dumps({"device_hash": "d1"})},
+    )
+    assert r.status_code == 500
+    assert s3.calls["put_object"] == 2 and s3.objects == {}
+    # Not enqueued, so not counted towards the device's velocity
+    assert aws["dynamodb"].names() == ["transact_write_items"]
+
+
+def test_decode_base64_image_data_uri_and_plain():
+    from app.utils import decode_base64_image
+
+    raw = b"\x89PNG-bytes"
+    b64 = base64.b64encode(raw).decode()
+    assert decode_base64_image(f"data:image/png;base64,{b64}") == (raw, "image/png")
+    assert decode_base64_image(b64) == (raw, "image/jpeg")
+    assert decode_base64_image(b64[:8] + "\n" + b64[8:]) == (raw, "image/jpeg")
@@ -0,0 +1,27 @@
+import threading
+
+from worker import aws_clients
+
+
+def test_client_is_created_once_and_shared_across_threads():
+    aws_clients.reset_clients()
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(aws_clients.client("sqs"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in seen}) == 1
+    assert aws_clients.client("sqs") is seen[0]
+    aws_clients.reset_clients()
+
+
+def test_stand_in_client_and_endpoint_override(monkeypatch):
+    stand_in = object()
+    aws_clients.set_client("textract", stand_in)
+    assert aws_clients.client("textract") is stand_in
+    aws_clients.reset_clients()
+    monkeypatch.setenv("AWS_ENDPOINT_URL_S3", "http://localhost:4566")
+    assert aws_clients.endpoint_url("s3") == "http://localhost:4566"
+    assert aws_clients.client("s3").meta.endpoint_url == "http://localhost:4566"
+    aws_clients.reset_clients()
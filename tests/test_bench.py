@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+import worker.processor
+from bench.run import percentiles, run
+from bench.stand_ins import Latency
+from bench.synthetic import td3_mrz
+from worker.mrz import validate_mrz
+
+
+def test_synthetic_mrz_check_digits():
+    args = ("ERIKSSON", "ANNA", "L898902C3", "UTO", date(1974, 8, 12), "F", date(2032, 4, 15))
+    assert validate_mrz(td3_mrz(*args))[0]
+    assert not validate_mrz(td3_mrz(*args, valid=False))[0]
+
+
+def test_worker_bench_decides_every_case(monkeypatch):
+    monkeypatch.setenv("METRICS_MODE", "off")
+    report = run("worker", 4, concurrency=2, latency=Latency(0), image_size=(320, 200))
+    assert report["cases"] == 4
+    assert sum(report["decisions"].values()) == 4
+    assert set(report["latency_ms"]) >= {"p50", "p90", "p95", "p99"}
+    assert "textract" in report["stages_ms"]
+    assert report["aws_calls"]["textract"]["analyze_id"] == 4
+
+
+def test_e2e_bench_goes_through_api_and_queue(monkeypatch):
+    monkeypatch.setenv("METRICS_MODE", "off")
+    report = run("e2e", 3, concurrency=2, latency=Latency(0), image_size=(320, 200))
+    assert sum(report["decisions"].values()) == 3
+    calls = report["aws_calls"]
+    assert calls["sqs"]["send_message"] == 3
+    assert calls["sqs"]["delete_message_batch"] >= 1
+
+
+def test_percentiles_are_nearest_rank():
+    hundred = percentiles([float(v) for v in range(1, 101)])
+    assert (hundred["p50"], hundred["p95"], hundred["p99"]) == (50.0, 95.0, 99.0)
+    twenty = percentiles([float(v) for v in range(1, 21)])
+    assert (twenty["p50"], twenty["p90"], twenty["p95"], twenty["p99"]) == (10.0, 18.0, 19.0, 20.0)
+
+
+def test_e2e_bench_times_out_on_failing_cases(monkeypatch):
+    monkeypatch.setenv("METRICS_MODE", "off")
+
+    def fail(msg):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(worker.processor, "process_case", fail)
+    with pytest.raises(TimeoutError, match="2 of 2 cases still outstanding"):
+        run("e2e", 2, concurrency=2, latency=Latency(0), image_size=(320, 200), timeout=1.0)
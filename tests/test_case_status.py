@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import case_cache, config, security
+from app.case_cache import CaseCache
+from app.main import app
+
+
+@pytest.fixture
+def cases(monkeypatch):
+    monkeypatch.setattr(security, "_cached_api_key", "test-key")
+    monkeypatch.setattr(config.get_settings(), "case_wait_interval", 0.01)
+    store = {"c1": {"status": "PENDING", "reasons": []}}
+
+    def load(case_id):
+        return dict(store[case_id]) if case_id in store else None
+
+    monkeypatch.setattr(case_cache, "_cache", CaseCache(ttl=0.0, loader=load))
+    return store
+
+
+def test_cache_is_single_flight_and_expires():
+    calls = []
+    gate = threading.Event()
+
+    def slow(case_id):
+        calls.append(case_id)
+        gate.wait(1)
+        return {"status": "PENDING"}
+
+    cache = CaseCache(ttl=60, loader=slow)
+    threads = [threading.Thread(target=cache.get, args=("c1",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == ["c1"]
+    cache.invalidate("c1")
+    cache.get("c1")
+    assert calls == ["c1", "c1"]
+
+
+def test_etag_and_not_modified(cases):
+    client = TestClient(app)
+    headers = {"x-api-key": "test-key"}
+    r = client.get("/v1/case/c1", headers=headers)
+    assert r.status_code == 200 and r.json()["status"] == "PENDING"
+    etag = r.headers["etag"]
+    r = client.get("/v1/case/c1", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag
+    r = client.get("/ui/case/c1/json", headers={"If-None-Match": f"W/{etag}"})
+    assert r.status_code == 304
+    assert client.get("/v1/case/missing", headers=headers).status_code == 404
+
+
+def test_long_poll_returns_on_change_or_times_out(cases):
+    client = TestClient(app)
+    headers = {"x-api-key": "test-key"}
+    etag = client.get("/v1/case/c1", headers=headers).headers["etag"]
+    r = client.get("/v1/case/c1/wait", params={"since": etag, "timeout": 0.05}, headers=headers)
+    assert r.status_code == 304
+
+    threading.Timer(0.1, lambda: cases["c1"].update(status="PROCESSED", fraud_score=0.1)).start()
+    r = client.get("/v1/case/c1/wait", params={"since": etag, "timeout": 5}, headers=headers)
+    assert r.status_code == 200 and r.json()["status"] == "PROCESSED"
+    assert r.headers["etag"] != etag
+
+
+def test_events_stream_until_terminal(cases):
+    threading.Timer(0.1, lambda: cases["c1"].update(status="PROCESSED", fraud_score=0.7)).start()
+    client = TestClient(app)
+    with client.stream("GET", "/ui/case/c1/events") as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        body = "".join(r.iter_text())
+    statuses = [line for line in body.splitlines() if line.startswith("data:")]
+    assert len(statuses) == 2
+    assert '"PENDING"' in statuses[0] and '"PROCESSED"' in statuses[1]
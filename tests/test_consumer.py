@@ -0,0 +1,57 @@
+import threading
+import time
+
+from worker.consumer import CaseConsumer
+
+
+class FakeSQS:
+    def __init__(self, n: int):
+        self.queue = [{"MessageId": f"m{i}", "ReceiptHandle": f"r{i}", "Body": "{}"} for i in range(n)]
+        self.deleted = []
+        self.delete_calls = 0
+        self.lock = threading.Lock()
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, VisibilityTimeout):
+        with self.lock:
+            out, self.queue = self.queue[:MaxNumberOfMessages], self.queue[MaxNumberOfMessages:]
+        if not out:
+            time.sleep(0.01)
+        return {"Messages": out}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self.lock:
+            self.delete_calls += 1
+            self.deleted.extend(e["ReceiptHandle"] for e in Entries)
+        return {"Successful": Entries, "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        return {"Successful": Entries, "Failed": []}
+
+
+def test_consumer_runs_cases_concurrently_and_batches_acks():
+    sqs = FakeSQS(23)
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def handler(m):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+        if m["MessageId"] == "m5":
+            raise RuntimeError("boom")
+
+    consumer = CaseConsumer(sqs, "q", handler, concurrency=4, wait_seconds=0)
+    t = threading.Thread(target=consumer.run)
+    t.start()
+    deadline = time.time() + 5
+    while len(sqs.deleted) < 22 and time.time() < deadline:
+        time.sleep(0.01)
+    consumer.stop()
+    t.join(5)
+    assert sorted(sqs.deleted) == sorted(f"r{i}" for i in range(23) if i != 5)
+    assert 1 < active["max"] <= 4
+    assert sqs.delete_calls < 22
@@ -0,0 +1,92 @@
+import hashlib
+import io
+
+import numpy as np
+from PIL import Image
+
+import worker.context as context_mod
+from worker.context import CaseContext
+
+
+def _jpeg() -> bytes:
+    out = io.BytesIO()
+    Image.fromarray(np.full((60, 80, 3), 120, dtype=np.uint8)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_case_context_fetches_and_decodes_once(monkeypatch):
+    calls = []
+    data = _jpeg()
+
+    def fake_get(bucket, key):
+        calls.append((bucket, key))
+        return data
+
+    monkeypatch.setattr(context_mod, "s3_get_object", fake_get)
+    with CaseContext("bkt", "case1") as ctx:
+        img = ctx.get_image("front")
+        assert ctx.get_image("front") is img
+        report = ctx.quality("front")
+        assert ctx.quality("front") is report
+        assert ctx.crop("front", (0.1, 0.1, 0.5, 0.5))
+        assert ctx.get_bytes("front") is data
+    assert calls == [("bkt", "front")]
+    assert ctx._memo == {}
+
+
+def test_case_context_reads_derivatives_with_fallback(monkeypatch):
+    small = _jpeg()
+    fetched = []
+
+    def fake_get(bucket, key):
+        fetched.append(key)
+        return small
+
+    monkeypatch.setattr(context_mod, "s3_get_object", fake_get)
+    derivatives = {"front": {"normalized": "front_n", "thumbnail": "front_t"}, "selfie": {"thumbnail": "selfie_t"}}
+    with CaseContext("bkt", "case1", derivatives=derivatives) as ctx:
+        assert ctx.derived("front", "thumbnail") == "front_t"
+        assert ctx.derived("selfie", "normalized") == "selfie"
+        assert ctx.derived("back", "thumbnail") == "back"
+        ctx.quality("front")
+        ctx.crop("front", (0.1, 0.1, 0.5, 0.5))
+    assert fetched == ["front_n"]
+
+
+def test_sha256_reads_the_upload_tag_before_downloading(monkeypatch):
+    data = _jpeg()
+    fetched = []
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: fetched.append(key) or data)
+    monkeypatch.setattr(context_mod, "s3_object_tags", lambda bucket, key: {"sha256": "tagged"} if key == "front" else {})
+    with CaseContext("bkt", "case1") as ctx:
+        assert ctx.sha256("front") == "tagged"
+        assert fetched == []
+        # Untagged: hashed from the bytes
+        assert ctx.sha256("back") == hashlib.sha256(data).hexdigest()
+        # Already downloaded: hashed locally, no tag lookup
+        ctx.get_bytes("selfie")
+        monkeypatch.setattr(context_mod, "s3_object_tags", lambda bucket, key: {"sha256": "stale"})
+        assert ctx.sha256("selfie") == hashlib.sha256(data).hexdigest()
+    assert fetched == ["back", "selfie"]
+
+
+def test_variant_names_the_derivative_read():
+    derivatives = {"front": {"normalized": "front_n", "thumbnail": "front_t"}, "back": {"thumbnail": "back_t"}}
+    ctx = CaseContext("bkt", "case1", derivatives=derivatives)
+    assert ctx.variant("front") == ":normalized"
+    assert ctx.variant("front", "thumbnail") == ":thumbnail"
+    assert ctx.variant("back") == ""
+    assert ctx.variant("selfie") == ""
+
+
+def test_gray_over_the_pixel_cap_is_decoded_at_reduced_scale(monkeypatch):
+    out = io.BytesIO()
+    Image.fromarray(np.full((1200, 1600, 3), 120, dtype=np.uint8)).save(out, format="JPEG")
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: out.getvalue())
+    with CaseContext("bkt", "case1") as ctx:
+        report = ctx.quality("front", max_pixels=200_000)
+        gray = ctx.get_gray("front", 200_000)
+        assert gray.size <= 200_000 and ctx.get_size("front") == (1600, 1200)
+        assert (report.width, report.height) == (1600, 1200)
+        # Neither the report nor the gray array needed the full-resolution image
+        assert ("image", "front") not in ctx._memo
@@ -0,0 +1,93 @@
+import base64
+import io
+import json
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import config, security
+from app.derivatives import make_derivatives
+from app.main import app
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.calls.append((name, kwargs))
+            return {}
+
+        return call
+
+
+def _jpeg(size, orientation=None) -> bytes:
+    img = Image.new("RGB", size, (200, 120, 40))
+    out = io.BytesIO()
+    if orientation:
+        exif = img.getexif()
+        exif[0x0112] = orientation
+        img.save(out, format="JPEG", exif=exif)
+    else:
+        img.save(out, format="JPEG")
+    return out.getvalue()
+
+
+def _size(data: bytes):
+    return Image.open(io.BytesIO(data)).size
+
+
+def test_derivatives_are_upright_and_capped():
+    out = make_derivatives(_jpeg((3000, 1000)), max_side=1500, thumb_side=300)
+    assert _size(out["normalized"]) == (1500, 500)
+    assert _size(out["thumbnail"]) == (300, 100)
+    # EXIF orientation 6 (rotate 90) is applied, not carried over
+    out = make_derivatives(_jpeg((400, 300), orientation=6), max_side=1500, thumb_side=300)
+    assert _size(out["normalized"]) == (300, 400)
+    assert 0x0112 not in Image.open(io.BytesIO(out["normalized"])).getexif()
+
+
+def test_upright_jpeg_within_cap_is_used_as_is():
+    out = make_derivatives(_jpeg((800, 600)), max_side=1500, thumb_side=300)
+    assert set(out) == {"thumbnail"}
+    png = io.BytesIO()
+    Image.new("RGB", (80, 60)).save(png, format="PNG")
+    assert set(make_derivatives(png.getvalue(), max_side=1500, thumb_side=300)) == {"normalized", "thumbnail"}
+
+
+def test_ingest_uploads_derivatives_and_enqueues_their_keys(monkeypatch):
+    monkeypatch.setattr(security, "_cached_api_key", "test-key")
+    fakes = {svc: Recorder() for svc in ("s3", "dynamodb", "sqs")}
+    for svc, fake in fakes.items():
+        config.set_boto_client(svc, fake)
+    try:
+        client = TestClient(app)
+        front = _jpeg((4000, 2500))
+        r = client.post(
+            "/v1/ingest",
+            headers={"x-api-key": "test-key"},
+            json={"doc_front_b64": base64.b64encode(front).decode(), "selfie_b64": base64.b64encode(b"not an image").decode()},
+        )
+        assert r.status_code == 200
+        case_id = r.json()["case_id"]
+        puts = {c[1]["Key"]: c[1] for c in fakes["s3"].calls}
+        normalized = puts[f"cases/{case_id}/derived/front_normalized.jpg"]
+        assert max(_size(normalized["Body"])) == config.get_settings().derivative_max_side
+        assert puts[f"cases/{case_id}/front.jpg"]["Tagging"] == f"sha256={normalized['Metadata']['source_sha256']}"
+        body = json.loads(fakes["sqs"].calls[0][1]["MessageBody"])
+        # The selfie cannot be decoded: the worker reads its original
+        assert body["s3_derivatives"] == {
+            "front": {
+                "normalized": f"cases/{case_id}/derived/front_normalized.jpg",
+                "thumbnail": f"cases/{case_id}/derived/front_thumbnail.jpg",
+            }
+        }
+
+        fakes["sqs"].calls.clear()
+        r = client.post("/ui/ingest", files={"doc_front": ("f.jpg", _jpeg((500, 400), orientation=3), "image/jpeg")})
+        case_id = r.json()["case_id"]
+        body = json.loads(fakes["sqs"].calls[0][1]["MessageBody"])
+        assert set(body["s3_derivatives"]["front"]) == {"normalized", "thumbnail"}
+    finally:
+        config.reset_boto_clients()
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from worker.image_ops import blur_score, glare_score, quality_report
+
+
+def _png(arr: np.ndarray) -> bytes:
+    out = io.BytesIO()
+    Image.fromarray(arr).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _reference_blur(gray: np.ndarray) -> float:
+    kernel = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype=np.float32)
+    padded = np.pad(gray, ((1, 1), (1, 1)), mode="reflect")
+    out = np.zeros_like(gray)
+    for i in range(gray.shape[0]):
+        for j in range(gray.shape[1]):
+            out[i, j] = np.sum(padded[i : i + 3, j : j + 3] * kernel)
+    return float(max(0.0, min(1.0, float(np.var(out)) / 1000.0)))
+
+
+def test_blur_and_glare_match_reference():
+    rng = np.random.default_rng(1)
+    arr = rng.integers(0, 30, size=(24, 40), dtype=np.uint8) + 200
+    data = _png(arr.astype(np.uint8))
+    gray = arr.astype(np.float32)
+    assert abs(blur_score(data) - _reference_blur(gray)) < 1e-6
+    assert glare_score(data) == float(np.sum(gray >= 250)) / gray.size
+
+
+def test_quality_report_bounds_working_resolution():
+    arr = np.full((400, 600), 128, dtype=np.uint8)
+    arr[:, :300] = 255
+    report = quality_report(_png(arr), max_pixels=10_000)
+    assert (report.width, report.height) == (600, 400)
+    assert report.working_width * report.working_height <= 10_000
+    assert 0.4 < report.glare < 0.6
+    assert 0.0 <= report.blur <= 1.0
+    assert 0.6 < report.exposure < 0.8
+    assert report.contrast > 0.2
@@ -0,0 +1,39 @@
+import asyncio
+import random
+
+from bench.load import LoadRunner, Outcome, arrival_times, in_process, report, synthetic_requests
+
+
+def test_poisson_arrivals_hit_target_rate():
+    arrivals = arrival_times(50.0, 200.0, random.Random(1))
+    assert abs(len(arrivals) / 200.0 - 50.0) < 2.5
+    assert arrivals == sorted(arrivals) and arrivals[-1] < 200.0
+    assert len(arrival_times(4.0, 10.0, random.Random(1), "uniform")) == 40
+
+
+def test_report_windows_by_send_time():
+    outcomes = [
+        Outcome(sent_at=0.5, path="/v1/ingest", status_code=200, ingest_s=0.1, decision_s=2.0, case_status="PROCESSED"),
+        Outcome(sent_at=1.5, path="/v1/ingest", status_code=503, ingest_s=0.2, error="http_503"),
+        Outcome(sent_at=1.7, path="/ui/ingest", status_code=200, ingest_s=0.3, error="decision_timeout"),
+    ]
+    rep = report(outcomes, window=1.0, duration=2.0)
+    first, second = rep["windows"]
+    assert first["sent"] == 1 and first["error_rate"] == 0.0
+    assert first["decision_ms"]["p50"] == 2000.0
+    assert second["sent"] == 2 and second["error_rate"] == 1.0
+    assert rep["overall"]["error_kinds"] == {"http_503": 1, "decision_timeout": 1}
+    assert set(rep["by_path"]) == {"/v1/ingest", "/ui/ingest"}
+
+
+def test_in_process_run_follows_cases_to_decision(monkeypatch):
+    monkeypatch.setenv("METRICS_MODE", "off")
+    requests = synthetic_requests(2, ui_fraction=0.5, width=320, height=200)
+    with in_process(concurrency=2, poll_interval=0.05) as client:
+        async def go():
+            async with client:
+                return await LoadRunner(client, api_key="bench-key", decision_timeout=30).run(requests, [0.0, 0.01, 0.02])
+
+        outcomes = asyncio.run(go())
+    assert [o.error for o in outcomes] == [None, None, None]
+    assert all(o.case_status == "PROCESSED" and o.decision_s is not None for o in outcomes)
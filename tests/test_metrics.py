@@ -0,0 +1,46 @@
+import io
+import json
+
+from worker import aws_clients
+from worker.metrics import MetricsAggregator
+
+
+class FakeCloudWatch:
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append((Namespace, MetricData))
+
+
+def test_aggregator_batches_counters_and_histograms():
+    cw = FakeCloudWatch()
+    aws_clients.set_client("cloudwatch", cw)
+    try:
+        m = MetricsAggregator(mode="cloudwatch", flush_interval=3600)
+        for _ in range(5):
+            m.incr("CasesProcessed")
+        m.incr("Decisions", dimensions={"Decision": "REVIEW"})
+        for v in (10.0, 10.0, 25.5):
+            m.observe("StageLatency", v, dimensions={"Stage": "textract"})
+        m.shutdown()
+    finally:
+        aws_clients.reset_clients()
+    assert len(cw.calls) == 1
+    data = {d["MetricName"]: d for d in cw.calls[0][1]}
+    assert data["CasesProcessed"]["Value"] == 5
+    assert data["Decisions"]["Dimensions"] == [{"Name": "Decision", "Value": "REVIEW"}]
+    assert data["StageLatency"]["Values"] == [10.0, 25.5]
+    assert data["StageLatency"]["Counts"] == [2.0, 1.0]
+
+
+def test_aggregator_emf_lines():
+    out = io.StringIO()
+    m = MetricsAggregator(mode="emf", flush_interval=3600, stream=out)
+    m.incr("CasesProcessed", 2)
+    m.observe("CaseLatency", 120.0)
+    m.shutdown()
+    doc = json.loads(out.getvalue().strip())
+    assert doc["CasesProcessed"] == 2 and doc["CaseLatency"] == [120.0]
+    names = {d["Name"] for d in doc["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert names == {"CasesProcessed", "CaseLatency"}
@@ -1,4 +1,4 @@
-from worker.mrz import validate_mrz
+from worker.mrz import parse_mrz, validate_mrz, validate_mrz_bulk
 
 
 def test_validate_mrz_td3():
@@ -16,3 +16,42 @@ def test_validate_mrz_td1():
     ok, parsed = validate_mrz([l1, l2, l3])
     assert isinstance(ok, bool)
 
+
+TD3 = ["P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<", "L898902C36UTO7408122F1204159ZE184226B<<<<<10"]
+TD1 = ["I<UTOD231458907<<<<<<<<<<<<<<<", "7408122F1204159UTO<<<<<<<<<<<6", "ERIKSSON<<ANNA<MARIA<<<<<<<<<<"]
+TD2 = ["I<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<", "D231458907UTO7408122F1204159<<<<<<<6"]
+MRVA = ["V<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<", "L8988901C4XXX4009078F96121096ZE184226B<<<<<<"]
+
+
+def test_formats_and_fields():
+    for lines, fmt in ((TD3, "TD3"), (TD1, "TD1"), (TD2, "TD2"), (MRVA, "MRVA")):
+        result = parse_mrz(lines, correct=False)
+        assert result.valid and result.format == fmt
+        assert result.fields["surname"] == "ERIKSSON"
+        assert result.fields["given_names"] == "ANNA MARIA"
+    ok, parsed = validate_mrz(TD3)
+    assert ok and parsed["passport_number"] == "L898902C3" and parsed["dob"] == "740812"
+
+
+def test_ocr_confusions_are_corrected_by_check_digits():
+    # O for 0 in the document number and in the dates, missing trailing fillers
+    read = [TD3[0][:-2], "L8989O2C36UTO74O8122F12O4159ZE184226B<<<<<1O"]
+    assert not parse_mrz(read, correct=False).valid
+    result = parse_mrz(read)
+    assert result.valid
+    assert result.fields["document_number"] == "L898902C3"
+    assert {(c[1], c[2]) for c in result.corrections} == {("O", "0")}
+
+
+def test_ambiguous_or_tampered_mrz_stays_invalid():
+    # Reading 8 as B in either of two places satisfies the check digits: no guess
+    assert not parse_mrz([TD3[0], "L89B902C36UTO7408122F1204159ZE184226B<<<<<10"]).valid
+    assert not validate_mrz([TD3[0], TD3[1][:-1] + "1"])[0]
+
+
+def test_bulk_matches_scalar():
+    tampered = TD1[:2] + [TD1[2]]
+    tampered[1] = tampered[1][:-1] + "7"
+    mrzs = ["\n".join(TD3), "".join(TD1), "\n".join(TD2), "\n".join(MRVA), "\n".join(tampered), "garbage", None]
+    assert validate_mrz_bulk(mrzs).tolist() == [True, True, True, True, False, False, False]
+    assert validate_mrz_bulk(mrzs).tolist() == [parse_mrz([m or ""], correct=False).valid for m in mrzs]
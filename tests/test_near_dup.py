@@ -0,0 +1,116 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+import worker.context as context_mod
+import worker.near_dup as near_dup_mod
+from bench.stand_ins import DynamoStandIn
+from worker.context import CaseContext
+from worker.image_ops import PHASH_BITS, hamming, perceptual_hash
+from worker.near_dup import RECENT_INDEX, NearDupIndex, bucket_keys, near_dup_features
+from worker.result_cache import ResultCache
+
+
+def _photo(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(np.kron(rng.random((30, 40)) * 255, np.ones((16, 16))).astype(np.uint8)).convert("RGB")
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def test_perceptual_hash_survives_small_edits():
+    img = _photo(1)
+    h = perceptual_hash(img)
+    assert h == perceptual_hash(np.asarray(img.convert("L"), dtype=np.float32))
+    assert hamming(h, perceptual_hash(_jpeg(img, quality=50))) <= 6
+    assert hamming(h, perceptual_hash(img.resize((320, 240)))) <= 6
+    assert hamming(h, perceptual_hash(ImageEnhance.Brightness(img).enhance(1.15))) <= 6
+    assert hamming(h, perceptual_hash(_photo(2))) > 16
+
+
+def test_bucket_keys_are_bounded_by_radius():
+    assert len(bucket_keys("doc", 0, 3)) == 4
+    assert len(bucket_keys("doc", 0, 7)) == 4 * 17
+    assert bucket_keys("doc", 0x0001000200030004, 0) == ["doc#0#0004", "doc#1#0003", "doc#2#0002", "doc#3#0001"]
+
+
+def test_index_finds_other_cases_within_radius():
+    index = NearDupIndex(radius=6)
+    base = 0x0123456789ABCDEF
+    index.add("doc", base, "case1")
+    index.add("doc", base ^ 0b1011, "case2")  # 3 bits away
+    index.add("doc", base ^ (0xFF << 20), "case3")  # 8 bits away
+    index.add("selfie", base, "case4")
+    found = index.query("doc", base ^ 1, exclude_case="case1")
+    assert (found.count, found.distance) == (1, 2)
+    assert index.query("doc", ~base & (2**64 - 1)).count == 0
+    # Spread over all four substrings, 6 bits away still matches
+    spread = base ^ (1 << 1 | 1 << 2 | 1 << 17 | 1 << 33 | 1 << 49 | 1 << 50)
+    assert index.query("doc", spread, exclude_case="case2").distance == 6
+
+
+def test_index_persists_in_dynamo_one_item_per_case_and_bucket():
+    dynamo = DynamoStandIn({"phash": ("bucket_key", "case_id")}, local_indexes={"phash": {RECENT_INDEX: "ts"}})
+    writer = NearDupIndex("phash", dynamo=dynamo)
+    writer.add_many([("doc", 42), ("selfie", 42)], "case1")
+    writer.add("doc", 43, "case2")
+    writer.add("doc", 43, "case2")  # redelivered case: same items
+    assert dynamo.calls["batch_write_item"] == 3
+    assert len(dynamo.tables["phash"]) == 4 * 3
+    # Nothing kept in process when the table is the source of truth
+    assert writer._buckets == {}
+    reader = NearDupIndex("phash", radius=3, dynamo=dynamo)
+    found = reader.query("doc", 40, exclude_case="case3")
+    assert (found.count, found.distance) == (2, 1)
+    assert dynamo.calls["query"] == 4
+    # Expired entries are ignored until DynamoDB deletes them
+    for item in dynamo.tables["phash"].values():
+        item["ttl"] = {"N": "1"}
+    assert reader.query("doc", 40).count == 0
+
+
+def test_long_buckets_are_read_newest_first_up_to_the_limit():
+    dynamo = DynamoStandIn({"phash": ("bucket_key", "case_id")}, local_indexes={"phash": {RECENT_INDEX: "ts"}})
+    index = NearDupIndex("phash", radius=3, dynamo=dynamo, bucket_limit=5)
+    # Same template: every document shares its first substring, the rest differ
+    rng = np.random.default_rng(7)
+    hashes = [0x1234 | int(rng.integers(0, 2**48)) << 16 for _ in range(20)]
+    for n, h in enumerate(hashes):
+        index.add("doc", h, f"case{n:02d}")
+    for item in dynamo.tables["phash"].values():
+        item["ts"] = {"N": str(1000 + int(item["case_id"]["S"][4:]))}
+    reads = []
+    query = dynamo.query
+    dynamo.query = lambda **kw: reads.append(kw) or query(**kw)
+    # The oldest case is still found through its own substrings
+    assert index.query("doc", hashes[0]).count == 1
+    # The shared bucket only yields its newest entries
+    shared = index._query_bucket("doc#0#1234")
+    assert sorted(case for case, _ in shared) == [f"case{n}" for n in range(15, 20)]
+    assert len(reads) == 4 + 1
+    assert all(r["Limit"] == 5 and r["ScanIndexForward"] is False for r in reads)
+
+
+def test_near_dup_features_flags_resubmitted_edits(monkeypatch):
+    front = _photo(3)
+    objects = {
+        "a/front": _jpeg(front),
+        "b/front": _jpeg(front.crop((8, 8, 632, 472)), quality=70),
+        "b/selfie": _jpeg(_photo(4)),
+    }
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: objects[key])
+    monkeypatch.setattr(context_mod, "s3_object_tags", lambda bucket, key: {})
+    monkeypatch.setattr(near_dup_mod, "_index", NearDupIndex())
+    results = ResultCache()
+    with CaseContext("bkt", "a", results=results) as ctx:
+        first = near_dup_features(ctx, {"front": "a/front", "selfie": None})
+    with CaseContext("bkt", "b", results=results) as ctx:
+        second = near_dup_features(ctx, {"front": "b/front", "selfie": "b/selfie"})
+    assert first == {"doc_near_dup_count": 0, "doc_near_dup_distance": PHASH_BITS, "selfie_near_dup_count": 0, "selfie_near_dup_distance": PHASH_BITS}
+    assert second["doc_near_dup_count"] == 1 and second["doc_near_dup_distance"] <= 6
+    assert second["selfie_near_dup_count"] == 0
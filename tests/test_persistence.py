@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from worker import aws_clients, persistence
+from worker.metrics import MetricsAggregator
+from worker.persistence import ArtifactUploader, update_case_with_results
+
+
+class FakeDynamo:
+    def __init__(self):
+        self.calls = []
+
+    def transact_write_items(self, TransactItems):
+        self.calls.append(TransactItems)
+
+
+class FlakyS3:
+    def __init__(self, failures):
+        self.failures = failures
+        self.puts = []
+
+    def put_object(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("reset")
+        self.puts.append(kwargs)
+
+
+def test_results_commit_in_one_transaction_and_artifact_is_retried(monkeypatch):
+    dynamo, s3 = FakeDynamo(), FlakyS3(failures=2)
+    aws_clients.set_client("dynamodb", dynamo)
+    aws_clients.set_client("s3", s3)
+    uploader = ArtifactUploader(workers=1, max_wait=0)
+    monkeypatch.setattr(persistence, "_uploader", uploader)
+    try:
+        update_case_with_results("c1", "bkt", {}, {"blur_score": 0.1}, 0.42, ["r1"], "REVIEW")
+    finally:
+        uploader.shutdown()
+        aws_clients.reset_clients()
+    assert len(dynamo.calls) == 1
+    update, put = dynamo.calls[0]
+    assert update["Update"]["ExpressionAttributeValues"][":s"] == {"S": "PROCESSED"}
+    assert update["Update"]["ExpressionAttributeValues"][":a"] == {"S": "cases/c1/artifacts/results.json"}
+    assert put["Put"]["Item"]["type"] == {"S": "DECISION"}
+    assert json.loads(put["Put"]["Item"]["payload"]["S"]) == {"decision": "REVIEW", "score": 0.42}
+    assert len(s3.puts) == 1
+    assert json.loads(s3.puts[0]["Body"]) == {
+        "features": {"blur_score": 0.1}, "score": 0.42, "reasons": ["r1"], "decision": "REVIEW"
+    }
+
+
+def test_failed_artifact_upload_fails_the_case(monkeypatch):
+    dynamo, s3 = FakeDynamo(), FlakyS3(failures=99)
+    aws_clients.set_client("dynamodb", dynamo)
+    aws_clients.set_client("s3", s3)
+    uploader = ArtifactUploader(workers=1, attempts=3, max_wait=0)
+    metrics = MetricsAggregator(mode="off")
+    monkeypatch.setattr(persistence, "_uploader", uploader)
+    monkeypatch.setattr(persistence, "get_metrics", lambda: metrics)
+    try:
+        with pytest.raises(ConnectionError):
+            update_case_with_results("c1", "bkt", {}, {}, 0.9, [], "REJECT")
+    finally:
+        uploader.shutdown()
+        aws_clients.reset_clients()
+    assert s3.failures == 96 and not s3.puts
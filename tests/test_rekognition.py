@@ -0,0 +1,98 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import worker.context as context_mod
+from worker import aws_clients, persistence
+from worker.context import CaseContext
+from worker.config import get_worker_settings
+from worker.persistence import ArtifactUploader
+from worker.rekognition import compare_faces, extract_doc_face
+
+
+class FakeRekognition:
+    def __init__(self):
+        self.compared = []
+
+    def detect_faces(self, Image, Attributes):
+        return {"FaceDetails": [{"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}}]}
+
+    def compare_faces(self, SourceImage, TargetImage, SimilarityThreshold):
+        self.compared.append((SourceImage, TargetImage))
+        return {"FaceMatches": [{"Similarity": 91.5}]}
+
+
+class RecordingS3:
+    def __init__(self):
+        self.puts = []
+
+    def put_object(self, **kwargs):
+        self.puts.append(kwargs)
+
+
+def _jpeg() -> bytes:
+    out = io.BytesIO()
+    Image.fromarray(np.full((100, 120, 3), 90, dtype=np.uint8)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_doc_face_is_compared_inline_and_persisted_in_background(monkeypatch):
+    rek, s3 = FakeRekognition(), RecordingS3()
+    aws_clients.set_client("rekognition", rek)
+    aws_clients.set_client("s3", s3)
+    gets = []
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: gets.append(key) or _jpeg())
+    uploader = ArtifactUploader(workers=1)
+    monkeypatch.setattr(persistence, "_uploader", uploader)
+    try:
+        with CaseContext("bkt", "case1") as ctx:
+            crop = extract_doc_face("bkt", "case1", "cases/case1/front.jpg", ctx=ctx)
+            assert Image.open(io.BytesIO(crop)).size == (36, 40)
+            assert compare_faces("bkt", "cases/case1/selfie.jpg", doc_face_bytes=crop) == 91.5
+        assert uploader.drain(timeout=5)
+    finally:
+        uploader.shutdown()
+        aws_clients.reset_clients()
+    source, target = rek.compared[0]
+    assert target == {"Bytes": crop}
+    assert source["S3Object"]["Name"] == "cases/case1/selfie.jpg"
+    assert gets == ["cases/case1/front.jpg"]
+    assert [(p["Key"], p["Body"]) for p in s3.puts] == [("cases/case1/doc_face.jpg", crop)]
+
+
+def test_compare_faces_by_key_and_oversize_crops_by_key():
+    rek = FakeRekognition()
+    aws_clients.set_client("rekognition", rek)
+    big = b"x" * (5 * 1024 * 1024 + 1)
+    try:
+        assert compare_faces("bkt", "selfie.jpg", "front.jpg") == 91.5
+        # Too large to send inline: the uploaded copy is compared instead
+        assert compare_faces("bkt", "selfie.jpg", "doc_face.jpg", doc_face_bytes=big) == 91.5
+        with pytest.raises(ValueError):
+            compare_faces("bkt", "selfie.jpg", doc_face_bytes=big)
+    finally:
+        aws_clients.reset_clients()
+    assert [c[1] for c in rek.compared] == [
+        {"S3Object": {"Bucket": "bkt", "Name": "front.jpg"}},
+        {"S3Object": {"Bucket": "bkt", "Name": "doc_face.jpg"}},
+    ]
+
+
+def test_doc_face_closes_only_the_context_it_creates(monkeypatch):
+    aws_clients.set_client("rekognition", FakeRekognition())
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: _jpeg())
+    monkeypatch.setattr(get_worker_settings(), "doc_face_persist", False)
+    closed = []
+    close = CaseContext.close
+    monkeypatch.setattr(CaseContext, "close", lambda self: closed.append(self) or close(self))
+    try:
+        assert extract_doc_face("bkt", "case1", "front.jpg")
+        assert len(closed) == 1 and closed[0]._memo == {}
+        ctx = CaseContext("bkt", "case1")
+        assert extract_doc_face("bkt", "case1", "front.jpg", ctx=ctx)
+        assert len(closed) == 1 and ctx._memo
+        ctx.close()
+    finally:
+        aws_clients.reset_clients()
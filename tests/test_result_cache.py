@@ -0,0 +1,113 @@
+import hashlib
+import io
+import json
+import threading
+import time
+
+import botocore.exceptions
+import numpy as np
+from PIL import Image
+
+import worker.context as context_mod
+from worker.context import CaseContext
+from worker.features import exact_duplicate
+from worker.result_cache import ResultCache
+
+
+class FakeDynamo:
+    def __init__(self):
+        self.items = {}
+        self.gets = 0
+        self.lock = threading.Lock()
+
+    def get_item(self, TableName, Key, **kwargs):
+        self.gets += 1
+        item = self.items.get(Key["cache_key"]["S"])
+        return {"Item": item} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, **kwargs):
+        key = Item["cache_key"]["S"]
+        with self.lock:
+            if ConditionExpression and key in self.items:
+                # Only attribute_not_exists OR expired-ttl conditions are written
+                now = int(kwargs["ExpressionAttributeValues"][":now"]["N"])
+                if int(self.items[key]["ttl"]["N"]) >= now:
+                    raise botocore.exceptions.ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+            self.items[key] = Item
+
+
+def test_lru_evicts_oldest_and_none_is_cached():
+    cache = ResultCache(max_entries=2)
+    calls = []
+
+    def compute(v):
+        calls.append(v)
+        return v
+
+    assert cache.get_or_compute("k", "a", lambda: compute(None)) == (None, False)
+    assert cache.get_or_compute("k", "a", lambda: compute("x")) == (None, True)
+    cache.get_or_compute("k", "b", lambda: compute(2))
+    cache.get_or_compute("k", "c", lambda: compute(3))
+    assert cache.get_or_compute("k", "a", lambda: compute(4)) == (4, False)
+    assert calls == [None, 2, 3, 4]
+    # No digest: always computed, never cached
+    assert cache.get_or_compute("k", None, lambda: 5) == (5, False)
+
+
+def test_shared_tier_serves_other_workers_and_expires():
+    dynamo = FakeDynamo()
+    ResultCache(table="t", dynamo=dynamo).get_or_compute("textract", "abc", lambda: {"fields": {"a": "1"}})
+    other = ResultCache(table="t", dynamo=dynamo)
+    assert other.get_or_compute("textract", "abc", lambda: {}) == ({"fields": {"a": "1"}}, True)
+    expired = ResultCache(table="t", ttl=-1, dynamo=dynamo)
+    assert expired.get_or_compute("textract", "zzz", lambda: 1) == (1, False)
+    key = ResultCache.cache_key("textract", "zzz")
+    assert json.loads(dynamo.items[key]["v"]["S"]) == 1
+    assert ResultCache(table="t", dynamo=dynamo).get_or_compute("textract", "zzz", lambda: 2) == (2, False)
+
+
+def test_quality_and_duplicates_keyed_by_content(monkeypatch):
+    out = io.BytesIO()
+    Image.fromarray(np.full((40, 40), 90, dtype=np.uint8)).save(out, format="PNG")
+    data = out.getvalue()
+    fetched = []
+
+    def fake_get(bucket, key):
+        fetched.append(key)
+        return data
+
+    monkeypatch.setattr(context_mod, "s3_get_object", fake_get)
+    monkeypatch.setattr(context_mod, "s3_object_tags", lambda bucket, key: {})
+    cache = ResultCache()
+    with CaseContext("b", "case1", results=cache) as ctx:
+        first = ctx.quality("cases/case1/front.jpg")
+        assert not exact_duplicate(ctx, "cases/case1/front.jpg")
+    with CaseContext("b", "case2", hashes={"cases/case2/front.jpg": hashlib.sha256(data).hexdigest()}, results=cache) as ctx:
+        assert ctx.quality("cases/case2/front.jpg") == first
+        assert exact_duplicate(ctx, "cases/case2/front.jpg")
+    # The second case never downloaded its image
+    assert fetched == ["cases/case1/front.jpg"]
+
+
+def test_first_seen_is_won_by_exactly_one_worker():
+    dynamo = FakeDynamo()
+    barrier = threading.Barrier(4)
+    seen = {}
+
+    def worker(case_id):
+        cache = ResultCache(table="t", dynamo=dynamo)
+        barrier.wait()
+        seen[case_id] = cache.first_seen("first_case", "abc", case_id)
+
+    threads = [threading.Thread(target=worker, args=(f"case{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(seen.values())) == 1
+    winner = next(iter(seen.values()))
+    # Its own record, with the long TTL rather than the result-cache one
+    item = dynamo.items[ResultCache.cache_key("first_case", "abc")]
+    assert json.loads(item["v"]["S"]) == winner
+    assert int(item["ttl"]["N"]) > 300 * 24 * 3600 + time.time()
+    assert ResultCache(table="t", dynamo=dynamo).first_seen("first_case", "abc", "late") == winner
@@ -1,4 +1,10 @@
-from worker.scoring import load_rules, score_features
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from worker.scoring import compile_rules, get_ruleset, load_rules, score_features, score_features_batch
 
 
 def test_score_features():
@@ -18,3 +24,56 @@ def test_score_features():
     assert 0.0 <= score <= 1.0
     assert decision in ("REJECT", "APPROVE", "REVIEW")
 
+
+def test_compiled_ruleset_rejects_unsafe_expressions_and_is_immutable():
+    with pytest.raises(ValueError):
+        compile_rules('explanations:\n  - when: "face_similarity.__class__ == 1"\n')
+    with pytest.raises(ValueError):
+        compile_rules('explanations:\n  - when: "len(x) > 1"\n')
+    ruleset = compile_rules('weights: {a: 1.0}\nexplanations:\n  - when: "a > 1 and b == 0"\n    reason: r\n')
+    with pytest.raises(AttributeError):
+        ruleset.weights = {}
+    # Rules referencing missing features are skipped
+    assert score_features({"a": 2}, ruleset)[1] == []
+    assert score_features({"a": 2, "b": False}, ruleset)[1] == ["r"]
+
+
+def test_get_ruleset_reloads_only_on_change(tmp_path):
+    path = tmp_path / "rules.yaml"
+    path.write_text("weights: {a: 1.0}\n")
+    first = get_ruleset(str(path))
+    assert get_ruleset(str(path)) is first
+    path.write_text("weights: {a: 2.0}\n")
+    os.utime(path, ns=(1, 1))
+    second = get_ruleset(str(path))
+    assert second is not first and second.weights["a"] == 2.0
+    # A broken edit keeps the last good ruleset
+    path.write_text("weights: [\n")
+    os.utime(path, ns=(2, 2))
+    assert get_ruleset(str(path)) is second
+
+
+def test_score_features_batch_matches_per_case():
+    rules = load_rules("config/rules.yaml")
+    rng = np.random.default_rng(7)
+    n = 300
+    df = pd.DataFrame({
+        "face_similarity": rng.uniform(0, 100, n),
+        "textract_conf_avg": rng.uniform(50, 100, n),
+        "mrz_valid": rng.random(n) > 0.3,
+        "expiry_valid": rng.random(n) > 0.2,
+        "blur_score": rng.random(n),
+        "glare_score": rng.random(n) * 0.3,
+        "velocity_count_24h": rng.integers(0, 12, n),
+        "device_hash_dup": rng.random(n) > 0.8,
+    })
+    df.loc[::7, "face_similarity"] = np.nan
+    scores, flags, decisions = score_features_batch(df, rules)
+    for i, row in enumerate(df.to_dict("records")):
+        feats = {k: v for k, v in row.items() if not (isinstance(v, float) and np.isnan(v))}
+        score, reasons, decision = score_features(feats, rules)
+        assert scores[i] == score
+        assert [r.reason for r, f in zip(rules.rules, flags[i]) if f] == reasons
+        assert decisions[i] == decision
+    matrix_scores, _, _ = score_features_batch(df.to_numpy(dtype=float), rules, columns=list(df.columns))
+    assert np.array_equal(matrix_scores, scores)
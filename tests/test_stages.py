@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from worker.stages import StageGraph
+
+
+def test_independent_stages_run_in_parallel():
+    pool = ThreadPoolExecutor(max_workers=4)
+    g = (
+        StageGraph()
+        .add("a", lambda: time.sleep(0.1) or 1)
+        .add("b", lambda: time.sleep(0.1) or 2)
+        .add("c", lambda b: b * 10, "b")
+        .add("d", lambda a, c: a + c, "a", "c")
+    )
+    t0 = time.perf_counter()
+    results = g.run(pool)
+    assert time.perf_counter() - t0 < 0.18
+    assert results["d"] == 21
+    assert set(g.timings) == {"a", "b", "c", "d"}
+
+
+def test_stage_failure_skips_dependents():
+    pool = ThreadPoolExecutor(max_workers=2)
+    ran = []
+
+    def boom():
+        raise ValueError("bad")
+
+    g = StageGraph().add("a", boom).add("b", lambda a: ran.append(a), "a")
+    with pytest.raises(ValueError):
+        g.run(pool)
+    assert ran == []
+    with pytest.raises(ValueError):
+        StageGraph().add("x", lambda y: y, "y")
@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import worker.context as context_mod
+import worker.templates as templates_mod
+from worker.context import CaseContext
+from worker.features import template_geom_score
+from worker.result_cache import ResultCache
+from worker.templates import FALLBACK_SCORE, TemplateIndex, aspect_ratio, layout_descriptor, write_index
+
+
+def _card(layout: str, h: int = 400, w: int = 634, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = rng.normal(200, 8, size=(h, w)).astype(np.float32)
+    if layout == "passport":
+        img[int(h * 0.78) :, int(w * 0.04) : int(w * 0.96)] = 40  # MRZ band
+        img[int(h * 0.15) : int(h * 0.7), int(w * 0.04) : int(w * 0.3)] = 90  # portrait left
+    else:
+        img[int(h * 0.2) : int(h * 0.8), int(w * 0.65) : int(w * 0.95)] = 90  # portrait right
+        for i in range(5):
+            y = int(h * (0.2 + 0.12 * i))
+            img[y : y + 10, int(w * 0.05) : int(w * 0.55)] = 30
+    return img
+
+
+def _index(tmp_path) -> TemplateIndex:
+    write_index(
+        str(tmp_path / "index.npy"),
+        [
+            ("passport_td3", 1.585, [layout_descriptor(_card("passport", seed=s)) for s in (1, 2)]),
+            ("dl_generic", 1.585, [layout_descriptor(_card("license", seed=3))]),
+        ],
+    )
+    return TemplateIndex.load(str(tmp_path / "index.npy"))
+
+
+def test_descriptor_is_unit_length_and_orientation_agnostic():
+    card = _card("passport")
+    desc = layout_descriptor(card)
+    assert desc.dtype == np.float32
+    assert abs(float(np.linalg.norm(desc)) - 1.0) < 1e-4
+    assert np.allclose(layout_descriptor(np.rot90(card, -1)), desc, atol=1e-5)
+    assert aspect_ratio(card.shape) == aspect_ratio(card.T.shape)
+
+
+def test_index_is_memory_mapped_and_matches_best_template(tmp_path):
+    index = _index(tmp_path)
+    assert isinstance(index.matrix, np.memmap)
+    assert len(index) == 2 and index.labels.tolist() == [0, 0, 1]
+
+    passport = index.match(_card("passport", seed=9))
+    assert passport.template == "passport_td3"
+    assert passport.score < 0.2
+    assert index.match(_card("license", seed=9)).template == "dl_generic"
+
+    # Right layout at the wrong aspect ratio scores worse
+    squashed = index.match(_card("passport", h=634, w=660, seed=9))
+    assert squashed.score > passport.score + 0.3
+    blank = index.match(np.full((400, 634), 128, dtype=np.float32))
+    assert blank.score > 0.9
+
+
+def test_template_geom_score_falls_back_and_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates_mod, "_index", None)
+    monkeypatch.setattr(templates_mod, "_index_loaded", True)
+    with CaseContext("bkt", "case1") as ctx:
+        assert template_geom_score(ctx, "front") == FALLBACK_SCORE
+
+    out = io.BytesIO()
+    Image.fromarray(_card("license", seed=5).clip(0, 255).astype(np.uint8)).save(out, format="PNG")
+    monkeypatch.setattr(context_mod, "s3_get_object", lambda bucket, key: out.getvalue())
+    monkeypatch.setattr(templates_mod, "_index", _index(tmp_path))
+    results = ResultCache()
+    with CaseContext("bkt", "case1", hashes={"front": "abc"}, results=results) as ctx:
+        score = template_geom_score(ctx, "front")
+    assert score < 0.2
+    assert any(key.startswith(results.cache_key("template", "abc:")) for key in results._entries)
@@ -0,0 +1,36 @@
+from worker.textract import parse_analyze_document, parse_analyze_id
+
+
+def _kv(i: int, key: str, value: str, conf: float):
+    return [
+        {"Id": f"k{i}", "BlockType": "KEY_VALUE_SET", "EntityTypes": ["KEY"], "Confidence": 80.0,
+         "Relationships": [{"Type": "CHILD", "Ids": [f"kw{i}"]}, {"Type": "VALUE", "Ids": [f"v{i}"]}]},
+        {"Id": f"kw{i}", "BlockType": "WORD", "Text": key},
+        {"Id": f"v{i}", "BlockType": "KEY_VALUE_SET", "EntityTypes": ["VALUE"], "Confidence": conf,
+         "Relationships": [{"Type": "CHILD", "Ids": [f"vw{i}"]}]},
+        {"Id": f"vw{i}", "BlockType": "WORD", "Text": value},
+    ]
+
+
+def test_parse_analyze_document_fields_confidence_and_mrz():
+    mrz = "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<"
+    blocks = _kv(1, "Surname", "ERIKSSON", 90.0) + _kv(2, "Date of birth", "1974-08-12", 70.0)
+    blocks.append({"Id": "l1", "BlockType": "LINE", "Text": mrz})
+    out = parse_analyze_document({"Blocks": blocks})
+    assert out["fields"] == {"surname": "ERIKSSON", "date_of_birth": "1974-08-12"}
+    assert out["confidence"] == {"surname": 90.0, "date_of_birth": 70.0}
+    assert out["avg_conf"] == 80.0
+    assert out["mrz_lines"] == [mrz]
+
+
+def test_parse_analyze_id_extracts_mrz_code():
+    l1 = "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<"
+    l2 = "L898902C36UTO7408122F1204159ZE184226B<<<<<10"
+    resp = {"IdentityDocuments": [{"IdentityDocumentFields": [
+        {"Type": {"Text": "LAST_NAME"}, "ValueDetection": {"Text": "ERIKSSON", "Confidence": 98.0}},
+        {"Type": {"Text": "MRZ_CODE"}, "ValueDetection": {"Text": f"{l1}\n{l2}", "Confidence": 96.0}},
+    ]}]}
+    out = parse_analyze_id(resp)
+    assert out["fields"]["last_name"] == "ERIKSSON"
+    assert out["mrz_lines"] == [l1, l2]
+    assert out["avg_conf"] == 97.0
@@ -0,0 +1,62 @@
+import urllib.request
+
+import boto3
+from botocore.stub import Stubber
+from fastapi.testclient import TestClient
+
+from app import telemetry
+from app.main import app
+from worker.tracing import TraceRegistry, get_registry, instrument_client, serve_metrics, span
+
+
+def test_span_records_histogram_inflight_and_errors():
+    with span("unit_test", stage="a"):
+        pass
+    try:
+        with span("unit_test", stage="a"):
+            raise RuntimeError("x")
+    except RuntimeError:
+        pass
+    text = get_registry().render()
+    assert 'fraud_worker_unit_test_duration_seconds_count{stage="a"} 2' in text
+    assert 'fraud_worker_unit_test_duration_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'fraud_worker_unit_test_in_flight{stage="a"} 0' in text
+    assert 'fraud_worker_unit_test_errors_total{stage="a"} 1' in text
+
+
+def test_instrumented_client_records_aws_calls():
+    s3 = instrument_client(boto3.session.Session(region_name="us-east-1").client("s3"), "s3")
+    with Stubber(s3) as stub:
+        stub.add_response("get_object", {}, {"Bucket": "b", "Key": "k"})
+        s3.get_object(Bucket="b", Key="k")
+    text = get_registry().render()
+    assert 'fraud_worker_aws_call_duration_seconds_count{operation="GetObject",service="s3"} 1' in text
+
+
+def test_metrics_endpoints():
+    server = serve_metrics(0, host="127.0.0.1")
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+        assert "# TYPE fraud_worker_" in body
+    finally:
+        server.shutdown()
+    client = TestClient(app)
+    client.get("/v1/case/abc")  # no API key -> 422
+    # Not served on the public port
+    assert client.get("/metrics").status_code == 404
+    server = telemetry.serve_metrics(0, host="127.0.0.1")
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+    finally:
+        server.shutdown()
+    assert 'fraud_api_http_request_duration_seconds_count{method="GET",route="/v1/case/{case_id}",status="422"} 1' in body
+
+
+def test_registry_bucket_boundaries():
+    reg = TraceRegistry(prefix="t_", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 2.0):
+        reg.observe("x", v)
+    text = reg.render()
+    assert 't_x_bucket{le="0.1"} 2' in text
+    assert 't_x_bucket{le="1.0"} 3' in text
+    assert 't_x_bucket{le="+Inf"} 4' in text
@@ -0,0 +1,60 @@
+from app.velocity import aggregated_updates
+from worker.velocity import VelocityStore, counts_from_buckets, velocity_features
+from worker import velocity
+
+
+class FakeDynamo:
+    """Applies velocity increments and answers the bucket query like DynamoDB would."""
+
+    def __init__(self):
+        self.counters = {}
+        self.queries = 0
+
+    def apply(self, updates):
+        for u in updates:
+            key = (u["Key"]["velocity_key"]["S"], int(u["Key"]["bucket"]["N"]))
+            self.counters[key] = self.counters.get(key, 0) + int(u["ExpressionAttributeValues"][":inc"]["N"])
+
+    def query(self, **kwargs):
+        self.queries += 1
+        vals = kwargs["ExpressionAttributeValues"]
+        since = int(vals[":since"]["N"])
+        items = [
+            {"bucket": {"N": str(b)}, "n": {"N": str(n)}}
+            for (k, b), n in sorted(self.counters.items())
+            if k == vals[":k"]["S"] and b >= since
+        ]
+        return {"Items": items}
+
+
+NOW = 1_700_000_000.0
+
+
+def test_windows_from_hourly_buckets():
+    dynamo = FakeDynamo()
+    meta = {"device_hash": "d1", "ip": "10.0.0.1"}
+    for hours_ago, n in ((0, 2), (5, 1), (30, 3), (200, 4)):
+        dynamo.apply(aggregated_updates("t", [meta] * n, NOW - hours_ago * 3600))
+    store = VelocityStore("t", cache_ttl=60, dynamo=dynamo)
+    c = store.counts("device", "d1", now=NOW)
+    assert (c.h1, c.h24, c.d7) == (2, 3, 6)
+    assert store.counts("ip", "10.0.0.1", now=NOW) == c
+    # Cached for cache_ttl: one query per key
+    store.counts("device", "d1", now=NOW + 30)
+    assert dynamo.queries == 2
+
+
+def test_counts_are_hour_aligned():
+    assert counts_from_buckets({int(NOW) // 3600 * 3600 - 3600: 1}, NOW).h1 == 1
+    assert counts_from_buckets({int(NOW) // 3600 * 3600 - 7200: 1}, NOW).h1 == 0
+
+
+def test_velocity_features_without_metadata_or_on_errors(monkeypatch):
+    class Broken:
+        def query(self, **kwargs):
+            raise RuntimeError("throttled")
+
+    monkeypatch.setattr(velocity, "_store", VelocityStore("t", dynamo=Broken()))
+    f = velocity_features({"device_hash": "d1"})
+    assert f["velocity_count_24h"] == 0 and f["device_hash_dup"] is False
+    assert velocity_features(None)["ip_velocity_count_24h"] == 0
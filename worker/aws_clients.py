@@ -1,19 +1,71 @@
 import io
 import json
+import os
+import threading
 from typing import Any, Dict, Optional
 
 import boto3
 from botocore.config import Config as BotoConfig
 
 from .config import get_worker_settings
+from .tracing import instrument_client
+
+
+# Process-wide registry: one session and one client per service. boto3 clients are
+# thread-safe once created; creation itself is serialized under the lock.
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[str, Any] = {}
 
 
 def session() -> boto3.session.Session:
-    return boto3.session.Session(region_name=get_worker_settings().aws_region)
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session(region_name=get_worker_settings().aws_region)
+    return _session
+
+
+def boto_config() -> BotoConfig:
+    settings = get_worker_settings()
+    return BotoConfig(
+        retries={"max_attempts": 8, "mode": "standard"},
+        max_pool_connections=settings.aws_max_pool_connections,
+        tcp_keepalive=settings.aws_tcp_keepalive,
+    )
+
+
+def endpoint_url(service: str) -> Optional[str]:
+    specific = os.getenv(f"AWS_ENDPOINT_URL_{service.upper().replace('-', '_')}")
+    return specific or get_worker_settings().aws_endpoint_url or None
 
 
 def client(service: str):
-    return session().client(service, config=BotoConfig(retries={"max_attempts": 8, "mode": "standard"}))
+    c = _clients.get(service)
+    if c is not None:
+        return c
+    sess = session()
+    with _lock:
+        c = _clients.get(service)
+        if c is None:
+            c = sess.client(service, config=boto_config(), endpoint_url=endpoint_url(service))
+            _clients[service] = instrument_client(c, service)
+    return c
+
+
+def set_client(service: str, stand_in: Any) -> None:
+    """Register a stand-in (e.g. an in-process fake) returned by client(service)."""
+    with _lock:
+        _clients[service] = stand_in
+
+
+def reset_clients() -> None:
+    """Drop all cached clients and the session; they are recreated on next use."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
 
 
 def s3_get_object(bucket: str, key: str) -> bytes:
@@ -22,6 +74,11 @@ def s3_get_object(bucket: str, key: str) -> bytes:
     return r["Body"].read()
 
 
+def s3_object_tags(bucket: str, key: str) -> Dict[str, str]:
+    r = client("s3").get_object_tagging(Bucket=bucket, Key=key)
+    return {t["Key"]: t["Value"] for t in r.get("TagSet", [])}
+
+
 def s3_put_object(bucket: str, key: str, data: bytes, kms_key_arn: Optional[str] = None, content_type: str = "image/jpeg", metadata: Optional[Dict[str, str]] = None):
     s3 = client("s3")
     args: Dict[str, Any] = {
@@ -38,9 +95,10 @@ def s3_put_object(bucket: str, key: str, data: bytes, kms_key_arn: Optional[str]
 
 
 def put_metric(name: str, value: float, unit: str = "Count"):
-    cw = client("cloudwatch")
-    cw.put_metric_data(
-        Namespace="FraudDetection",
-        MetricData=[{"MetricName": name, "Value": value, "Unit": unit}],
-    )
+    """Record a metric in the process-wide aggregator; it is sent with the next batch flush."""
+    from .metrics import get_metrics
 
+    if unit == "Count":
+        get_metrics().incr(name, value)
+    else:
+        get_metrics().observe(name, value, unit=unit)
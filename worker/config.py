@@ -4,14 +4,54 @@ from functools import lru_cache
 
 class WorkerSettings:
     aws_region: str = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+    # Optional endpoint override (e.g. LocalStack); AWS_ENDPOINT_URL_<SERVICE> overrides per service
+    aws_endpoint_url: str = os.getenv("AWS_ENDPOINT_URL", "")
+    aws_max_pool_connections: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    aws_tcp_keepalive: bool = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() in ("1", "true", "yes")
     s3_bucket: str = os.getenv("S3_BUCKET", "")
     kms_key_arn: str = os.getenv("KMS_KEY_ARN", "")
     sqs_queue_url: str = os.getenv("SQS_QUEUE_URL", "")
+    sqs_visibility_timeout: int = int(os.getenv("SQS_VISIBILITY_TIMEOUT", "60"))
+    sqs_wait_seconds: int = int(os.getenv("SQS_WAIT_SECONDS", "15"))
+    worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY", "8"))
+    stage_workers: int = int(os.getenv("STAGE_WORKERS", "32"))
     dynamo_cases_table: str = os.getenv("DYNAMO_CASES_TABLE", "fraud_cases")
     dynamo_events_table: str = os.getenv("DYNAMO_EVENTS_TABLE", "fraud_events")
+    dynamo_velocity_table: str = os.getenv("DYNAMO_VELOCITY_TABLE", "fraud_velocity")
+    # Seconds a velocity lookup is reused in process before Dynamo is read again
+    velocity_cache_ttl: float = float(os.getenv("VELOCITY_CACHE_TTL", "5"))
+    # Content-addressed result cache: DynamoDB table (empty keeps it in process only), TTL and LRU size
+    result_cache_table: str = os.getenv("RESULT_CACHE_TABLE", "fraud_results")
+    result_cache_ttl: float = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+    result_cache_size: int = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+    # How long the first case to use an image is remembered (doc_exact_dup), in seconds
+    first_seen_ttl: float = float(os.getenv("FIRST_SEEN_TTL", str(365 * 24 * 3600)))
+    # Perceptual-hash index of past front/selfie images (see worker/near_dup.py; empty
+    # keeps it in process only) and the Hamming radius (of 64 bits, below 8) for a near-duplicate
+    near_dup_table: str = os.getenv("NEAR_DUP_TABLE", "fraud_phash")
+    near_dup_radius: int = int(os.getenv("NEAR_DUP_RADIUS", "6"))
+    # Seconds an image stays findable as a near-duplicate
+    near_dup_ttl: float = float(os.getenv("NEAR_DUP_TTL", str(365 * 24 * 3600)))
+    # Newest entries read per bucket, bounding a lookup to 4 * 17 * this many items per image
+    near_dup_bucket_limit: int = int(os.getenv("NEAR_DUP_BUCKET_LIMIT", "50"))
+    # Threads uploading results.json artifacts in the background
+    artifact_upload_workers: int = int(os.getenv("ARTIFACT_UPLOAD_WORKERS", "4"))
+    # Keep the document portrait crop as cases/{id}/doc_face.jpg (uploaded in the background;
+    # CompareFaces gets the crop inline either way, unless it is over the 5 MB inline limit:
+    # then it is uploaded first whatever this says)
+    doc_face_persist: bool = os.getenv("DOC_FACE_PERSIST", "true").lower() in ("1", "true", "yes")
     rules_path: str = os.getenv("RULES_PATH", "config/rules.yaml")
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # cloudwatch (batched PutMetricData), emf (embedded metric format on stdout) or off
+    metrics_mode: str = os.getenv("METRICS_MODE", "cloudwatch")
+    metrics_flush_interval: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "60"))
+    # Port for the Prometheus /metrics endpoint (0 disables)
+    metrics_port: int = int(os.getenv("METRICS_PORT", "9102"))
     risky_ips: list[str] = [s for s in os.getenv("RISKY_IPS", "").split(",") if s]
+    # Template layout index (<path> and its .json sidecar, built by scripts/build_template_index.py);
+    # template_geom_score stays 0.5 when it is missing
+    template_index_path: str = os.getenv("TEMPLATE_INDEX_PATH", "config/templates/index.npy")
+    image_max_pixels: int = int(os.getenv("IMAGE_MAX_PIXELS", "4000000"))
 
 
 @lru_cache
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+log = logging.getLogger(__name__)
+
+# SQS batch APIs accept at most 10 entries per call
+SQS_BATCH_MAX = 10
+
+
+class CaseConsumer:
+    """Keeps up to `concurrency` SQS messages in flight on a thread pool.
+
+    Finished messages are acknowledged with delete_message_batch; messages still being
+    processed get their visibility extended by a heartbeat thread so long-running
+    cases are not redelivered. Failed messages are left alone so the queue's redrive
+    policy moves them to the DLQ.
+    """
+
+    def __init__(
+        self,
+        sqs: Any,
+        queue_url: str,
+        handler: Callable[[Dict[str, Any]], Any],
+        concurrency: int = 8,
+        visibility_timeout: int = 60,
+        wait_seconds: int = 15,
+    ):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency))
+        self.visibility_timeout = int(visibility_timeout)
+        self.wait_seconds = int(wait_seconds)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="case")
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._acks: List[str] = []
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="sqs-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while not self._stop.is_set():
+                self.poll_once()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._stop.set()
+            heartbeat.join()
+            self.flush_acks()
+
+    def poll_once(self) -> int:
+        """Receive as many messages as there are free slots (at least one). Returns the count."""
+        # Block until one slot is free, then grab any others without waiting
+        while not self._slots.acquire(timeout=1.0):
+            if self._stop.is_set():
+                return 0
+        free = 1
+        while free < SQS_BATCH_MAX and self._slots.acquire(blocking=False):
+            free += 1
+        msgs: List[Dict[str, Any]] = []
+        try:
+            msgs = self.sqs.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=free,
+                WaitTimeSeconds=self.wait_seconds,
+                VisibilityTimeout=self.visibility_timeout,
+            ).get("Messages", [])
+        except Exception:
+            traceback.print_exc()
+            time.sleep(1.0)
+        for _ in range(free - len(msgs)):
+            self._slots.release()
+        for m in msgs:
+            with self._lock:
+                self._inflight[m["MessageId"]] = {
+                    "receipt": m["ReceiptHandle"],
+                    "deadline": time.monotonic() + self.visibility_timeout,
+                }
+            self._executor.submit(self._process, m)
+        self.flush_acks()
+        return len(msgs)
+
+    def _process(self, m: Dict[str, Any]) -> None:
+        ok = False
+        try:
+            self.handler(m)
+            ok = True
+        except Exception:
+            # Let SQS redrive to DLQ via policy
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                entry = self._inflight.pop(m["MessageId"], None)
+                if ok and entry:
+                    self._acks.append(entry["receipt"])
+                full = len(self._acks) >= SQS_BATCH_MAX
+            self._slots.release()
+        if full:
+            self.flush_acks()
+
+    def flush_acks(self) -> None:
+        while True:
+            with self._lock:
+                batch, self._acks = self._acks[:SQS_BATCH_MAX], self._acks[SQS_BATCH_MAX:]
+            if not batch:
+                return
+            entries = [{"Id": str(i), "ReceiptHandle": r} for i, r in enumerate(batch)]
+            try:
+                resp = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+                for failed in resp.get("Failed", []):
+                    log.warning("delete_message_batch failed: %s", failed.get("Message") or failed.get("Code"))
+            except Exception:
+                # Unacknowledged messages reappear after their visibility timeout
+                traceback.print_exc()
+
+    def extend_visibility(self) -> None:
+        """Extend visibility of in-flight messages whose deadline is near."""
+        now = time.monotonic()
+        horizon = now + self.visibility_timeout / 2.0
+        with self._lock:
+            due = [(mid, e) for mid, e in self._inflight.items() if e["deadline"] <= horizon]
+            for _, e in due:
+                e["deadline"] = now + self.visibility_timeout
+        for start in range(0, len(due), SQS_BATCH_MAX):
+            chunk = due[start : start + SQS_BATCH_MAX]
+            entries = [
+                {"Id": str(i), "ReceiptHandle": e["receipt"], "VisibilityTimeout": self.visibility_timeout}
+                for i, (_, e) in enumerate(chunk)
+            ]
+            try:
+                self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            except Exception:
+                traceback.print_exc()
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(1.0, self.visibility_timeout / 6.0)
+        while not self._stop.wait(interval):
+            self.extend_visibility()
+            self.flush_acks()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from common.derivatives import NORMALIZED, THUMBNAIL
+
+from .aws_clients import s3_get_object, s3_object_tags
+from .image_ops import ImageQualityReport, crop_bbox, load_gray, quality_from_gray
+
+if TYPE_CHECKING:
+    from .result_cache import ResultCache
+
+
+# Derivative kinds, cheapest first
+_KIND_ORDER = (THUMBNAIL, NORMALIZED)
+
+
+class CaseContext:
+    """Per-case artifact cache threaded through every processing stage.
+
+    Raw S3 bytes, decoded images, grayscale arrays and quality reports are memoized
+    per key, so each object is fetched and decoded at most once per case. Safe to
+    share between threads; concurrent requests for the same key wait for one load.
+    Use as a context manager so everything is released when the case finishes.
+    Grayscale arrays over a pixel cap are decoded straight from the bytes (reduced-scale
+    JPEG decode), so a stage that only needs those never holds the full-size image.
+
+    `hashes` seeds known SHA-256 digests by key (as computed by the API at upload);
+    with a `results` cache, quality reports are looked up by content hash first.
+
+    `derivatives` maps an original key to the keys of its derivatives made at ingest
+    ({"normalized": ..., "thumbnail": ...}); `derived()` picks the one to read, and
+    quality reports and crops work on the normalized image.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        case_id: str,
+        hashes: Optional[Dict[str, str]] = None,
+        results: Optional["ResultCache"] = None,
+        derivatives: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        self.bucket = bucket
+        self.case_id = case_id
+        self.results = results
+        self._hashes: Dict[str, str] = {k: v for k, v in (hashes or {}).items() if k and v}
+        self._derivatives = {k: v for k, v in (derivatives or {}).items() if k and v}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._memo: Dict[Hashable, Any] = {}
+
+    def __enter__(self) -> "CaseContext":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _get(self, memo_key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            if memo_key in self._memo:
+                return self._memo[memo_key]
+            key_lock = self._key_locks.setdefault(memo_key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if memo_key in self._memo:
+                    return self._memo[memo_key]
+            value = loader()
+            with self._lock:
+                self._memo[memo_key] = value
+            return value
+
+    def derived(self, key: str, kind: str = NORMALIZED) -> str:
+        """Key of the cheapest available version of `key` that is at least `kind`: a
+        thumbnail falls back to the normalized image, which falls back to the original."""
+        versions = self._derivatives.get(key, {})
+        for k in _KIND_ORDER[_KIND_ORDER.index(kind):]:
+            if versions.get(k):
+                return versions[k]
+        return key
+
+    def get_bytes(self, key: str) -> bytes:
+        return self._get(("bytes", key), lambda: s3_get_object(self.bucket, key))
+
+    def sha256(self, key: str) -> str:
+        """Hex SHA-256 of an object: the digest supplied by the API, else its `sha256` tag
+        (set at upload), else hashed from its bytes."""
+        known = self._hashes.get(key)
+        if known:
+            return known
+
+        def load() -> str:
+            with self._lock:
+                fetched = ("bytes", key) in self._memo
+            if not fetched:
+                # A tag lookup is cheaper than downloading the object to hash it
+                try:
+                    tagged = s3_object_tags(self.bucket, key).get("sha256")
+                except Exception:
+                    tagged = None
+                if tagged:
+                    return tagged
+            return hashlib.sha256(self.get_bytes(key)).hexdigest()
+
+        return self._get(("sha256", key), load)
+
+    def variant(self, key: str, kind: str = NORMALIZED) -> str:
+        """Result-cache key suffix for results computed on `derived(key, kind)`: empty
+        for the original, else `:<kind>` of the derivative read, so they never share a
+        key with results for the original."""
+        source = self.derived(key, kind)
+        for k, v in self._derivatives.get(key, {}).items():
+            if v == source:
+                return f":{k}"
+        return ""
+
+    def get_image(self, key: str) -> Image.Image:
+        def load() -> Image.Image:
+            img = Image.open(io.BytesIO(self.get_bytes(key)))
+            img.load()
+            return img
+
+        return self._get(("image", key), load)
+
+    def get_size(self, key: str) -> Tuple[int, int]:
+        """(width, height) of an image, read from its header unless it is already decoded."""
+
+        def load() -> Tuple[int, int]:
+            with self._lock:
+                img = self._memo.get(("image", key))
+            if img is not None:
+                return img.size
+            with Image.open(io.BytesIO(self.get_bytes(key))) as header:
+                return header.size
+
+        return self._get(("size", key), load)
+
+    def get_gray(self, key: str, max_pixels: Optional[int] = None) -> np.ndarray:
+        def load() -> np.ndarray:
+            w, h = self.get_size(key)
+            if max_pixels and w * h > max_pixels:
+                # Over the cap: decode from the bytes so a JPEG is read at reduced DCT
+                # scale instead of from a full-resolution decode
+                return load_gray(self.get_bytes(key), max_pixels)
+            return load_gray(self.get_image(key), max_pixels)
+
+        return self._get(("gray", key, max_pixels), load)
+
+    def quality(self, key: str, max_pixels: Optional[int] = None) -> ImageQualityReport:
+        source = self.derived(key, NORMALIZED)
+
+        def compute() -> ImageQualityReport:
+            return quality_from_gray(self.get_gray(source, max_pixels), self.get_size(source))
+
+        def load() -> ImageQualityReport:
+            if self.results is None:
+                return compute()
+            # Keyed by the original's digest (known without a fetch); the derivative is a
+            # function of it, but its report differs from the original's
+            value, _ = self.results.get_or_compute(
+                "quality", f"{self.sha256(key)}{self.variant(key)}:{max_pixels}", lambda: compute().to_dict()
+            )
+            return ImageQualityReport(**value)
+
+        return self._get(("quality", key, max_pixels), load)
+
+    def crop(self, key: str, bbox: Tuple[float, float, float, float]) -> bytes:
+        """JPEG crop by a relative bbox, cut from the normalized image (same geometry)."""
+        source = self.derived(key, NORMALIZED)
+        return self._get(("crop", source, tuple(bbox)), lambda: crop_bbox(self.get_image(source), bbox))
+
+    def close(self) -> None:
+        with self._lock:
+            memo = self._memo
+            self._memo = {}
+            self._key_locks = {}
+        for value in memo.values():
+            if isinstance(value, Image.Image):
+                value.close()
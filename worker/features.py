@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
-from .aws_clients import client, s3_get_object
 from .config import get_worker_settings
-from .image_ops import blur_score as _blur_score, glare_score as _glare_score
+from .context import NORMALIZED, CaseContext
 from .mrz import validate_mrz
+from .near_dup import near_dup_features
+from .templates import FALLBACK_SCORE, get_template_index
+from .velocity import velocity_features
 
 
 def build_features(
@@ -16,73 +19,99 @@ def build_features(
     tex_out: Dict[str, Any],
     face_similarity: Optional[float],
     metadata: Dict[str, Any] | None,
+    ctx: Optional[CaseContext] = None,
+    near_dups: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     settings = get_worker_settings()
-    features: Dict[str, Any] = {}
-    # Face similarity
-    features["face_similarity"] = float(face_similarity or 0.0)
-
-    # Textract confidence
-    features["textract_conf_avg"] = float(tex_out.get("avg_conf") or 0.0)
-
-    # MRZ validity if present
-    mrz_lines = tex_out.get("mrz_lines", [])
-    mrz_ok, mrz_parsed = validate_mrz(mrz_lines)
-    features["mrz_valid"] = bool(mrz_ok)
-
-    # Expiry validity from fields
-    expiry_valid = None
-    expiry = _parse_date(tex_out.get("fields", {}).get("date_of_expiry") or tex_out.get("fields", {}).get("expiry_date"))
-    if expiry:
-        expiry_valid = expiry > datetime.now(timezone.utc)
-    features["expiry_valid"] = bool(expiry_valid) if expiry_valid is not None else False
-
-    # Image quality
-    blur = 0.0
-    glare = 0.0
-    if s3_keys.get("front"):
-        img = s3_get_object(bucket, s3_keys["front"])  # bytes
-        blur = _blur_score(img)
-        glare = _glare_score(img)
-    features["blur_score"] = float(1.0 - min(1.0, blur))  # higher worse
-    features["glare_score"] = float(min(1.0, glare))
-
-    # Template geometry score (placeholder) - assume mid if no template
-    features["template_geom_score"] = 0.5
-
-    # Velocity and device/ip risk
-    device_hash = (metadata or {}).get("device_hash")
-    ip = (metadata or {}).get("ip")
-    features["device_hash_dup"], features["velocity_count_24h"] = device_velocity_count(device_hash)
-    features["ip_risk_score"] = 1.0 if ip and ip in settings.risky_ips else 0.0
-
-    # Basic field consistency checks (name capitalization, DOB format)
-    fields = tex_out.get("fields", {})
-    features["field_consistency_flags"] = int(_field_inconsistency_flags(fields))
-
-    return features
-
-
-def device_velocity_count(device_hash: Optional[str]) -> tuple[bool, int]:
-    if not device_hash:
-        return False, 0
-    settings = get_worker_settings()
-    dynamo = client("dynamodb")
-    now = int(datetime.now(timezone.utc).timestamp())
-    since = now - 24 * 3600
-    try:
-        resp = dynamo.query(
-            TableName=settings.dynamo_events_table,
-            IndexName="gsi_device",
-            KeyConditionExpression="#dh = :dh AND #ts >= :since",
-            ExpressionAttributeNames={"#dh": "device_hash", "#ts": "ts"},
-            ExpressionAttributeValues={":dh": {"S": device_hash}, ":since": {"N": str(since)}},
-            Select="COUNT",
+    # A context made here is closed on the way out; a caller's is left to the caller
+    with nullcontext(ctx) if ctx is not None else CaseContext(bucket, case_id) as ctx:
+        features: Dict[str, Any] = {}
+        # Face similarity
+        features["face_similarity"] = float(face_similarity or 0.0)
+
+        # Textract confidence
+        features["textract_conf_avg"] = float(tex_out.get("avg_conf") or 0.0)
+
+        # MRZ validity if present
+        mrz_lines = tex_out.get("mrz_lines", [])
+        mrz_ok, mrz_parsed = validate_mrz(mrz_lines)
+        features["mrz_valid"] = bool(mrz_ok)
+
+        # Expiry validity from fields
+        expiry_valid = None
+        expiry = _parse_date(tex_out.get("fields", {}).get("date_of_expiry") or tex_out.get("fields", {}).get("expiry_date"))
+        if expiry:
+            expiry_valid = expiry > datetime.now(timezone.utc)
+        features["expiry_valid"] = bool(expiry_valid) if expiry_valid is not None else False
+
+        # Image quality
+        blur = 0.0
+        glare = 0.0
+        exposure = 0.0
+        contrast = 0.0
+        if s3_keys.get("front"):
+            report = ctx.quality(s3_keys["front"], max_pixels=settings.image_max_pixels)
+            blur = report.blur
+            glare = report.glare
+            exposure = report.exposure
+            contrast = report.contrast
+        features["blur_score"] = float(1.0 - min(1.0, blur))  # higher worse
+        features["glare_score"] = float(min(1.0, glare))
+        features["exposure_score"] = float(exposure)
+        features["contrast_score"] = float(contrast)
+
+        # Same front image bytes already submitted under another case
+        features["doc_exact_dup"] = bool(s3_keys.get("front")) and exact_duplicate(ctx, s3_keys["front"])
+
+        # Front/selfie images within a small perceptual-hash distance of another case's
+        # (looked up by the near_dup stage when run from the processor)
+        features.update(near_dups if near_dups is not None else near_dup_features(ctx, s3_keys))
+
+        # Template geometry: layout distance to the closest known document template (higher worse)
+        features["template_geom_score"] = (
+            template_geom_score(ctx, s3_keys["front"], settings.image_max_pixels) if s3_keys.get("front") else FALLBACK_SCORE
         )
-        count = int(resp.get("Count", 0))
-        return (count > 3), count
+
+        # Velocity and device/ip risk
+        ip = (metadata or {}).get("ip")
+        features.update(velocity_features(metadata))
+        features["ip_risk_score"] = 1.0 if ip and ip in settings.risky_ips else 0.0
+
+        # Basic field consistency checks (name capitalization, DOB format)
+        fields = tex_out.get("fields", {})
+        features["field_consistency_flags"] = int(_field_inconsistency_flags(fields))
+
+        return features
+
+
+def exact_duplicate(ctx: CaseContext, key: str) -> bool:
+    """True when an identical image (by SHA-256) was first seen in a different case."""
+    if ctx.results is None:
+        return False
+    try:
+        first_case = ctx.results.first_seen("first_case", ctx.sha256(key), ctx.case_id)
+    except Exception:
+        return False
+    return first_case != ctx.case_id
+
+
+def template_geom_score(ctx: CaseContext, key: str, max_pixels: Optional[int] = None) -> float:
+    """Mismatch (0..1) between the image's layout and the template index; FALLBACK_SCORE
+    without an index. Cached by image digest and index digest, so a rebuilt index rescores."""
+    index = get_template_index()
+    if index is None:
+        return FALLBACK_SCORE
+
+    def compute() -> float:
+        return index.match(ctx.get_gray(ctx.derived(key, NORMALIZED), max_pixels)).score
+
+    try:
+        if ctx.results is None:
+            return compute()
+        value, _ = ctx.results.get_or_compute("template", f"{ctx.sha256(key)}:{index.digest}:{max_pixels}", compute)
+        return float(value)
     except Exception:
-        return False, 0
+        return FALLBACK_SCORE
 
 
 def _parse_date(value: Optional[str]) -> Optional[datetime]:
@@ -1,28 +1,128 @@
 from __future__ import annotations
 
 import io
-from typing import Tuple
+import math
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple, Union
 
 import numpy as np
 from PIL import Image
 
 
+# Default cap on the number of pixels the quality engine works on. A 12 MP phone
+# photo is reduced to ~4 MP before any per-pixel math runs.
+DEFAULT_MAX_PIXELS = 4_000_000
+
+LAPLACIAN_KERNEL = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype=np.float32)
+
+# Perceptual hash: DCT of a 32x32 downscale, low 8x8 frequencies -> 64 bits
+PHASH_SIZE = 32
+PHASH_BITS = 64
+_PHASH_LOW = 8
+_n = np.arange(PHASH_SIZE)
+# Orthonormal DCT-II basis, rows = frequencies; only the low ones are ever used
+_DCT = (np.sqrt(2.0 / PHASH_SIZE) * np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:_PHASH_LOW, None] / (2 * PHASH_SIZE))).astype(np.float32)
+_DCT[0] /= np.sqrt(2.0)
+
+ImageInput = Union[bytes, Image.Image]
+
+
+@dataclass(frozen=True)
+class ImageQualityReport:
+    """Image quality signals computed from a single decode of the image.
+
+    blur: variance of Laplacian mapped to 0..1 (higher is sharper, same scale as blur_score)
+    glare: fraction of near-white pixels 0..1 (higher is worse)
+    exposure: mean luminance 0..1
+    contrast: RMS contrast (std of luminance) 0..1
+    """
+
+    blur: float
+    glare: float
+    exposure: float
+    contrast: float
+    width: int
+    height: int
+    working_width: int
+    working_height: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
 def _to_gray(img: Image.Image) -> np.ndarray:
     return np.array(img.convert("L"), dtype=np.float32)
 
 
+def _open(image: ImageInput) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image
+    return Image.open(io.BytesIO(image))
+
+
+def load_gray(image: ImageInput, max_pixels: Optional[int] = None) -> np.ndarray:
+    """Decode to a float32 grayscale array, downscaling so it has at most max_pixels.
+    JPEGs are decoded directly at reduced scale (DCT draft mode) when possible.
+    """
+    owned = not isinstance(image, Image.Image)
+    img = _open(image)
+    w, h = img.size
+    if not max_pixels or w * h <= max_pixels:
+        return _to_gray(img)
+    scale = math.sqrt(max_pixels / float(w * h))
+    target = (max(1, int(w * scale)), max(1, int(h * scale)))
+    if owned and img.format == "JPEG":
+        # Only draft images we opened ourselves; draft mutates the decoder state
+        img.draft("L", target)
+    img = img.convert("L")
+    factor = max(math.ceil(img.width / target[0]), math.ceil(img.height / target[1]))
+    if factor > 1:
+        img = img.reduce(factor)
+    return np.asarray(img, dtype=np.float32)
+
+
+def _blur_from_gray(gray: np.ndarray) -> float:
+    lap = _convolve2d(gray, LAPLACIAN_KERNEL)
+    var = float(np.var(lap))
+    # Normalize: 0..1000 -> 0..1 (clamped)
+    return float(max(0.0, min(1.0, var / 1000.0)))
+
+
+def _glare_from_gray(gray: np.ndarray) -> float:
+    return float(np.count_nonzero(gray >= 250)) / float(gray.size)
+
+
+def quality_report(image: ImageInput, max_pixels: Optional[int] = DEFAULT_MAX_PIXELS) -> ImageQualityReport:
+    """Decode the image once and compute blur, glare, exposure and contrast together.
+    Work is bounded by max_pixels (None for full resolution).
+    """
+    img = _open(image)
+    return quality_from_gray(load_gray(image, max_pixels), img.size)
+
+
+def quality_from_gray(gray: np.ndarray, size: Tuple[int, int]) -> ImageQualityReport:
+    """Build the quality report from an already decoded grayscale working array.
+    size is the (width, height) of the original image.
+    """
+    width, height = size
+    return ImageQualityReport(
+        blur=_blur_from_gray(gray),
+        glare=_glare_from_gray(gray),
+        exposure=float(gray.mean()) / 255.0,
+        contrast=float(gray.std()) / 255.0,
+        width=int(width),
+        height=int(height),
+        working_width=int(gray.shape[1]),
+        working_height=int(gray.shape[0]),
+    )
+
+
 def blur_score(image_bytes: bytes) -> float:
     """Compute a simple blur score using variance of Laplacian. Higher is sharper.
     Returns normalized value 0..1 by mapping typical range [0, 1000] to [0,1].
     """
     img = Image.open(io.BytesIO(image_bytes))
-    gray = _to_gray(img)
-    # Laplacian kernel
-    kernel = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype=np.float32)
-    lap = _convolve2d(gray, kernel)
-    var = float(np.var(lap))
-    # Normalize: 0..1000 -> 0..1 (clamped)
-    return float(max(0.0, min(1.0, var / 1000.0)))
+    return _blur_from_gray(_to_gray(img))
 
 
 def glare_score(image_bytes: bytes) -> float:
@@ -30,15 +130,33 @@ def glare_score(image_bytes: bytes) -> float:
     Return 0..1 where higher is worse glare.
     """
     img = Image.open(io.BytesIO(image_bytes))
-    gray = _to_gray(img)
-    total = gray.size
-    bright = np.sum(gray >= 250)
-    return float(bright) / float(total)
+    return _glare_from_gray(_to_gray(img))
 
 
-def crop_bbox(image_bytes: bytes, bbox: Tuple[float, float, float, float]) -> bytes:
-    """Crop image by bbox normalized (Left, Top, Width, Height) in [0,1]."""
-    img = Image.open(io.BytesIO(image_bytes))
+def perceptual_hash(image: Union[ImageInput, np.ndarray]) -> int:
+    """64-bit DCT perceptual hash (pHash) of an image or a grayscale array.
+
+    Re-encoding, resizing, mild crops, brightness/contrast changes and small edits move
+    only a few bits, so near-duplicates are images within a small Hamming distance.
+    """
+    if isinstance(image, np.ndarray):
+        img = Image.fromarray(np.asarray(image, dtype=np.float32), mode="F")
+    else:
+        img = _open(image).convert("F")
+    small = np.asarray(img.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BOX), dtype=np.float32)
+    low = (_DCT @ small @ _DCT.T).ravel()
+    # The DC term is the mean brightness; it is left out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def crop_bbox(image: ImageInput, bbox: Tuple[float, float, float, float]) -> bytes:
+    """Crop image (bytes or decoded image) by bbox normalized (Left, Top, Width, Height) in [0,1]."""
+    img = _open(image)
     w, h = img.size
     L, T, W, H = bbox
     left = int(L * w)
@@ -52,15 +170,17 @@ def crop_bbox(image_bytes: bytes, bbox: Tuple[float, float, float, float]) -> by
 
 
 def _convolve2d(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Same-size 2D correlation with reflect padding, as a sum of shifted views."""
     kh, kw = kernel.shape
     ih, iw = img.shape
     pad_h = kh // 2
     pad_w = kw // 2
     padded = np.pad(img, ((pad_h, pad_h), (pad_w, pad_w)), mode="reflect")
     out = np.zeros_like(img)
-    for i in range(ih):
-        for j in range(iw):
-            region = padded[i : i + kh, j : j + kw]
-            out[i, j] = np.sum(region * kernel)
+    for dy in range(kh):
+        for dx in range(kw):
+            k = kernel[dy, dx]
+            if k == 0:
+                continue
+            out += k * padded[dy : dy + ih, dx : dx + iw]
     return out
-
@@ -1,39 +1,43 @@
 from __future__ import annotations
 
 import json
-import os
-import time
-import traceback
+import logging
+import signal
+from typing import Any, Dict
 
 from .aws_clients import client
 from .config import get_worker_settings
+from .consumer import CaseConsumer
+from .metrics import get_metrics
+from .persistence import get_artifact_uploader
 from .processor import process_case
+from .tracing import serve_metrics
+
+
+def handle_message(m: Dict[str, Any]):
+    return process_case(json.loads(m["Body"]))
 
 
 def main():
     settings = get_worker_settings()
-    sqs = client("sqs")
-    while True:
-        msgs = sqs.receive_message(
-            QueueUrl=settings.sqs_queue_url,
-            MaxNumberOfMessages=5,
-            WaitTimeSeconds=15,
-            VisibilityTimeout=60,
-        ).get("Messages", [])
-        if not msgs:
-            continue
-        for m in msgs:
-            receipt = m["ReceiptHandle"]
-            try:
-                body = json.loads(m["Body"])
-                process_case(body)
-                sqs.delete_message(QueueUrl=settings.sqs_queue_url, ReceiptHandle=receipt)
-            except Exception:
-                # Let SQS redrive to DLQ via policy
-                traceback.print_exc()
-                continue
+    logging.basicConfig(level=settings.log_level)
+    if settings.metrics_port:
+        serve_metrics(settings.metrics_port)
+    consumer = CaseConsumer(
+        client("sqs"),
+        settings.sqs_queue_url,
+        handle_message,
+        concurrency=settings.worker_concurrency,
+        visibility_timeout=settings.sqs_visibility_timeout,
+        wait_seconds=settings.sqs_wait_seconds,
+    )
+    # ECS sends SIGTERM on scale-in/deploy: stop receiving and drain in-flight cases
+    signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+    consumer.run()
+    # Finish queued artifact uploads and flush buffered metrics before the task exits
+    get_artifact_uploader().shutdown(timeout=settings.sqs_visibility_timeout)
+    get_metrics().shutdown()
 
 
 if __name__ == "__main__":
     main()
-
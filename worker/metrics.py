@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import atexit
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+from .config import get_worker_settings
+
+
+NAMESPACE = "FraudDetection"
+# CloudWatch limits: metric data per PutMetricData call and distinct values per datum;
+# EMF allows up to 100 values per metric per log line
+CW_MAX_DATA = 1000
+CW_MAX_VALUES = 150
+EMF_MAX_VALUES = 100
+
+Dims = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, str, Dims]
+
+
+def _dims(dimensions: Optional[Dict[str, str]]) -> Dims:
+    return tuple(sorted((str(k), str(v)) for k, v in (dimensions or {}).items()))
+
+
+class MetricsAggregator:
+    """Buffers counters, gauges and latency histograms in process and flushes them in
+    batches from a background thread, so recording a metric never does network I/O.
+
+    mode: "cloudwatch" (batched PutMetricData), "emf" (CloudWatch embedded metric
+    format log lines on stdout) or "off". Histogram samples are kept as value -> count
+    (rounded to `precision` decimals) so memory is bounded by distinct values.
+    """
+
+    def __init__(
+        self,
+        mode: str = "cloudwatch",
+        namespace: str = NAMESPACE,
+        flush_interval: float = 60.0,
+        precision: int = 1,
+        stream: Optional[IO[str]] = None,
+    ):
+        self.mode = mode
+        self.namespace = namespace
+        self.flush_interval = flush_interval
+        self.precision = precision
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Counter] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def incr(self, name: str, value: float = 1.0, unit: str = "Count", dimensions: Optional[Dict[str, str]] = None) -> None:
+        key = (name, unit, _dims(dimensions))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        self._ensure_started()
+
+    def gauge(self, name: str, value: float, unit: str = "None", dimensions: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._gauges[(name, unit, _dims(dimensions))] = float(value)
+        self._ensure_started()
+
+    def observe(self, name: str, value: float, unit: str = "Milliseconds", dimensions: Optional[Dict[str, str]] = None) -> None:
+        key = (name, unit, _dims(dimensions))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Counter()
+            hist[round(float(value), self.precision)] += 1
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and self.mode != "off" and not self._stop.is_set():
+            self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self) -> None:
+        """Stop the background thread and flush whatever is buffered."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _drain(self):
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+            histograms, self._histograms = self._histograms, {}
+        return counters, gauges, histograms
+
+    def flush(self) -> None:
+        counters, gauges, histograms = self._drain()
+        if self.mode == "off" or not (counters or gauges or histograms):
+            return
+        try:
+            if self.mode == "emf":
+                self._flush_emf(counters, gauges, histograms)
+            else:
+                self._flush_cloudwatch(counters, gauges, histograms)
+        except Exception:
+            traceback.print_exc()
+
+    def _flush_cloudwatch(self, counters, gauges, histograms) -> None:
+        from .aws_clients import client
+
+        now = datetime.now(timezone.utc)
+        data: List[Dict[str, Any]] = []
+
+        def datum(name: str, unit: str, dims: Dims, **values: Any) -> Dict[str, Any]:
+            d = {"MetricName": name, "Unit": unit, "Timestamp": now, **values}
+            if dims:
+                d["Dimensions"] = [{"Name": k, "Value": v} for k, v in dims]
+            return d
+
+        for (name, unit, dims), value in list(counters.items()) + list(gauges.items()):
+            data.append(datum(name, unit, dims, Value=value))
+        for (name, unit, dims), hist in histograms.items():
+            items = sorted(hist.items())
+            for i in range(0, len(items), CW_MAX_VALUES):
+                chunk = items[i : i + CW_MAX_VALUES]
+                data.append(datum(name, unit, dims, Values=[v for v, _ in chunk], Counts=[float(c) for _, c in chunk]))
+        cw = client("cloudwatch")
+        for i in range(0, len(data), CW_MAX_DATA):
+            cw.put_metric_data(Namespace=self.namespace, MetricData=data[i : i + CW_MAX_DATA])
+
+    def _flush_emf(self, counters, gauges, histograms) -> None:
+        out = self.stream or sys.stdout
+        by_dims: Dict[Dims, List[Tuple[str, str, Any]]] = {}
+        for (name, unit, dims), value in list(counters.items()) + list(gauges.items()):
+            by_dims.setdefault(dims, []).append((name, unit, value))
+        for (name, unit, dims), hist in histograms.items():
+            samples = [v for v, c in sorted(hist.items()) for _ in range(c)]
+            for i in range(0, len(samples), EMF_MAX_VALUES):
+                by_dims.setdefault(dims, []).append((name, unit, samples[i : i + EMF_MAX_VALUES]))
+        ts = int(time.time() * 1000)
+        lines = []
+        for dims, metrics in by_dims.items():
+            # A metric name may appear only once per EMF document
+            while metrics:
+                doc: Dict[str, Any] = dict(dims)
+                definitions = []
+                rest = []
+                for name, unit, value in metrics:
+                    if name in doc:
+                        rest.append((name, unit, value))
+                        continue
+                    doc[name] = value
+                    definitions.append({"Name": name, "Unit": unit})
+                doc["_aws"] = {
+                    "Timestamp": ts,
+                    "CloudWatchMetrics": [{"Namespace": self.namespace, "Dimensions": [[k for k, _ in dims]], "Metrics": definitions}],
+                }
+                lines.append(json.dumps(doc))
+                metrics = rest
+        out.write("\n".join(lines) + "\n")
+        out.flush()
+
+
+_metrics: Optional[MetricsAggregator] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsAggregator:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                settings = get_worker_settings()
+                _metrics = MetricsAggregator(mode=settings.metrics_mode, flush_interval=settings.metrics_flush_interval)
+    return _metrics
@@ -1,73 +1,363 @@
 from __future__ import annotations
 
+import itertools
 import re
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 
 WEIGHTS = [7, 3, 1]
+FILLER = "<"
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ" + FILLER
+
+# Character values for the ICAO 9303 check digit: 0-9, A=10..Z=35, filler=0
+_VALUES: Dict[str, int] = {c: (0 if c == FILLER else i) for i, c in enumerate(ALPHABET)}
+# Same table indexed by byte, -1 for characters that cannot appear in an MRZ
+_VALUE_TABLE = np.full(256, -1, dtype=np.int16)
+for _c, _v in _VALUES.items():
+    _VALUE_TABLE[ord(_c)] = _v
+_WEIGHT_CYCLE = tuple(WEIGHTS[i % 3] for i in range(96))
 
+# Usual OCR confusions: letters read where only digits may appear and vice versa
+_TO_DIGIT = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "G": "6", "B": "8"}
+_TO_LETTER = {"0": "O", "1": "I", "2": "Z", "5": "S", "6": "G", "8": "B"}
+# In alphanumeric fields either reading is possible; the check digits decide. G/6
+# is left out: G=16 and 6 weigh the same mod 10, so no check digit can tell them apart
+_AMBIGUOUS = {"O": "0", "0": "O", "I": "1", "1": "I", "S": "5", "5": "S", "B": "8", "8": "B", "Z": "2", "2": "Z"}
 
-def _char_value(c: str) -> int:
-    if c.isdigit():
-        return int(c)
-    if c == '<':
-        return 0
-    return ord(c.upper()) - 55  # A=10
+DIGIT, ALPHA, ALNUM, SEX = "digit", "alpha", "alnum", "sex"
 
 
 def _check_digit(field: str) -> int:
-    total = 0
-    for i, ch in enumerate(field):
-        total += _char_value(ch) * WEIGHTS[i % 3]
-    return total % 10
+    return sum(_VALUES[c] * w for c, w in zip(field, _WEIGHT_CYCLE)) % 10
+
+
+@dataclass(frozen=True)
+class _Check:
+    name: str
+    spans: Tuple[Tuple[int, int], ...]  # (start, end) offsets into the joined lines
+    digit: int
+    filler_ok: bool = False  # a filler check digit is allowed when the field is empty
+
+
+@dataclass(frozen=True)
+class _Layout:
+    name: str
+    lines: int
+    width: int
+    fields: Dict[str, Tuple[int, int, str]]  # name -> (start, end, kind), joined offsets
+    checks: Tuple[_Check, ...]
+    first: str = ""  # required first character (MRV vs TD2/TD3 of the same shape)
+
+    @property
+    def length(self) -> int:
+        return self.lines * self.width
+
+    def kinds(self) -> List[str]:
+        out = [ALNUM] * self.length
+        for start, end, kind in self.fields.values():
+            for i in range(start, end):
+                out[i] = kind
+        for check in self.checks:
+            out[check.digit] = DIGIT
+        return out
+
+
+def _two_line(name: str, width: int, optional_end: int, composite: bool, personal_check: bool, first: str = "") -> _Layout:
+    """TD2, TD3 and MRV share the second-line layout up to the optional data."""
+    w = width
+    fields = {
+        "document_code": (0, 2, ALPHA),
+        "issuing_state": (2, 5, ALPHA),
+        "name": (5, w, ALPHA),
+        "document_number": (w, w + 9, ALNUM),
+        "nationality": (w + 10, w + 13, ALPHA),
+        "birth_date": (w + 13, w + 19, DIGIT),
+        "sex": (w + 20, w + 21, SEX),
+        "expiry_date": (w + 21, w + 27, DIGIT),
+        "optional_data": (w + 28, w + optional_end, ALNUM),
+    }
+    checks = [
+        _Check("document_number", ((w, w + 9),), w + 9),
+        _Check("birth_date", ((w + 13, w + 19),), w + 19),
+        _Check("expiry_date", ((w + 21, w + 27),), w + 27),
+    ]
+    if personal_check:
+        checks.append(_Check("optional_data", ((w + 28, w + optional_end),), w + optional_end, filler_ok=True))
+    if composite:
+        checks.append(_Check("composite", ((w, w + 10), (w + 13, w + 20), (w + 21, 2 * w - 1)), 2 * w - 1))
+    return _Layout(name, 2, width, fields, tuple(checks), first)
+
+
+TD1 = _Layout(
+    "TD1",
+    3,
+    30,
+    {
+        "document_code": (0, 2, ALPHA),
+        "issuing_state": (2, 5, ALPHA),
+        "document_number": (5, 14, ALNUM),
+        "optional_data": (15, 30, ALNUM),
+        "birth_date": (30, 36, DIGIT),
+        "sex": (37, 38, SEX),
+        "expiry_date": (38, 44, DIGIT),
+        "nationality": (45, 48, ALPHA),
+        "optional_data_2": (48, 59, ALNUM),
+        "name": (60, 90, ALPHA),
+    },
+    (
+        _Check("document_number", ((5, 14),), 14),
+        _Check("birth_date", ((30, 36),), 36),
+        _Check("expiry_date", ((38, 44),), 44),
+        _Check("composite", ((5, 30), (30, 37), (38, 45), (48, 59)), 59),
+    ),
+)
+TD2 = _two_line("TD2", 36, 35, composite=True, personal_check=False)
+TD3 = _two_line("TD3", 44, 42, composite=True, personal_check=True)
+MRVA = _two_line("MRVA", 44, 44, composite=False, personal_check=False, first="V")
+MRVB = _two_line("MRVB", 36, 36, composite=False, personal_check=False, first="V")
+# Most specific first: MRV layouts are only chosen for visas (first character V)
+LAYOUTS = (TD1, MRVA, MRVB, TD3, TD2)
+_KINDS = {layout.name: layout.kinds() for layout in LAYOUTS}
+
+
+@dataclass
+class MRZResult:
+    valid: bool
+    format: Optional[str] = None
+    fields: Dict[str, str] = field(default_factory=dict)
+    checks: Dict[str, bool] = field(default_factory=dict)
+    # (offset into the joined lines, read, corrected)
+    corrections: List[Tuple[int, str, str]] = field(default_factory=list)
+    text: str = ""
+
+
+def _normalize(lines: Sequence[str]) -> List[str]:
+    lns = [re.sub(r"\s", "", l).upper().replace("«", FILLER) for l in lines if l]
+    return [l for l in lns if len(l) >= 20]
+
+
+def _fit(line: str, width: int) -> Optional[str]:
+    """OCR often drops or adds trailing fillers; tolerate a few of them."""
+    if len(line) == width:
+        return line
+    if width - 3 <= len(line) < width:
+        return line + FILLER * (width - len(line))
+    if width < len(line) <= width + 3 and set(line[width:]) == {FILLER}:
+        return line[:width]
+    return None
+
+
+def _match_layout(lines: List[str]) -> Optional[Tuple[_Layout, str]]:
+    if len(lines) == 1:
+        # Lines joined by the OCR engine
+        line = lines[0]
+        for layout in LAYOUTS:
+            if len(line) == layout.length:
+                lines = [line[i : i + layout.width] for i in range(0, layout.length, layout.width)]
+                break
+    for layout in LAYOUTS:
+        if len(lines) != layout.lines:
+            continue
+        fitted = [_fit(l, layout.width) for l in lines]
+        if any(f is None for f in fitted):
+            continue
+        text = "".join(fitted)
+        if layout.first and not text.startswith(layout.first):
+            continue
+        return layout, text
+    return None
+
+
+def _long_td1_number(chars: List[str]) -> bool:
+    # TD1 document numbers longer than 9 characters continue in the optional data,
+    # ending with their check digit; position 15 then holds a filler
+    return chars[14] == FILLER and chars[15] != FILLER
+
+
+def _run_checks(layout: _Layout, chars: List[str]) -> Dict[str, bool]:
+    out = {}
+    for check in layout.checks:
+        if layout is TD1 and check.name == "document_number" and _long_td1_number(chars):
+            ext = "".join(chars[15:30]).rstrip(FILLER)
+            out[check.name] = ext[-1].isdigit() and _check_digit("".join(chars[5:14]) + ext[:-1]) == int(ext[-1])
+            continue
+        digit = chars[check.digit]
+        data = "".join(c for s, e in check.spans for c in chars[s:e])
+        if digit == FILLER:
+            out[check.name] = check.filler_ok and set(data) <= {FILLER}
+        else:
+            out[check.name] = digit.isdigit() and _check_digit(data) == int(digit)
+    return out
+
+
+def _coerce(layout: _Layout, chars: List[str]) -> List[Tuple[int, str, str]]:
+    """Fix characters that are impossible for their position (a letter in a date, a
+    digit in a country code); these need no check digit to decide."""
+    fixes = []
+    for i, kind in enumerate(_KINDS[layout.name]):
+        c = chars[i]
+        if kind == DIGIT and c in _TO_DIGIT:
+            new = _TO_DIGIT[c]
+        elif kind == ALPHA and c in _TO_LETTER:
+            new = _TO_LETTER[c]
+        else:
+            continue
+        chars[i] = new
+        fixes.append((i, c, new))
+    return fixes
+
+
+def _search(layout: _Layout, chars: List[str], checks: Dict[str, bool], max_candidates: int) -> List[Tuple[int, str, str]]:
+    """Try flipping ambiguous characters (O/0, I/1, S/5, ...) in the alphanumeric
+    fields covered by failing checks, fewest flips first, until every check passes.
+
+    A correction is only taken if it is the single passing combination of its size;
+    when two readings both satisfy the check digits the MRZ stays invalid. At most
+    `max_candidates` combinations are evaluated.
+    """
+    kinds = _KINDS[layout.name]
+    positions = sorted({
+        i
+        for check in layout.checks
+        if not checks[check.name]
+        for s, e in check.spans
+        for i in range(s, e)
+        if kinds[i] == ALNUM and chars[i] in _AMBIGUOUS
+    })
+    tried = 0
+    for k in range(1, len(positions) + 1):
+        passing = []
+        for combo in itertools.combinations(positions, k):
+            if tried >= max_candidates:
+                return []
+            tried += 1
+            trial = list(chars)
+            for i in combo:
+                trial[i] = _AMBIGUOUS[trial[i]]
+            if all(_run_checks(layout, trial).values()):
+                passing.append(trial)
+                if len(passing) > 1:
+                    return []
+        if passing:
+            fixes = [(i, a, b) for i, (a, b) in enumerate(zip(chars, passing[0])) if a != b]
+            chars[:] = passing[0]
+            return fixes
+    return []
+
+
+def _name(raw: str) -> Tuple[str, str]:
+    surname, _, given = raw.strip(FILLER).partition(FILLER * 2)
+    return surname.replace(FILLER, " ").strip(), given.replace(FILLER, " ").strip()
+
+
+def _fields(layout: _Layout, chars: List[str]) -> Dict[str, str]:
+    out = {}
+    for name, (s, e, _) in layout.fields.items():
+        value = "".join(chars[s:e])
+        if name == "name":
+            out["surname"], out["given_names"] = _name(value)
+        else:
+            out[name] = value.rstrip(FILLER) if name.startswith("optional") else value.replace(FILLER, "")
+    if layout is TD1 and _long_td1_number(chars):
+        out["document_number"] += out["optional_data"][:-1]
+        out["optional_data"] = ""
+    return out
+
+
+def parse_mrz(lines: Sequence[str], correct: bool = True, max_candidates: int = 256) -> MRZResult:
+    """Parse and check a TD1, TD2, TD3 or MRV (A/B) machine readable zone.
+
+    With `correct`, characters impossible for their field are mapped to their usual
+    look-alike, then a bounded search over ambiguous characters uses the check
+    digits to settle the rest. Corrections made are listed on the result.
+    """
+    matched = _match_layout(_normalize(lines or []))
+    if matched is None:
+        return MRZResult(valid=False)
+    layout, text = matched
+    chars = list(text)
+    corrections: List[Tuple[int, str, str]] = []
+    if any(c not in _VALUES for c in chars):
+        if not correct:
+            return MRZResult(valid=False, format=layout.name, text=text)
+        for i, c in enumerate(chars):
+            if c not in _VALUES:
+                chars[i] = FILLER
+                corrections.append((i, c, FILLER))
+    if correct:
+        corrections += _coerce(layout, chars)
+    checks = _run_checks(layout, chars)
+    if correct and not all(checks.values()):
+        found = _search(layout, chars, checks, max_candidates)
+        if found:
+            corrections += found
+            checks = _run_checks(layout, chars)
+    return MRZResult(
+        valid=all(checks.values()),
+        format=layout.name,
+        fields=_fields(layout, chars),
+        checks=checks,
+        corrections=corrections,
+        text="".join(chars),
+    )
 
 
 def validate_mrz(lines: list[str]) -> Tuple[bool, dict]:
-    """Validate MRZ checksum for TD1/TD3 formats when possible.
+    """Validate MRZ check digits (TD1, TD2, TD3, MRV) with OCR correction.
     Returns (valid, parsed_fields)
     """
-    parsed: dict = {}
-    if not lines:
-        return False, parsed
-    # Normalize
-    lns = [re.sub(r"\s", "", l) for l in lines if l and len(l) >= 30]
-    if len(lns) == 2 and len(lns[0]) in (44,) and len(lns[1]) in (44,):
-        # TD3 passport
-        l1, l2 = lns
-        passport_num = l2[0:9]
-        cd1 = l2[9]
-        dob = l2[13:19]
-        cd2 = l2[19]
-        expiry = l2[21:27]
-        cd3 = l2[27]
-        composite = passport_num + cd1 + dob + cd2 + expiry + cd3 + l2[28:43]
-        comp_cd = l2[43]
-        ok = (
-            str(_check_digit(passport_num)) == cd1
-            and str(_check_digit(dob)) == cd2
-            and str(_check_digit(expiry)) == cd3
-            and str(_check_digit(composite)) == comp_cd
-        )
-        parsed.update({"passport_number": passport_num.replace('<', ''), "dob": dob, "expiry": expiry})
-        return ok, parsed
-    if len(lns) == 3 and len(lns[0]) in (30,) and len(lns[1]) in (30,) and len(lns[2]) in (30,):
-        # TD1 ID card
-        l1, l2, l3 = lns
-        doc_num = l1[5:14]
-        cd1 = l1[14]
-        dob = l2[0:6]
-        cd2 = l2[6]
-        expiry = l2[8:14]
-        cd3 = l2[14]
-        composite = doc_num + cd1 + dob + cd2 + expiry + cd3 + l1[15:30] + l2[15:30]
-        comp_cd = l3[29]
-        ok = (
-            str(_check_digit(doc_num)) == cd1
-            and str(_check_digit(dob)) == cd2
-            and str(_check_digit(expiry)) == cd3
-            and str(_check_digit(composite)) == comp_cd
-        )
-        parsed.update({"id_number": doc_num.replace('<', ''), "dob": dob, "expiry": expiry})
-        return ok, parsed
-    return False, parsed
+    result = parse_mrz(lines)
+    if result.format is None:
+        return False, {}
+    f = result.fields
+    parsed = {
+        **f,
+        "format": result.format,
+        "dob": f.get("birth_date", ""),
+        "expiry": f.get("expiry_date", ""),
+        "corrections": len(result.corrections),
+    }
+    if result.format == "TD1":
+        parsed["id_number"] = f.get("document_number", "")
+    else:
+        parsed["passport_number"] = f.get("document_number", "")
+    return result.valid, parsed
+
 
+def validate_mrz_bulk(mrzs: Sequence[Optional[str]]) -> np.ndarray:
+    """Strict check-digit validation of many MRZs at once (e.g. re-checking stored
+    cases). Each entry is one MRZ with its lines joined (newlines/whitespace are
+    ignored). Returns a boolean array; no OCR correction is attempted."""
+    texts = [re.sub(r"\s", "", m or "").upper() for m in mrzs]
+    out = np.zeros(len(texts), dtype=bool)
+    for length in sorted({layout.length for layout in LAYOUTS}):
+        idx = np.array([i for i, t in enumerate(texts) if len(t) == length], dtype=np.intp)
+        if not idx.size:
+            continue
+        raw = np.frombuffer("".join(texts[i] for i in idx).encode("latin-1", "replace"), dtype=np.uint8).reshape(-1, length)
+        vals = _VALUE_TABLE[raw]
+        ok = (vals >= 0).all(axis=1)
+        assigned = np.zeros(len(idx), dtype=bool)
+        for layout in (l for l in LAYOUTS if l.length == length):
+            rows = ~assigned if not layout.first else ~assigned & (raw[:, 0] == ord(layout.first))
+            assigned |= rows
+            layout_ok = ok.copy()
+            for check in layout.checks:
+                cols = np.concatenate([np.arange(s, e) for s, e in check.spans])
+                weights = np.array(_WEIGHT_CYCLE[: cols.size], dtype=np.int32)
+                expected = (vals[:, cols].astype(np.int32) @ weights) % 10
+                digit = raw[:, check.digit]
+                is_digit = (digit >= ord("0")) & (digit <= ord("9"))
+                passed = is_digit & (digit.astype(np.int32) - ord("0") == expected)
+                if check.filler_ok:
+                    passed |= (digit == ord(FILLER)) & (raw[:, cols] == ord(FILLER)).all(axis=1)
+                layout_ok &= passed
+            if layout is TD1:
+                # Long document numbers have a variable-length field; check those one by one
+                for r in np.flatnonzero((raw[:, 14] == ord(FILLER)) & (raw[:, 15] != ord(FILLER))):
+                    layout_ok[r] = parse_mrz([texts[idx[r]]], correct=False).valid
+            out[idx[rows]] = layout_ok[rows]
+    return out
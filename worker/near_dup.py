@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .aws_clients import client
+from .config import get_worker_settings
+from .context import THUMBNAIL, CaseContext
+from .image_ops import PHASH_BITS, hamming, perceptual_hash
+
+
+log = logging.getLogger(__name__)
+
+# Multi-index hashing: a 64-bit hash is split into CHUNKS 16-bit substrings, each its
+# own bucket key. Two hashes within distance r agree to within r // CHUNKS bits on at
+# least one substring (pigeonhole), so a radius query reads the buckets of every
+# substring variant within that many flipped bits and checks the full distance.
+CHUNKS = 4
+CHUNK_BITS = PHASH_BITS // CHUNKS
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# DynamoDB BatchWriteItem limit
+_BATCH_WRITE = 25
+# Local secondary index of the table: each bucket's entries, newest first
+RECENT_INDEX = "recent"
+# Images hashed per case and the feature prefix for each
+KINDS = {"front": "doc", "selfie": "selfie"}
+
+
+@dataclass(frozen=True)
+class NearDuplicates:
+    count: int = 0  # other cases with an image within the radius
+    distance: int = PHASH_BITS  # Hamming distance to the closest of them (PHASH_BITS if none)
+
+
+def chunks(h: int) -> List[int]:
+    return [(h >> (CHUNK_BITS * i)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _variants(value: int, flips: int) -> Iterable[int]:
+    yield value
+    for n in range(1, flips + 1):
+        for bits in combinations(range(CHUNK_BITS), n):
+            v = value
+            for b in bits:
+                v ^= 1 << b
+            yield v
+
+
+def bucket_keys(kind: str, h: int, radius: int) -> List[str]:
+    """Bucket keys to read for a radius query: CHUNKS * sum(C(16, i), i <= radius // CHUNKS)
+    (4 for radius < 4, 68 for radius < 8), whatever the size of the index."""
+    flips = radius // CHUNKS
+    return [f"{kind}#{i}#{v:04x}" for i, c in enumerate(chunks(h)) for v in _variants(c, flips)]
+
+
+class NearDupIndex:
+    """Perceptual hashes of past case images, queryable by Hamming radius.
+
+    Each hash is stored once per substring, under bucket `<kind>#<i>#<substring>`.
+    With `table` set, that is one small DynamoDB item per (bucket, case) holding the
+    full hash, its write time `ts` and a `ttl`; a case's entries go out in one
+    BatchWriteItem. A query reads its buckets with parallel single-page Queries on the
+    `ts` index, newest first and at most `bucket_limit` entries each. Substrings that
+    many documents share (same template) make long buckets, and this keeps the read
+    cost of a lookup bounded however many cases are indexed: such a bucket only
+    matches on its recent entries, while a true near-duplicate usually also shares a
+    rarer substring. Without a table the buckets are kept in process (tests, local
+    runs). Index errors never fail a case — the lookup just finds nothing.
+    """
+
+    def __init__(
+        self,
+        table: str = "",
+        radius: int = 6,
+        ttl: float = 365 * 24 * 3600,
+        dynamo: Any = None,
+        query_workers: int = 16,
+        bucket_limit: int = 50,
+    ):
+        if radius >= 2 * CHUNKS:
+            raise ValueError(f"near-duplicate radius must be below {2 * CHUNKS}")
+        self.table = table
+        self.radius = radius
+        self.ttl = ttl
+        self.bucket_limit = bucket_limit
+        self._dynamo = dynamo
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, str]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix="near-dup") if table else None
+
+    def query(self, kind: str, h: int, exclude_case: Optional[str] = None) -> NearDuplicates:
+        keys = bucket_keys(kind, h, self.radius)
+        best: Dict[str, int] = {}
+        for case_id, other in self._remote_entries(keys) if self.table else self._local_entries(keys):
+            if case_id == exclude_case:
+                continue
+            d = hamming(h, int(other, 16))
+            if d <= self.radius and d < best.get(case_id, PHASH_BITS + 1):
+                best[case_id] = d
+        return NearDuplicates(len(best), min(best.values(), default=PHASH_BITS))
+
+    def add(self, kind: str, h: int, case_id: str) -> None:
+        self.add_many([(kind, h)], case_id)
+
+    def add_many(self, hashes: List[Tuple[str, int]], case_id: str) -> None:
+        """Index a case's (kind, hash) pairs."""
+        entries = [(key, f"{h:016x}") for kind, h in hashes for key in bucket_keys(kind, h, 0)]
+        if not self.table:
+            with self._lock:
+                for key, value in entries:
+                    self._buckets.setdefault(key, {})[case_id] = value
+            return
+        now = time.time()
+        item = {"case_id": {"S": case_id}, "ts": {"N": f"{now:.3f}"}, "ttl": {"N": str(int(now + self.ttl))}}
+        requests = [{"PutRequest": {"Item": {**item, "bucket_key": {"S": key}, "h": {"S": value}}}} for key, value in entries]
+        dynamo = self._dynamo or client("dynamodb")
+        try:
+            for i in range(0, len(requests), _BATCH_WRITE):
+                pending: Dict[str, Any] = {self.table: requests[i : i + _BATCH_WRITE]}
+                while pending:
+                    pending = dynamo.batch_write_item(RequestItems=pending).get("UnprocessedItems") or {}
+        except Exception:
+            log.warning("near-duplicate index write failed for %s", case_id, exc_info=True)
+
+    def _local_entries(self, keys: List[str]) -> List[Tuple[str, str]]:
+        with self._lock:
+            return [entry for key in keys for entry in self._buckets.get(key, {}).items()]
+
+    def _remote_entries(self, keys: List[str]) -> List[Tuple[str, str]]:
+        try:
+            return [entry for found in self._executor.map(self._query_bucket, keys) for entry in found]
+        except Exception:
+            log.warning("near-duplicate index read failed", exc_info=True)
+            return []
+
+    def _query_bucket(self, key: str) -> List[Tuple[str, str]]:
+        dynamo = self._dynamo or client("dynamodb")
+        now = time.time()
+        resp = dynamo.query(
+            TableName=self.table,
+            IndexName=RECENT_INDEX,
+            KeyConditionExpression="bucket_key = :k",
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues={":k": {"S": key}},
+            ProjectionExpression="case_id, h, #ttl",
+            ScanIndexForward=False,
+            Limit=self.bucket_limit,
+        )
+        # TTL deletion is lazy, so expired items can still be returned
+        return [
+            (item["case_id"]["S"], item["h"]["S"])
+            for item in resp.get("Items", [])
+            if int(item.get("ttl", {}).get("N", "0")) > now
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+_index: Optional[NearDupIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_dup_index() -> NearDupIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                settings = get_worker_settings()
+                _index = NearDupIndex(
+                    settings.near_dup_table,
+                    radius=settings.near_dup_radius,
+                    ttl=settings.near_dup_ttl,
+                    # Queries are small and I/O bound: as many as the client has connections
+                    query_workers=settings.aws_max_pool_connections,
+                    bucket_limit=settings.near_dup_bucket_limit,
+                )
+    return _index
+
+
+def image_phash(ctx: CaseContext, key: str) -> int:
+    """pHash of an image, from its thumbnail (the hash only looks at 32x32), cached by the
+    original's SHA-256."""
+
+    def compute() -> str:
+        gray = ctx.get_gray(ctx.derived(key, THUMBNAIL), get_worker_settings().image_max_pixels)
+        return f"{perceptual_hash(gray):016x}"
+
+    if ctx.results is None:
+        return int(compute(), 16)
+    value, _ = ctx.results.get_or_compute("phash", ctx.sha256(key), compute)
+    return int(value, 16)
+
+
+def near_dup_features(ctx: CaseContext, s3_keys: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Look up the front and selfie images among earlier cases, then add them to the
+    index. Failed lookups count as no near-duplicates."""
+    index = get_near_dup_index()
+    features: Dict[str, Any] = {}
+    hashes: List[Tuple[str, int]] = []
+    for name, prefix in KINDS.items():
+        found = NearDuplicates()
+        if s3_keys.get(name):
+            try:
+                h = image_phash(ctx, s3_keys[name])
+                found = index.query(prefix, h, exclude_case=ctx.case_id)
+                hashes.append((prefix, h))
+            except Exception:
+                log.warning("near-duplicate lookup failed for %s", name, exc_info=True)
+        features[f"{prefix}_near_dup_count"] = found.count
+        features[f"{prefix}_near_dup_distance"] = found.distance
+    index.add_many(hashes, ctx.case_id)
+    return features
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
 import json
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set
+
+from tenacity import Retrying, stop_after_attempt, wait_exponential
 
 from .aws_clients import client, s3_put_object
 from .config import get_worker_settings
+from .metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
 
 
 def update_case_with_results(
@@ -18,39 +27,120 @@ def update_case_with_results(
     decision: str,
     artifacts: Optional[Dict[str, Any]] = None,
 ):
+    """Record the decision: the case update and DECISION event commit together in one
+    transaction while the redacted results.json artifact uploads (with retries) in
+    parallel. Returns once both are stored; an upload that still fails raises, so the
+    message is not acked and redelivery writes the artifact again."""
     settings = get_worker_settings()
     dynamo = client("dynamodb")
     now = datetime.now(timezone.utc).isoformat()
     # Store a redacted artifact JSON to S3
     artifact_key = f"cases/{case_id}/artifacts/results.json"
-    s3_put_object(bucket, artifact_key, json.dumps({"features": features, "score": score, "reasons": reasons, "decision": decision}).encode("utf-8"), kms_key_arn=settings.kms_key_arn, content_type="application/json")
-    # Update DDB
-    dynamo.update_item(
-        TableName=settings.dynamo_cases_table,
-        Key={"case_id": {"S": case_id}},
-        UpdateExpression="SET fraud_score=:f, reasons=:r, updated_at=:u, decision=:d, status=:s, artifact_key=:a",
-        ExpressionAttributeValues={
-            ":f": {"N": str(score)},
-            ":r": {"L": [{"S": str(x)} for x in reasons]},
-            ":u": {"S": now},
-            ":d": {"S": decision},
-            ":s": {"S": "PROCESSED"},
-            ":a": {"S": artifact_key},
-        },
+    body = json.dumps({"features": features, "score": score, "reasons": reasons, "decision": decision}).encode("utf-8")
+    upload = get_artifact_uploader().submit(bucket, artifact_key, body, content_type="application/json")
+    dynamo.transact_write_items(
+        TransactItems=[
+            {
+                "Update": {
+                    "TableName": settings.dynamo_cases_table,
+                    "Key": {"case_id": {"S": case_id}},
+                    "UpdateExpression": "SET fraud_score=:f, reasons=:r, updated_at=:u, decision=:d, #s=:s, artifact_key=:a",
+                    # status is a DynamoDB reserved word
+                    "ExpressionAttributeNames": {"#s": "status"},
+                    "ExpressionAttributeValues": {
+                        ":f": {"N": str(score)},
+                        ":r": {"L": [{"S": str(x)} for x in reasons]},
+                        ":u": {"S": now},
+                        ":d": {"S": decision},
+                        ":s": {"S": "PROCESSED"},
+                        ":a": {"S": artifact_key},
+                    },
+                }
+            },
+            {
+                "Put": {
+                    "TableName": settings.dynamo_events_table,
+                    "Item": _event_item(case_id, "DECISION", {"decision": decision, "score": score}),
+                }
+            },
+        ]
     )
-    write_event(case_id, "DECISION", {"decision": decision, "score": score})
+    upload.result()
 
 
 def write_event(case_id: str, event_type: str, payload: dict):
     settings = get_worker_settings()
     dynamo = client("dynamodb")
+    dynamo.put_item(TableName=settings.dynamo_events_table, Item=_event_item(case_id, event_type, payload))
+
+
+def _event_item(case_id: str, event_type: str, payload: dict) -> Dict[str, Any]:
     ts = int(datetime.now(timezone.utc).timestamp())
-    item = {
+    return {
         "case_id": {"S": case_id},
         "ts": {"N": str(ts)},
         "type": {"S": event_type},
         "payload": {"S": json.dumps({k: v for k, v in (payload or {}).items() if k not in {"raw", "image", "pii"}})},
         "ttl": {"N": str(ts + 90 * 24 * 3600)},
     }
-    dynamo.put_item(TableName=settings.dynamo_events_table, Item=item)
 
+
+class ArtifactUploader:
+    """Uploads case artifacts to S3 from a small thread pool, retrying each with
+    exponential backoff. `drain()` waits for everything queued (called on shutdown)."""
+
+    def __init__(self, workers: int = 4, attempts: int = 5, max_wait: float = 10.0):
+        self.attempts = attempts
+        self.max_wait = max_wait
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artifacts")
+        self._lock = threading.Lock()
+        self._pending: Set[Future] = set()
+
+    def submit(self, bucket: str, key: str, body: bytes, content_type: str = "application/json") -> Future:
+        fut = self._executor.submit(self._upload, bucket, key, body, content_type)
+        with self._lock:
+            self._pending.add(fut)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut: Future) -> None:
+        with self._lock:
+            self._pending.discard(fut)
+
+    def _upload(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        settings = get_worker_settings()
+        retrying = Retrying(
+            stop=stop_after_attempt(self.attempts),
+            wait=wait_exponential(multiplier=0.2, max=self.max_wait),
+            reraise=True,
+        )
+        try:
+            retrying(s3_put_object, bucket, key, body, kms_key_arn=settings.kms_key_arn, content_type=content_type)
+        except Exception:
+            log.exception("artifact upload failed after %d attempts: %s", self.attempts, key)
+            get_metrics().incr("ArtifactUploadFailures")
+            raise
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued uploads; returns False if some were still running at the timeout."""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        self.drain(timeout)
+        self._executor.shutdown(wait=False)
+
+
+_uploader: Optional[ArtifactUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_artifact_uploader() -> ArtifactUploader:
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = ArtifactUploader(workers=get_worker_settings().artifact_upload_workers)
+    return _uploader
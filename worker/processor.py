@@ -1,43 +1,140 @@
 from __future__ import annotations
 
 import json
+import logging
+import time
 from typing import Any, Dict, Optional
 
-from .aws_clients import put_metric
 from .config import get_worker_settings
+from .context import NORMALIZED, THUMBNAIL, CaseContext
 from .features import build_features
+from .metrics import get_metrics
+from .near_dup import near_dup_features
 from .persistence import update_case_with_results
-from .rekognition import compare_faces, extract_doc_face
-from .scoring import load_rules, score_features
+from .result_cache import get_result_cache
+from .rekognition import MAX_INLINE_BYTES, compare_faces, detect_face_bbox, save_doc_face
+from .scoring import get_ruleset, score_features
+from .stages import StageGraph
 from .textract import run_textract
+from .tracing import span
+
+
+log = logging.getLogger(__name__)
 
 
 def process_case(msg: Dict[str, Any]):
     settings = get_worker_settings()
+    started = time.perf_counter()
     case_id: str = msg["case_id"]
     s3_keys: Dict[str, Optional[str]] = msg["s3_keys"]
     bucket: str = msg.get("bucket") or settings.s3_bucket
     metadata: Dict[str, Any] = msg.get("metadata") or {}
+    front = s3_keys.get("front")
+    back = s3_keys.get("back")
+    selfie = s3_keys.get("selfie")
+    # SHA-256 per image name as computed by the API at upload (absent on older messages)
+    hashes = {s3_keys.get(name): digest for name, digest in (msg.get("s3_hashes") or {}).items()}
+    # Normalized/thumbnail versions made at ingest, by original key (absent on older messages)
+    derivatives = {s3_keys.get(name): kinds for name, kinds in (msg.get("s3_derivatives") or {}).items()}
+    results_cache = get_result_cache()
+
+    def cached(kind: str, digest: str, compute):
+        value, hit = results_cache.get_or_compute(kind, digest, compute)
+        get_metrics().incr("ResultCache", dimensions={"Kind": kind, "Outcome": "hit" if hit else "miss"})
+        return value
+
+    # Every stage shares one context so S3 objects are fetched and decoded once
+    with CaseContext(bucket, case_id, hashes=hashes, results=results_cache, derivatives=derivatives) as ctx:
+
+        def textract():
+            # Keyed by both pages' content and the version Textract reads; replayed
+            # documents skip the Textract call
+            digest = ctx.sha256(front) + ctx.variant(front)
+            if back:
+                digest += f":{ctx.sha256(back)}{ctx.variant(back)}"
+
+            def analyze():
+                out = run_textract(bucket, ctx.derived(front, NORMALIZED), ctx.derived(back, NORMALIZED) if back else None)
+                out.pop("raw", None)
+                return out
+
+            return cached("textract", digest, analyze)
+
+        def quality():
+            # Fetch and decode the front image while Textract/Rekognition run
+            return ctx.quality(front, max_pixels=settings.image_max_pixels) if front else None
+
+        def face_bbox():
+            if not (selfie and front):
+                return None
+            # Relative bbox, so detecting on the thumbnail is enough to crop the normalized image
+            bbox = cached("face_bbox", ctx.sha256(front), lambda: detect_face_bbox(bucket, ctx.derived(front, THUMBNAIL)))
+            return tuple(bbox) if bbox else None
+
+        def doc_face(bbox):
+            # The portrait crop stays in memory (cut from the decoded front image); the
+            # audit copy, if kept, uploads in the background. A crop too large to send
+            # inline is uploaded first and compared by key.
+            if not (selfie and front and bbox):
+                return None
+            crop = ctx.crop(front, bbox)
+            if len(crop) > MAX_INLINE_BYTES:
+                try:
+                    return crop, save_doc_face(bucket, case_id, front, bbox, ctx=ctx, wait=True)
+                except Exception:
+                    log.warning("doc face upload failed for %s; comparing the whole front", case_id, exc_info=True)
+                    return None
+            if settings.doc_face_persist:
+                save_doc_face(bucket, case_id, front, bbox, ctx=ctx)
+            return crop, None
+
+        def face_compare(doc_face):
+            if not (selfie and front):
+                return None
+            selfie_key = ctx.derived(selfie, NORMALIZED)
+            if doc_face:
+                crop, key = doc_face
+                return compare_faces(bucket, selfie_key, key, doc_face_bytes=crop)
+            # No face found on the document: compare against the whole front image
+            return compare_faces(bucket, selfie_key, ctx.derived(front, NORMALIZED))
 
-    # Textract
-    t_out = run_textract(bucket, s3_keys.get("front"), s3_keys.get("back"))
+        def near_dup():
+            return near_dup_features(ctx, s3_keys)
 
-    # Face compare
-    face_sim = None
-    if s3_keys.get("selfie") and s3_keys.get("front"):
-        doc_face_key = extract_doc_face(bucket, case_id, s3_keys["front"]) or s3_keys.get("front")
-        if doc_face_key:
-            face_sim = compare_faces(bucket, s3_keys["selfie"], doc_face_key)
+        def features(t_out, face_sim, _quality, near_dups):
+            return build_features(bucket, case_id, s3_keys, t_out, face_sim, metadata, ctx=ctx, near_dups=near_dups)
 
-    # Features
-    feats = build_features(bucket, case_id, s3_keys, t_out, face_sim, metadata)
+        def scoring(feats):
+            return score_features(feats, get_ruleset(settings.rules_path))
 
-    # Scoring
-    rules = load_rules(settings.rules_path)
-    score, reasons, decision = score_features(feats, rules)
+        def persist(feats, scored):
+            score, reasons, decision = scored
+            update_case_with_results(case_id, bucket, s3_keys, feats, score, reasons, decision)
 
-    # Persist
-    update_case_with_results(case_id, bucket, s3_keys, feats, score, reasons, decision)
-    put_metric("CasesProcessed", 1)
-    return {"case_id": case_id, "score": score, "decision": decision}
+        # textract, quality, near_dup and face_bbox -> doc_face -> face_compare run side by
+        # side; features starts once all of them are done
+        graph = (
+            StageGraph()
+            .add("textract", textract)
+            .add("quality", quality)
+            .add("face_bbox", face_bbox)
+            .add("doc_face", doc_face, "face_bbox")
+            .add("face_compare", face_compare, "doc_face")
+            .add("near_dup", near_dup)
+            .add("features", features, "textract", "face_compare", "quality", "near_dup")
+            .add("scoring", scoring, "features")
+            .add("persist", persist, "features", "scoring")
+        )
+        with span("case"):
+            results = graph.run()
 
+    score, reasons, decision = results["scoring"]
+    metrics = get_metrics()
+    metrics.incr("CasesProcessed")
+    metrics.incr("Decisions", dimensions={"Decision": decision})
+    metrics.observe("CaseLatency", (time.perf_counter() - started) * 1000.0)
+    for stage, seconds in graph.timings.items():
+        metrics.observe("StageLatency", seconds * 1000.0, dimensions={"Stage": stage})
+    timings = {k: round(v * 1000.0, 1) for k, v in graph.timings.items()}
+    log.info("case processed %s", json.dumps({"case_id": case_id, "decision": decision, "stage_ms": timings}))
+    return {"case_id": case_id, "score": score, "decision": decision, "timings": graph.timings}
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict, Optional, Tuple
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Tuple
 
-from .aws_clients import client, s3_get_object, s3_put_object
+from .aws_clients import client
 from .config import get_worker_settings
-from .image_ops import crop_bbox
+from .context import CaseContext
+from .persistence import get_artifact_uploader
+
+
+# Largest image Rekognition accepts inline as Bytes (S3 objects may be larger)
+MAX_INLINE_BYTES = 5 * 1024 * 1024
 
 
 def detect_face_bbox(bucket: str, key: str) -> Optional[Tuple[float, float, float, float]]:
@@ -19,25 +25,61 @@ def detect_face_bbox(bucket: str, key: str) -> Optional[Tuple[float, float, floa
     return (bbox.get("Left"), bbox.get("Top"), bbox.get("Width"), bbox.get("Height"))
 
 
-def extract_doc_face(bucket: str, case_id: str, front_key: str) -> Optional[str]:
+def extract_doc_face(bucket: str, case_id: str, front_key: str, ctx: Optional[CaseContext] = None) -> Optional[bytes]:
+    """Detect the document portrait and return it as JPEG bytes (queued for S3 too when
+    DOC_FACE_PERSIST is on)."""
     bbox = detect_face_bbox(bucket, front_key)
     if not bbox:
         return None
-    # Crop and upload
-    settings = get_worker_settings()
-    raw = s3_get_object(bucket, front_key)
-    crop = crop_bbox(raw, bbox)
+    # A context made here is closed on the way out; a caller's is left to the caller
+    with nullcontext(ctx) if ctx is not None else CaseContext(bucket, case_id) as ctx:
+        if get_worker_settings().doc_face_persist:
+            save_doc_face(bucket, case_id, front_key, bbox, ctx=ctx)
+        return ctx.crop(front_key, bbox)
+
+
+def save_doc_face(
+    bucket: str,
+    case_id: str,
+    front_key: str,
+    bbox: Tuple[float, float, float, float],
+    ctx: Optional[CaseContext] = None,
+    wait: bool = False,
+) -> str:
+    """Queue the portrait crop for upload as an audit artifact; returns its key. The
+    crop comes from the case's decoded front image and the upload runs in the
+    background, so nothing waits on S3 unless `wait` is set (the key is then readable
+    when this returns)."""
+    with nullcontext(ctx) if ctx is not None else CaseContext(bucket, case_id) as ctx:
+        crop = ctx.crop(front_key, bbox)
     key_out = f"cases/{case_id}/doc_face.jpg"
-    s3_put_object(bucket, key_out, crop, kms_key_arn=settings.kms_key_arn, content_type="image/jpeg")
+    upload = get_artifact_uploader().submit(bucket, key_out, crop, content_type="image/jpeg")
+    if wait:
+        upload.result()
     return key_out
 
 
-def compare_faces(bucket: str, selfie_key: str, doc_face_key: str) -> Optional[float]:
+def _image(bucket: str, key: Optional[str], data: Optional[bytes]) -> Dict[str, Any]:
+    if data is not None and (len(data) <= MAX_INLINE_BYTES or not key):
+        if len(data) > MAX_INLINE_BYTES:
+            raise ValueError(f"inline image of {len(data)} bytes exceeds the Rekognition limit and no S3 key was given")
+        return {"Bytes": data}
+    return {"S3Object": {"Bucket": bucket, "Name": key}}
+
+
+def compare_faces(
+    bucket: str, selfie_key: str, doc_face_key: Optional[str] = None, doc_face_bytes: Optional[bytes] = None
+) -> Optional[float]:
+    """Best similarity between the selfie (by S3 key) and the document face, given as
+    inline JPEG/PNG bytes (no upload needed first) and/or an S3 key. Bytes over the
+    inline limit go by the key instead; without one that is a ValueError, not a
+    failed comparison."""
+    target = _image(bucket, doc_face_key, doc_face_bytes)
     rek = client("rekognition")
     try:
         resp = rek.compare_faces(
             SourceImage={"S3Object": {"Bucket": bucket, "Name": selfie_key}},
-            TargetImage={"S3Object": {"Bucket": bucket, "Name": doc_face_key}},
+            TargetImage=target,
             SimilarityThreshold=70,
         )
         matches = resp.get("FaceMatches", [])
@@ -47,4 +89,3 @@ def compare_faces(bucket: str, selfie_key: str, doc_face_key: str) -> Optional[f
         return float(best.get("Similarity", 0.0))
     except Exception:
         return None
-
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import botocore.exceptions
+
+from .aws_clients import client
+from .config import get_worker_settings
+
+
+log = logging.getLogger(__name__)
+
+# Bump when a cached computation changes so stale entries are no longer read
+CACHE_VERSION = "v1"
+# DynamoDB items are limited to 400 KB; larger results stay in process only
+MAX_ITEM_BYTES = 350_000
+
+
+class ResultCache:
+    """Content-addressed results keyed by (kind, image sha256).
+
+    Two tiers: a size-bounded in-process LRU and, when `table` is set, a DynamoDB
+    table shared by all workers. Both honour `ttl` (seconds). Values must be
+    JSON-serializable; None is a valid cached value. Cache errors never fail a
+    case — the result is just computed.
+    """
+
+    def __init__(
+        self,
+        table: str = "",
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 2048,
+        dynamo: Any = None,
+        first_seen_ttl: float = 365 * 24 * 3600,
+    ):
+        self.table = table
+        self.ttl = ttl
+        self.first_seen_ttl = first_seen_ttl
+        self.max_entries = max_entries
+        self._dynamo = dynamo
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def cache_key(kind: str, digest: str) -> str:
+        return f"{CACHE_VERSION}#{kind}#{digest}"
+
+    def get_or_compute(self, kind: str, digest: Optional[str], compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (value, hit). Concurrent misses for one key in this process compute once."""
+        if not digest:
+            return compute(), False
+        key = self.cache_key(kind, digest)
+        found, value = self._local_get(key)
+        if found:
+            return value, True
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            found, value = self._local_get(key)
+            if not found:
+                found, value = self._remote_get(key)
+            if found:
+                self._local_put(key, value)
+            else:
+                value = compute()
+                self._local_put(key, value)
+                self._remote_put(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value, found
+
+    def first_seen(self, kind: str, digest: str, value: Any) -> Any:
+        """Record `value` for (kind, digest) unless a value is already recorded, and return
+        the recorded one. The shared tier writes with a condition, so of concurrent
+        callers exactly one wins and all see its value; records live `first_seen_ttl`.
+        """
+        key = self.cache_key(kind, digest)
+        found, stored = self._local_get(key)
+        if found:
+            return stored
+        if self.table:
+            stored = self._remote_put_if_absent(key, value)
+        else:
+            with self._lock:
+                entry = self._entries.get(key)
+                stored = entry[1] if entry is not None and entry[0] > time.time() else value
+        self._local_put(key, stored, self.first_seen_ttl)
+        return stored
+
+    def _remote_put_if_absent(self, key: str, value: Any) -> Any:
+        dynamo = self._dynamo or client("dynamodb")
+        now = time.time()
+        try:
+            dynamo.put_item(
+                TableName=self.table,
+                Item={
+                    "cache_key": {"S": key},
+                    "v": {"S": json.dumps(value, separators=(",", ":"))},
+                    "ttl": {"N": str(int(now + self.first_seen_ttl))},
+                },
+                # TTL deletion is lazy: an expired record counts as absent
+                ConditionExpression="attribute_not_exists(cache_key) OR #ttl < :now",
+                ExpressionAttributeNames={"#ttl": "ttl"},
+                ExpressionAttributeValues={":now": {"N": str(int(now))}},
+            )
+            return value
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        resp = dynamo.get_item(TableName=self.table, Key={"cache_key": {"S": key}}, ConsistentRead=True)
+        return json.loads(resp["Item"]["v"]["S"])
+
+    def _local_get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def _local_put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _remote_get(self, key: str) -> Tuple[bool, Any]:
+        if not self.table:
+            return False, None
+        try:
+            resp = (self._dynamo or client("dynamodb")).get_item(
+                TableName=self.table, Key={"cache_key": {"S": key}}, ProjectionExpression="v, #ttl",
+                ExpressionAttributeNames={"#ttl": "ttl"},
+            )
+        except Exception:
+            log.warning("result cache read failed for %s", key, exc_info=True)
+            return False, None
+        item = resp.get("Item")
+        # TTL deletion is lazy, so expired items can still be returned
+        if not item or int(item.get("ttl", {}).get("N", "0")) <= time.time():
+            return False, None
+        return True, json.loads(item["v"]["S"])
+
+    def _remote_put(self, key: str, value: Any) -> None:
+        if not self.table:
+            return
+        body = json.dumps(value, separators=(",", ":"))
+        if len(body) > MAX_ITEM_BYTES:
+            return
+        try:
+            (self._dynamo or client("dynamodb")).put_item(
+                TableName=self.table,
+                Item={"cache_key": {"S": key}, "v": {"S": body}, "ttl": {"N": str(int(time.time() + self.ttl))}},
+            )
+        except Exception:
+            log.warning("result cache write failed for %s", key, exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = get_worker_settings()
+                _cache = ResultCache(
+                    table=settings.result_cache_table,
+                    ttl=settings.result_cache_ttl,
+                    max_entries=settings.result_cache_size,
+                    first_seen_ttl=settings.first_seen_ttl,
+                )
+    return _cache
@@ -1,10 +1,41 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+import ast
+import hashlib
+import logging
+import os
+import threading
+from functools import reduce
+from types import CodeType, MappingProxyType
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import yaml
 
 
+log = logging.getLogger(__name__)
+
+# Percentage-based features are scaled to 0..1; velocity counts are capped (e.g. 5 -> 1.0 for 24h)
+PERCENT_FEATURES = ("face_similarity", "textract_conf_avg")
+VELOCITY_CAPS = {
+    "velocity_count_1h": 3.0,
+    "velocity_count_24h": 5.0,
+    "velocity_count_7d": 15.0,
+    "ip_velocity_count_1h": 5.0,
+    "ip_velocity_count_24h": 10.0,
+}
+
+# AST nodes allowed in `when:` expressions: comparisons, boolean/arithmetic operators,
+# feature names and literals. No calls, attributes or subscripts.
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List,
+)
+_CONSTANT_NAMES = {"True": True, "False": False, "None": None}
+
+
 class RulesConfig:
     def __init__(self, cfg: Dict[str, Any]):
         self.weights: Dict[str, float] = cfg.get("weights", {})
@@ -12,53 +43,263 @@ class RulesConfig:
         self.explanations: List[Dict[str, str]] = cfg.get("explanations", [])
 
 
-def load_rules(path: str) -> RulesConfig:
-    with open(path, "r") as f:
-        cfg = yaml.safe_load(f)
-    return RulesConfig(cfg)
+class _Vectorize(ast.NodeTransformer):
+    """Rewrite a validated rule so it evaluates element-wise over NumPy arrays:
+    and/or/not become logical ufuncs and chained comparisons are split."""
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        fn = "_and" if isinstance(node.op, ast.And) else "_or"
+        return ast.Call(ast.Name(fn, ast.Load()), [self.visit(v) for v in node.values], [])
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        if isinstance(node.op, ast.Not):
+            return ast.Call(ast.Name("_not", ast.Load()), [self.visit(node.operand)], [])
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node: ast.Compare) -> ast.AST:
+        parts = []
+        left = self.visit(node.left)
+        for op, right in zip(node.ops, node.comparators):
+            right = self.visit(right)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                part: ast.AST = ast.Call(ast.Name("_isin", ast.Load()), [left, right], [])
+                if isinstance(op, ast.NotIn):
+                    part = ast.Call(ast.Name("_not", ast.Load()), [part], [])
+            else:
+                op = ast.Eq() if isinstance(op, ast.Is) else ast.NotEq() if isinstance(op, ast.IsNot) else op
+                part = ast.Compare(left, [op], [right])
+            parts.append(part)
+            left = right
+        if len(parts) == 1:
+            return parts[0]
+        return ast.Call(ast.Name("_and", ast.Load()), parts, [])
+
+
+_VECTOR_GLOBALS = {
+    "__builtins__": {},
+    "_and": lambda *xs: reduce(np.logical_and, xs),
+    "_or": lambda *xs: reduce(np.logical_or, xs),
+    "_not": np.logical_not,
+    "_isin": lambda a, values: np.isin(a, list(values)),
+}
+
+
+class CompiledRule:
+    __slots__ = ("expr", "reason", "code", "names", "vector_code")
+
+    def __init__(self, expr: str, reason: str):
+        tree = ast.parse(expr, mode="eval")
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"Unsupported syntax {type(node).__name__} in rule '{expr}'")
+            if isinstance(node, ast.Name) and node.id.startswith("__"):
+                raise ValueError(f"Use of name '{node.id}' not allowed in rule '{expr}'")
+        self.expr = expr
+        self.reason = reason
+        self.code: CodeType = compile(tree, "<expr>", "eval")
+        self.names = frozenset(n for n in self.code.co_names if n not in _CONSTANT_NAMES)
+        vtree = ast.fix_missing_locations(_Vectorize().visit(tree))
+        self.vector_code: CodeType = compile(vtree, "<expr>", "eval")
+
+
+class CompiledRuleset(RulesConfig):
+    """Immutable rules compiled once: validated, precompiled `when:` expressions,
+    weights as parallel name/weight arrays and numeric thresholds."""
+
+    def __init__(self, cfg: Dict[str, Any], digest: str = ""):
+        super().__init__(cfg or {})
+        self.weights = MappingProxyType({k: float(w) for k, w in self.weights.items()})
+        self.thresholds = MappingProxyType(dict(self.thresholds))
+        self.explanations = tuple(MappingProxyType(dict(r)) for r in self.explanations)
+        self.feature_names: Tuple[str, ...] = tuple(self.weights.keys())
+        self.weight_array = np.array([self.weights[k] for k in self.feature_names], dtype=np.float64)
+        self.weight_array.setflags(write=False)
+        self.total_weight = sum(self.weights.values())
+        self.approve = float(self.thresholds.get("approve", 0.25))
+        self.reject = float(self.thresholds.get("reject", 0.6))
+        self.rules: Tuple[CompiledRule, ...] = tuple(
+            CompiledRule(r["when"], r.get("reason", r["when"])) for r in self.explanations if r.get("when")
+        )
+        self.digest = digest
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise AttributeError("CompiledRuleset is immutable")
+        super().__setattr__(name, value)
+
+
+def compile_rules(text: str | bytes) -> CompiledRuleset:
+    raw = text.encode("utf-8") if isinstance(text, str) else text
+    return CompiledRuleset(yaml.safe_load(raw) or {}, digest=hashlib.sha256(raw).hexdigest())
+
+
+def load_rules(path: str) -> CompiledRuleset:
+    with open(path, "rb") as f:
+        return compile_rules(f.read())
+
+
+class _RulesetCache:
+    """Holds the current ruleset per path; recompiles only when the file changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Tuple[int, int], CompiledRuleset]] = {}
+
+    def get(self, path: str) -> CompiledRuleset:
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if entry is not None and entry[1].digest == digest:
+                ruleset = entry[1]  # touched but unchanged
+            else:
+                try:
+                    ruleset = compile_rules(raw)
+                except Exception:
+                    if entry is None:
+                        raise
+                    # Keep serving the last good ruleset on a bad edit
+                    log.exception("Failed to reload rules from %s; keeping previous ruleset", path)
+                    ruleset = entry[1]
+            self._entries[path] = (stamp, ruleset)
+            return ruleset
+
+
+_ruleset_cache = _RulesetCache()
+
+
+def get_ruleset(path: str) -> CompiledRuleset:
+    """Current compiled ruleset for path, reloaded atomically when the file changes."""
+    return _ruleset_cache.get(path)
+
+
+def normalize_feature(name: str, v: Any) -> float:
+    if isinstance(v, bool):
+        v = 1.0 if v else 0.0
+    try:
+        v = float(v)
+    except Exception:
+        v = 0.0
+    # Normalize common percentage-based features
+    if name in PERCENT_FEATURES:
+        v = v / 100.0
+    # Normalize velocity counts (capped per window, see VELOCITY_CAPS)
+    cap = VELOCITY_CAPS.get(name)
+    if cap is not None:
+        v = min(v / cap, 1.0)
+    return v
+
+
+def _as_ruleset(rules: RulesConfig) -> CompiledRuleset:
+    return rules if isinstance(rules, CompiledRuleset) else CompiledRuleset(vars(rules).copy())
 
 
 def score_features(features: Dict[str, Any], rules: RulesConfig) -> Tuple[float, List[str], str]:
+    ruleset = _as_ruleset(rules)
     # Weighted sum; normalize missing features to 0
     score = 0.0
-    total_w = 0.0
-    for k, w in rules.weights.items():
-        total_w += float(w)
-        v = features.get(k)
+    for k, w in zip(ruleset.feature_names, ruleset.weight_array.tolist()):
+        score += w * normalize_feature(k, features.get(k))
+    fraud_score = score / ruleset.total_weight if ruleset.total_weight > 0 else 0.0
+    reasons = evaluate_reasons(features, ruleset)
+    decision = decide(fraud_score, ruleset)
+    return fraud_score, reasons, decision
+
+
+def _column_as_float(values: Any) -> np.ndarray:
+    """Numeric view of one feature column; values that are not numbers become NaN."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biuf":
+        return arr.astype(np.float64)
+
+    def conv(v: Any) -> float:
         if isinstance(v, bool):
-            v = 1.0 if v else 0.0
+            return 1.0 if v else 0.0
         try:
-            v = float(v)
+            return float(v)
         except Exception:
-            v = 0.0
-        # Normalize common percentage-based features
-        if k in ("face_similarity", "textract_conf_avg"):
+            return float("nan")
+
+    return np.fromiter((conv(v) for v in arr.ravel()), dtype=np.float64, count=arr.size)
+
+
+def score_features_batch(
+    features: Any, rules: RulesConfig, columns: Optional[Sequence[str]] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized score_features over many rows.
+
+    `features` is a DataFrame (feature columns by name) or a 2-D array whose column
+    names are given in `columns`. NaN or absent columns mean "missing", exactly as a
+    missing key does for score_features: they weigh 0 and rules referencing them do
+    not fire. Returns (scores, reason_flags, decisions) where reason_flags[i, j] says
+    whether ruleset.rules[j] fired for row i.
+    """
+    ruleset = _as_ruleset(rules)
+    if hasattr(features, "columns"):
+        n = len(features)
+        cols = {str(c): _column_as_float(features[c].to_numpy()) for c in features.columns}
+    else:
+        matrix = np.asarray(features)
+        if matrix.ndim != 2 or columns is None or len(columns) != matrix.shape[1]:
+            raise ValueError("A 2-D feature matrix needs one column name per column")
+        n = matrix.shape[0]
+        cols = {str(c): _column_as_float(matrix[:, j]) for j, c in enumerate(columns)}
+
+    # Weighted sum, accumulated in the same order as score_features so results match exactly
+    score = np.zeros(n, dtype=np.float64)
+    for k, w in zip(ruleset.feature_names, ruleset.weight_array.tolist()):
+        col = cols.get(k)
+        if col is None:
+            continue
+        v = np.where(np.isnan(col), 0.0, col)
+        if k in PERCENT_FEATURES:
             v = v / 100.0
-        # Normalize velocity counts (cap at 5 -> 1.0)
-        if k == "velocity_count_24h":
-            v = min(v / 5.0, 1.0)
-        score += float(w) * float(v)
-    fraud_score = score / total_w if total_w > 0 else 0.0
-    reasons = evaluate_reasons(features, rules)
-    decision = decide(fraud_score, rules)
-    return fraud_score, reasons, decision
+        cap = VELOCITY_CAPS.get(k)
+        if cap is not None:
+            v = np.minimum(v / cap, 1.0)
+        score += w * v
+    scores = score / ruleset.total_weight if ruleset.total_weight > 0 else np.zeros(n, dtype=np.float64)
+
+    flags = np.zeros((n, len(ruleset.rules)), dtype=bool)
+    for j, rule in enumerate(ruleset.rules):
+        if not rule.names.issubset(cols):
+            continue
+        present = np.ones(n, dtype=bool)
+        for name in rule.names:
+            present &= ~np.isnan(cols[name])
+        ctx = {name: cols[name] for name in rule.names}
+        ctx.update(_CONSTANT_NAMES)
+        try:
+            fired = np.broadcast_to(np.asarray(eval(rule.vector_code, _VECTOR_GLOBALS, ctx), dtype=bool), (n,))
+        except Exception:
+            continue
+        flags[:, j] = fired & present
+
+    decisions = np.where(scores >= ruleset.reject, "REJECT", np.where(scores < ruleset.approve, "APPROVE", "REVIEW"))
+    return scores, flags, decisions
 
 
 def evaluate_reasons(features: Dict[str, Any], rules: RulesConfig) -> List[str]:
+    ruleset = _as_ruleset(rules)
+    # Very restricted eval context, built once per case; booleans normalized for comparisons
+    ctx = {k: (1 if v else 0) if isinstance(v, bool) else v for k, v in features.items()}
+    ctx.update(_CONSTANT_NAMES)
     out: List[str] = []
-    for rule in rules.explanations:
-        expr = rule.get("when", "")
-        if not expr:
+    for rule in ruleset.rules:
+        if not rule.names.issubset(ctx):
             continue
         try:
-            # Very restricted eval context
-            ctx = {k: features.get(k) for k in features.keys()}
-            # Normalize booleans for comparisons
-            for k, v in ctx.items():
-                if isinstance(v, bool):
-                    ctx[k] = 1 if v else 0
-            if safe_eval(expr, ctx):
-                out.append(rule.get("reason", expr))
+            if eval(rule.code, {"__builtins__": {}}, ctx):
+                out.append(rule.reason)
         except Exception:
             continue
     return out
@@ -66,7 +307,7 @@ def evaluate_reasons(features: Dict[str, Any], rules: RulesConfig) -> List[str]:
 
 def safe_eval(expr: str, ctx: Dict[str, Any]) -> bool:
     allowed_names = {k: ctx.get(k) for k in ctx.keys()}
-    allowed_names.update({"True": True, "False": False, "None": None})
+    allowed_names.update(_CONSTANT_NAMES)
     code = compile(expr, "<expr>", "eval")
     for name in code.co_names:
         if name not in allowed_names:
@@ -76,8 +317,11 @@ def safe_eval(expr: str, ctx: Dict[str, Any]) -> bool:
 
 def decide(score: float, rules: RulesConfig) -> str:
     # thresholds: approve: 0.25, review: 0.25-0.6, reject: 0.6
-    approve = float(rules.thresholds.get("approve", 0.25))
-    reject = float(rules.thresholds.get("reject", 0.6))
+    if isinstance(rules, CompiledRuleset):
+        approve, reject = rules.approve, rules.reject
+    else:
+        approve = float(rules.thresholds.get("approve", 0.25))
+        reject = float(rules.thresholds.get("reject", 0.6))
     if score >= reject:
         return "REJECT"
     if score < approve:
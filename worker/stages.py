@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import get_worker_settings
+from .tracing import span
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def stage_executor() -> ThreadPoolExecutor:
+    """Process-wide pool shared by all cases. Stages never wait on other stages'
+    futures, so sharing one pool across concurrent cases cannot deadlock."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_worker_settings().stage_workers, thread_name_prefix="stage")
+    return _executor
+
+
+class StageGraph:
+    """A small dependency graph of named stages.
+
+    Each stage function is called with its dependencies' results as positional
+    arguments, as soon as all of them are available. Independent stages run in
+    parallel. Per-stage wall-clock timings (seconds) are recorded in `timings`.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], *deps: str) -> "StageGraph":
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage '{name}'")
+        for d in deps:
+            if d not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{d}'")
+        self._stages[name] = (fn, deps)
+        return self
+
+    def _timed(self, name: str, fn: Callable[..., Any], args: List[Any]) -> Any:
+        t0 = time.perf_counter()
+        try:
+            with span("stage", stage=name):
+                return fn(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - t0
+
+    def run(self, executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, Any]:
+        """Run every stage and return results by name. The first stage failure is re-raised
+        after in-flight stages finish; stages that depend on it are not started."""
+        executor = executor or stage_executor()
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+        while pending or running:
+            if error is None:
+                for name in [n for n, (_, deps) in pending.items() if all(d in self.results for d in deps)]:
+                    fn, deps = pending.pop(name)
+                    args = [self.results[d] for d in deps]
+                    running[executor.submit(self._timed, name, fn, args)] = name
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    self.results[name] = fut.result()
+                except BaseException as exc:
+                    error = error or exc
+        if error is not None:
+            raise error
+        return self.results
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+log = logging.getLogger(__name__)
+
+# Layout grid (columns, rows) for landscape documents, and the oversampling used to
+# measure edges before pooling to the grid
+GRID = (32, 20)
+POOL = 4
+DESCRIPTOR_VERSION = "layout-v1"
+# Similarity lost per unit of |log(aspect ratio / template aspect ratio)|
+ASPECT_PENALTY = 1.0
+# template_geom_score when there is no index or no usable image
+FALLBACK_SCORE = 0.5
+
+
+def _block_mean(a: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Mean over a rows x cols grid of equal blocks (edge remainders are dropped)."""
+    h, w = a.shape
+    if h < rows or w < cols:
+        # Tiny inputs: repeat pixels so every block has at least one
+        a = np.repeat(np.repeat(a, -(-rows // h), axis=0), -(-cols // w), axis=1)
+        h, w = a.shape
+    bh, bw = h // rows, w // cols
+    return a[: bh * rows, : bw * cols].reshape(rows, bh, cols, bw).mean(axis=(1, 3))
+
+
+def _standardize(v: np.ndarray) -> np.ndarray:
+    v = v.ravel() - v.mean()
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+def layout_descriptor(gray: np.ndarray, grid: Tuple[int, int] = GRID, pool: int = POOL) -> np.ndarray:
+    """Unit-length layout descriptor of a grayscale document image.
+
+    The image is reduced once to a small (grid * pool) working array; the descriptor
+    joins the per-cell mean intensity with the per-cell edge density (where portrait,
+    text blocks and MRZ band sit), each standardized, so templates compare by cosine
+    similarity. Portrait images are turned landscape first.
+    """
+    if gray.shape[0] > gray.shape[1]:
+        gray = np.rot90(gray)
+    cols, rows = grid
+    small = _block_mean(np.asarray(gray, dtype=np.float32), rows * pool, cols * pool)
+    edges = np.zeros_like(small)
+    edges[:, 1:] += np.abs(np.diff(small, axis=1))
+    edges[1:, :] += np.abs(np.diff(small, axis=0))
+    intensity = _block_mean(small, rows, cols)
+    edge_density = _block_mean(edges, rows, cols)
+    desc = np.concatenate([_standardize(intensity), _standardize(edge_density)]) / math.sqrt(2.0)
+    return desc.astype(np.float32)
+
+
+def aspect_ratio(shape: Tuple[int, int]) -> float:
+    h, w = shape[:2]
+    return max(h, w) / float(max(1, min(h, w)))
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    template: Optional[str]
+    similarity: float
+    score: float  # template_geom_score: 0 = fits a known template, 1 = fits none
+
+
+class TemplateIndex:
+    """Layout descriptors of known document templates.
+
+    `<path>.npy` holds one float32 row per exemplar (several per template allowed),
+    opened memory-mapped and read-only so all worker threads share the same pages;
+    the JSON sidecar (`<path>.json`) names the templates, their row counts and
+    aspect ratios, and the descriptor parameters the rows were built with.
+    """
+
+    def __init__(self, matrix: np.ndarray, meta: Dict[str, Any]):
+        self.matrix = matrix
+        self.meta = meta
+        self.grid = tuple(meta.get("grid", GRID))
+        self.pool = int(meta.get("pool", POOL))
+        templates = meta["templates"]
+        self.names: List[str] = [t["name"] for t in templates]
+        counts = [int(t["rows"]) for t in templates]
+        if sum(counts) != matrix.shape[0]:
+            raise ValueError(f"template index has {matrix.shape[0]} rows, sidecar lists {sum(counts)}")
+        self.labels = np.repeat(np.arange(len(templates)), counts)
+        self.log_aspects = np.log(np.repeat([float(t["aspect"]) for t in templates], counts)).astype(np.float32)
+        self.digest = meta.get("digest", "")
+
+    @classmethod
+    def load(cls, path: str) -> "TemplateIndex":
+        base = path[:-4] if path.endswith(".npy") else path
+        with open(base + ".json") as f:
+            meta = json.load(f)
+        if meta.get("descriptor") != DESCRIPTOR_VERSION:
+            raise ValueError(f"template index descriptor {meta.get('descriptor')!r} != {DESCRIPTOR_VERSION!r}")
+        return cls(np.load(base + ".npy", mmap_mode="r"), meta)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def match(self, gray: np.ndarray) -> TemplateMatch:
+        """Best-fitting template for a grayscale image: one matrix-vector product over
+        every exemplar, less a penalty for a different aspect ratio."""
+        if not len(self.labels):
+            return TemplateMatch(None, 0.0, FALLBACK_SCORE)
+        desc = layout_descriptor(gray, self.grid, self.pool)
+        sims = self.matrix @ desc
+        sims = sims - ASPECT_PENALTY * np.abs(self.log_aspects - math.log(aspect_ratio(gray.shape)))
+        best = int(np.argmax(sims))
+        similarity = float(sims[best])
+        return TemplateMatch(self.names[self.labels[best]], similarity, float(min(1.0, max(0.0, 1.0 - similarity))))
+
+
+def write_index(path: str, templates: Sequence[Tuple[str, float, Sequence[np.ndarray]]], grid=GRID, pool=POOL) -> Dict[str, Any]:
+    """Write `<path>.npy` and its JSON sidecar from (name, aspect, descriptors) triples."""
+    base = path[:-4] if path.endswith(".npy") else path
+    rows = [np.asarray(d, dtype=np.float32) for _, _, descs in templates for d in descs]
+    dim = 2 * grid[0] * grid[1]
+    matrix = np.stack(rows) if rows else np.zeros((0, dim), dtype=np.float32)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    meta = {
+        "descriptor": DESCRIPTOR_VERSION,
+        "grid": list(grid),
+        "pool": pool,
+        "dim": dim,
+        "templates": [{"name": name, "aspect": float(aspect), "rows": len(descs)} for name, aspect, descs in templates],
+        "digest": hashlib.sha256(matrix.tobytes()).hexdigest()[:16],
+    }
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+    np.save(base + ".npy", matrix)
+    with open(base + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+_index: Optional[TemplateIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_template_index() -> Optional[TemplateIndex]:
+    """The worker's template index, loaded on first use; None when TEMPLATE_INDEX_PATH
+    is unset or cannot be read (the feature then falls back to FALLBACK_SCORE)."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                from .config import get_worker_settings
+
+                path = get_worker_settings().template_index_path
+                if path and os.path.exists(path[:-4] + ".json" if path.endswith(".npy") else path + ".json"):
+                    try:
+                        _index = TemplateIndex.load(path)
+                        log.info("loaded %d document templates from %s", len(_index), path)
+                    except Exception:
+                        log.exception("could not load template index %s", path)
+                _index_loaded = True
+    return _index
@@ -1,62 +1,132 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from .aws_clients import client
 
 
 def run_textract(bucket: str, front_key: str, back_key: Optional[str] = None) -> Dict[str, Any]:
     tex = client("textract")
-    out: Dict[str, Any] = {"fields": {}, "confidence": {}, "avg_conf": None, "raw": None, "mrz_lines": []}
     try:
         pages = [{"S3Object": {"Bucket": bucket, "Name": front_key}}]
         if back_key:
             pages.append({"S3Object": {"Bucket": bucket, "Name": back_key}})
         resp = tex.analyze_id(DocumentPages=pages)
-        out["raw"] = resp
-        fields: Dict[str, str] = {}
-        confs: Dict[str, float] = {}
-        confs_list = []
-        for doc in resp.get("IdentityDocuments", []):
-            for field in doc.get("IdentityDocumentFields", []):
-                type_text = (field.get("Type") or {}).get("Text")
-                val_text = (field.get("ValueDetection") or {}).get("Text")
-                conf = (field.get("ValueDetection") or {}).get("Confidence")
-                if type_text and val_text is not None:
-                    key = normalize_field_name(type_text)
-                    fields[key] = val_text
-                    if conf is not None:
-                        confs[key] = float(conf)
-                        confs_list.append(float(conf))
-        out["fields"] = fields
-        out["confidence"] = confs
-        out["avg_conf"] = sum(confs_list) / len(confs_list) if confs_list else None
-        # MRZ lines occasionally appear as fields or blocks; keep placeholder empty for AnalyzeID
-        return out
+        return parse_analyze_id(resp)
     except Exception:
-        # Fallback to AnalyzeDocument (FORMS). We won't parse comprehensively here.
+        # Fallback to AnalyzeDocument (FORMS)
         resp = tex.analyze_document(
             Document={"S3Object": {"Bucket": bucket, "Name": front_key}}, FeatureTypes=["FORMS", "TABLES"]
         )
-        out["raw"] = resp
-        fields: Dict[str, str] = {}
-        confs_list = []
-        for block in resp.get("Blocks", []):
-            if block.get("BlockType") == "KEY_VALUE_SET" and block.get("EntityTypes") == ["KEY"]:
-                key_text = concat_child_text(block, resp)
-                if key_text:
-                    # naive: try to get value pair via relationships
-                    val_text = find_value_for_key(block, resp)
-                    if val_text:
-                        fields[normalize_field_name(key_text)] = val_text
-            if block.get("BlockType") == "LINE":
-                txt = block.get("Text")
-                if txt and len(txt) >= 30 and any(c in txt for c in ("<<", "<")):
-                    out["mrz_lines"].append(txt)
-        out["fields"] = fields
-        out["avg_conf"] = sum(confs_list) / len(confs_list) if confs_list else None
-        return out
+        return parse_analyze_document(resp)
+
+
+def _empty_output(resp: Dict[str, Any]) -> Dict[str, Any]:
+    return {"fields": {}, "confidence": {}, "avg_conf": None, "raw": resp, "mrz_lines": []}
+
+
+def _avg(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def is_mrz_line(text: Optional[str]) -> bool:
+    return bool(text) and len(text) >= 30 and "<" in text
+
+
+def parse_analyze_id(resp: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields, confidences and MRZ lines from an AnalyzeID response in one pass."""
+    out = _empty_output(resp)
+    fields: Dict[str, str] = {}
+    confs: Dict[str, float] = {}
+    confs_list: List[float] = []
+    for doc in resp.get("IdentityDocuments", []):
+        for field in doc.get("IdentityDocumentFields", []):
+            type_text = (field.get("Type") or {}).get("Text")
+            val_text = (field.get("ValueDetection") or {}).get("Text")
+            conf = (field.get("ValueDetection") or {}).get("Confidence")
+            if type_text and val_text is not None:
+                key = normalize_field_name(type_text)
+                fields[key] = val_text
+                if conf is not None:
+                    confs[key] = float(conf)
+                    confs_list.append(float(conf))
+                if key == "mrz_code":
+                    out["mrz_lines"].extend(l.strip() for l in val_text.splitlines() if is_mrz_line(l.strip()))
+    out["fields"] = fields
+    out["confidence"] = confs
+    out["avg_conf"] = _avg(confs_list)
+    return out
+
+
+def parse_analyze_document(resp: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields, confidences and MRZ lines from an AnalyzeDocument (FORMS) response in one pass."""
+    out = _empty_output(resp)
+    doc = TextractDocument(resp)
+    fields: Dict[str, str] = {}
+    confs: Dict[str, float] = {}
+    confs_list: List[float] = []
+    for block in doc.blocks:
+        btype = block.get("BlockType")
+        if btype == "KEY_VALUE_SET" and block.get("EntityTypes") == ["KEY"]:
+            key_text = doc.text(block)
+            if not key_text:
+                continue
+            value = doc.value_for_key(block)
+            if value is None:
+                continue
+            val_text, conf = value
+            key = normalize_field_name(key_text)
+            fields[key] = val_text
+            if conf is not None:
+                confs[key] = conf
+                confs_list.append(conf)
+        elif btype == "LINE" and is_mrz_line(block.get("Text")):
+            out["mrz_lines"].append(block["Text"])
+    out["fields"] = fields
+    out["confidence"] = confs
+    out["avg_conf"] = _avg(confs_list)
+    return out
+
+
+class TextractDocument:
+    """Index over a Textract Blocks response, built once.
+
+    Resolves CHILD and VALUE relationships by id in O(1), so extracting every
+    key/value pair is linear in the number of blocks.
+    """
+
+    def __init__(self, resp: Dict[str, Any]):
+        self.blocks: List[Dict[str, Any]] = resp.get("Blocks", []) or []
+        self.by_id: Dict[str, Dict[str, Any]] = {b["Id"]: b for b in self.blocks if "Id" in b}
+        self._text: Dict[str, str] = {}
+
+    def related(self, block: Dict[str, Any], rel_type: str) -> Iterator[Dict[str, Any]]:
+        for rel in block.get("Relationships", []) or []:
+            if rel.get("Type") == rel_type:
+                for rid in rel.get("Ids", []):
+                    b = self.by_id.get(rid)
+                    if b:
+                        yield b
+
+    def text(self, block: Dict[str, Any]) -> str:
+        """Space-joined text of the block's WORD children (memoized per block)."""
+        bid = block.get("Id")
+        if bid is not None and bid in self._text:
+            return self._text[bid]
+        txt = " ".join(w.get("Text", "") for w in self.related(block, "CHILD") if w.get("BlockType") == "WORD").strip()
+        if bid is not None:
+            self._text[bid] = txt
+        return txt
+
+    def value_for_key(self, key_block: Dict[str, Any]) -> Optional[Tuple[str, Optional[float]]]:
+        """First non-empty VALUE text for a KEY block, with the value block's confidence."""
+        for v in self.related(key_block, "VALUE"):
+            txt = self.text(v)
+            if txt:
+                conf = v.get("Confidence")
+                return txt, float(conf) if conf is not None else None
+        return None
 
 
 def normalize_field_name(name: str) -> str:
@@ -64,27 +134,9 @@ def normalize_field_name(name: str) -> str:
 
 
 def concat_child_text(block: Dict[str, Any], resp: Dict[str, Any]) -> str:
-    id_to_block = {b["Id"]: b for b in resp.get("Blocks", []) if "Id" in b}
-    text_parts = []
-    for rel in block.get("Relationships", []) or []:
-        if rel.get("Type") == "CHILD":
-            for cid in rel.get("Ids", []):
-                w = id_to_block.get(cid)
-                if w and w.get("BlockType") == "WORD":
-                    text_parts.append(w.get("Text", ""))
-    return " ".join(text_parts).strip()
+    return TextractDocument(resp).text(block)
 
 
 def find_value_for_key(key_block: Dict[str, Any], resp: Dict[str, Any]) -> Optional[str]:
-    id_to_block = {b["Id"]: b for b in resp.get("Blocks", []) if "Id" in b}
-    for rel in key_block.get("Relationships", []) or []:
-        if rel.get("Type") == "VALUE":
-            for vid in rel.get("Ids", []):
-                v = id_to_block.get(vid)
-                if not v:
-                    continue
-                txt = concat_child_text(v, resp)
-                if txt:
-                    return txt
-    return None
-
+    value = TextractDocument(resp).value_for_key(key_block)
+    return value[0] if value else None
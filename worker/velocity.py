@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from common.velocity import bucket_start
+
+from .aws_clients import client
+from .config import get_worker_settings
+
+# Hourly counters written by the API at ingest (see app/velocity.py). A window of N
+# hours sums the current bucket and the N previous ones, so it is hour-aligned and
+# may include up to one extra hour.
+WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+_MAX_WINDOW = max(WINDOWS.values())
+
+
+@dataclass(frozen=True)
+class VelocityCounts:
+    h1: int = 0
+    h24: int = 0
+    d7: int = 0
+
+
+def counts_from_buckets(buckets: Dict[int, int], now: float) -> VelocityCounts:
+    current = bucket_start(now)
+
+    def window(seconds: int) -> int:
+        return sum(n for b, n in buckets.items() if b >= current - seconds)
+
+    return VelocityCounts(h1=window(WINDOWS["1h"]), h24=window(WINDOWS["24h"]), d7=window(WINDOWS["7d"]))
+
+
+class VelocityStore:
+    """Reads hourly counters for a (dimension, value) with a single bounded Query
+    (at most 169 small items, whatever the activity level) and caches the answer
+    for `cache_ttl` seconds."""
+
+    def __init__(self, table: str, cache_ttl: float = 5.0, dynamo: Any = None):
+        self.table = table
+        self.cache_ttl = cache_ttl
+        self._dynamo = dynamo
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[str, str], Tuple[float, VelocityCounts]] = {}
+
+    def counts(self, dimension: str, value: Optional[str], now: Optional[float] = None) -> VelocityCounts:
+        if not value:
+            return VelocityCounts()
+        now = time.time() if now is None else now
+        key = (dimension, str(value))
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit is not None and now - hit[0] < self.cache_ttl:
+            return hit[1]
+        result = counts_from_buckets(self._query(f"{dimension}#{value}", now), now)
+        with self._lock:
+            if len(self._cache) > 10_000:
+                self._cache.clear()
+            self._cache[key] = (now, result)
+        return result
+
+    def _query(self, velocity_key: str, now: float) -> Dict[int, int]:
+        dynamo = self._dynamo or client("dynamodb")
+        args: Dict[str, Any] = {
+            "TableName": self.table,
+            "KeyConditionExpression": "velocity_key = :k AND #b >= :since",
+            "ExpressionAttributeNames": {"#b": "bucket", "#n": "n"},
+            "ExpressionAttributeValues": {":k": {"S": velocity_key}, ":since": {"N": str(bucket_start(now) - _MAX_WINDOW)}},
+            "ProjectionExpression": "#b, #n",
+        }
+        buckets: Dict[int, int] = {}
+        while True:
+            resp = dynamo.query(**args)
+            for item in resp.get("Items", []):
+                buckets[int(item["bucket"]["N"])] = int(item.get("n", {}).get("N", "0"))
+            if not resp.get("LastEvaluatedKey"):
+                return buckets
+            args["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+_store: Optional[VelocityStore] = None
+_store_lock = threading.Lock()
+
+
+def get_velocity_store() -> VelocityStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                settings = get_worker_settings()
+                _store = VelocityStore(settings.dynamo_velocity_table, cache_ttl=settings.velocity_cache_ttl)
+    return _store
+
+
+def velocity_features(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Device and IP velocity features. Lookups that fail count as zero."""
+    store = get_velocity_store()
+    metadata = metadata or {}
+    try:
+        device = store.counts("device", metadata.get("device_hash"))
+    except Exception:
+        device = VelocityCounts()
+    try:
+        ip = store.counts("ip", metadata.get("ip"))
+    except Exception:
+        ip = VelocityCounts()
+    return {
+        "device_hash_dup": device.h24 > 3,
+        "velocity_count_1h": device.h1,
+        "velocity_count_24h": device.h24,
+        "velocity_count_7d": device.d7,
+        "ip_velocity_count_1h": ip.h1,
+        "ip_velocity_count_24h": ip.h24,
+    }